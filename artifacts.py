@@ -0,0 +1,197 @@
+
+import gzip
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import uuid
+from multiprocessing.util import Finalize
+
+import log_pipeline
+from cases import suite_name
+
+# --- Failure Artifacts --- #
+# When a step fails (and, optionally, every N steps) the replay grabs the screenshot, page
+# source, browser console log and current URL. That grab is the only cost on the replay
+# path: the data is queued to a writer thread that compresses it into a per-run directory
+# and evicts the oldest runs once the directory exceeds its size budget.
+#
+# Per grab, in <artifact dir>/<run id>/:
+#   <name>.png       screenshot (already compressed, written as is)
+#   <name>.html.gz   page source
+#   <name>.json.gz   url, time, step, console log and any grab errors
+
+DEFAULT_ARTIFACT_DIR = os.path.join(".quaty", "artifacts")
+DEFAULT_BUDGET_MB = 500
+COMPRESS_LEVEL = 6
+
+
+def run_id(name="run", root=None):
+    """A directory name for one run: timestamp, the case's filesystem-safe path within `root`
+    (default: the working directory) and a random suffix, unique even within one second."""
+    stem = re.sub(r"[^A-Za-z0-9_.-]+", "_", suite_name(name, root or os.getcwd())).strip("_.")[-80:] or "run"
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{stem}-{uuid.uuid4().hex[:8]}"
+
+
+def grab(driver):
+    """Reads everything worth keeping from the browser. Each piece is optional: a dead
+    browser still yields whatever it could answer, with the failures under `errors`."""
+    data = {"time": time.time(), "errors": {}}
+    readers = (("url", lambda: driver.current_url),
+               ("screenshot", driver.get_screenshot_as_png),
+               ("page_source", lambda: driver.page_source),
+               ("console", lambda: driver.get_log("browser")))
+    for key, read in readers:
+        try:
+            data[key] = read()
+        except Exception as e:
+            data["errors"][key] = str(e)
+    return data
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for file_name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, file_name))
+            except OSError:
+                pass
+    return total
+
+
+class ArtifactWriter:
+    def __init__(self, directory=DEFAULT_ARTIFACT_DIR, budget_mb=DEFAULT_BUDGET_MB, log=log_pipeline.stderr):
+        self.directory = directory
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.log = log  # Called from the writer thread
+        self._total = None  # Bytes in the directory: scanned once, then kept up to date per write
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def submit(self, run, name, data, step=None):
+        """Queues one grab for writing and returns the run directory it will land in."""
+        self._queue.put((run, name, data, step))
+        return os.path.join(self.directory, run)
+
+    def flush(self):
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+            run = item[0]
+            try:
+                if self._total is None:
+                    self._total = directory_size(self.directory)
+                self._total += self._write(*item)
+                # Other worker processes write here too, so the total is re-measured before evicting.
+                if self._total > self.budget:
+                    self._total = self._evict(keep=run)
+            except OSError as e:
+                self._total = None  # A partial write: measure again next time
+                log_pipeline.error(self.log, f"Could not write artifacts for {run}: {e}")
+
+    def _write(self, run, name, data, step):
+        """Writes one grab and returns the bytes it added."""
+        run_dir = os.path.join(self.directory, run)
+        os.makedirs(run_dir, exist_ok=True)
+        base = os.path.join(run_dir, name)
+        paths = [base + ".json.gz"]
+        if data.get("screenshot"):
+            paths.append(base + ".png")
+            with open(base + ".png", "wb") as f:
+                f.write(data["screenshot"])
+        if data.get("page_source") is not None:
+            paths.append(base + ".html.gz")
+            with gzip.open(base + ".html.gz", "wt", encoding="utf-8", compresslevel=COMPRESS_LEVEL) as f:
+                f.write(data["page_source"])
+        meta = {"url": data.get("url"), "time": data["time"], "step": step,
+                "console": data.get("console", []), "errors": data["errors"]}
+        with gzip.open(base + ".json.gz", "wt", encoding="utf-8", compresslevel=COMPRESS_LEVEL) as f:
+            json.dump(meta, f)
+        return sum(os.path.getsize(path) for path in paths)
+
+    def _evict(self, keep):
+        """Deletes the oldest run directories until the total fits the budget; never `keep`.
+        Returns the size of what is left."""
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.is_dir()]
+        except OSError:
+            return 0
+        runs = []
+        for entry in entries:
+            try:
+                runs.append((entry.stat().st_mtime, entry.name, directory_size(entry.path)))
+            except OSError:
+                pass
+        total = sum(size for _, _, size in runs)
+        for _, name, size in sorted(runs):
+            if total <= self.budget:
+                break
+            if name == keep:
+                continue
+            # Other worker processes share the directory and may evict the same run.
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+            total -= size
+        return total
+
+
+class RunArtifacts:
+    """The artifact policy for one replay: grab on failure, and every `every` steps if set."""
+
+    def __init__(self, writer, run, every=0):
+        self.writer = writer
+        self.run = run
+        self.every = every
+        self.path = None  # Run directory, once something was grabbed
+
+    def after_steps(self, driver, results, timer=None, log=print):
+        """Called with the results a replay round produced; grabs at most once per round,
+        since a batch or an assertion run all ends on the same page."""
+        due = [result for result in results
+               if not result["passed"] or (self.every and result["step"] % self.every == 0)]
+        if not due:
+            return
+        result = next((result for result in due if not result["passed"]), due[-1])
+        name = f"step-{result['step']:03d}-{'passed' if result['passed'] else 'failed'}"
+        result["artifact"] = self.capture(driver, name, step=result["step"], timer=timer, log=log)
+
+    def capture(self, driver, name, step=None, timer=None, log=print):
+        """Grabs now, writes later. Returns the artifact path prefix (without extension)."""
+        started = time.perf_counter()
+        data = grab(driver)
+        if timer:
+            timer.add("artifact", started, time.perf_counter() - started, step)
+        self.path = self.writer.submit(self.run, name, data, step)
+        log(f"  Captured artifacts '{name}' ({self.path})")
+        return os.path.join(self.path, name)
+
+
+# --- Process Pool Workers --- #
+# Each batch worker process gets one writer per artifact directory, flushed on shutdown.
+_worker_writers = {}
+
+
+def worker_writer(directory=DEFAULT_ARTIFACT_DIR, budget_mb=DEFAULT_BUDGET_MB):
+    writer = _worker_writers.get(directory)
+    if writer is None:
+        writer = _worker_writers[directory] = ArtifactWriter(directory, budget_mb)
+        # Worker processes skip atexit handlers; a multiprocessing finalizer still runs on shutdown.
+        Finalize(writer, writer.close, exitpriority=20)
+    return writer
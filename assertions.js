@@ -0,0 +1,83 @@
+
+// This script observes the elements behind a run of consecutive assertion steps in a
+// single `execute_async_script` round-trip (see assertions.py). It waits until every
+// required element is present (or the timeout passes) and then reports what each step
+// needs to be judged: text, an attribute, visibility or a match count. Matching itself
+// happens in Python so every matcher lives in one place.
+//
+// arguments[0]: specs, each {selectors, positional, required, attribute}; `positional`
+//               fallbacks are only tried once the element timeout has passed
+// arguments[1]: element timeout in milliseconds
+// The reply is one observation per spec: {found, used, element, text, attribute, visible,
+// count}. `text` is the trimmed innerText, which is NOT WebDriver's element text (hidden
+// elements keep theirs, whitespace is collapsed differently); `element` comes back as a
+// WebElement so assertions.py can read WebDriver's text when it needs the exact value.
+
+const specs = arguments[0];
+const timeoutMs = arguments[1];
+const callback = arguments[arguments.length - 1];
+const started = performance.now();
+
+function find(selectors) {
+    for (const selector of selectors) {
+        try {
+            const element = document.querySelector(selector);
+            if (element) {
+                return [element, selector];
+            }
+        } catch (e) {
+            // Invalid selector: try the next candidate.
+        }
+    }
+    return [null, null];
+}
+
+function count(selectors) {
+    try {
+        return document.querySelectorAll(selectors[0]).length;
+    } catch (e) {
+        return 0;
+    }
+}
+
+function isVisible(element) {
+    if (!element.isConnected) {
+        return false;
+    }
+    const style = window.getComputedStyle(element);
+    if (style.display === 'none' || style.visibility === 'hidden' || style.opacity === '0') {
+        return false;
+    }
+    const rect = element.getBoundingClientRect();
+    return rect.width > 0 && rect.height > 0;
+}
+
+function observe(timedOut) {
+    return specs.map(spec => {
+        let [element, used] = find(spec.selectors);
+        if (!element && timedOut) {
+            [element, used] = find(spec.positional || []);
+        }
+        const observation = { found: !!element, used: used, count: count(spec.selectors) };
+        if (element) {
+            observation.element = element;
+            observation.text = element.innerText.trim();
+            observation.visible = isVisible(element);
+            if (spec.attribute) {
+                observation.attribute = element.getAttribute(spec.attribute);
+            }
+        } else {
+            observation.visible = false;
+        }
+        return observation;
+    });
+}
+
+(function poll() {
+    const missing = specs.some(spec => spec.required && !find(spec.selectors)[0]);
+    if (!missing || performance.now() - started >= timeoutMs) {
+        callback(observe(missing));
+        return;
+    }
+    setTimeout(poll, 50);
+})();
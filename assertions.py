@@ -0,0 +1,215 @@
+
+import os
+import re
+import time
+
+import log_pipeline
+from cases import step_selectors
+
+# --- Bulk Assertions --- #
+# A run of consecutive assertion steps is observed with one in-page call (assertions.js)
+# instead of a presence wait per step, and then judged here. Text matchers read WebDriver's
+# element.text, as native steps always did; only with `in_page_text` (fast mode) is the
+# page's own innerText used instead, saving that round-trip. innerText is not WebDriver's
+# visible-text algorithm: hidden elements still have text, and whitespace differs.
+# Matchers, with the step's `value`:
+#
+#   assert_text       exact text (trimmed on both sides with in_page_text)
+#   assert_contains   text contains value
+#   assert_regex      text matches the regular expression (re.search)
+#   assert_attribute  "name=expected"; just "name" checks the attribute is present
+#   assert_visible    "true" (default) or "false"
+#   assert_count      number of matches for the selector: "3", ">=1", "<5", ...
+#
+# In soft-assert mode (or with `"soft": true` on a step) a failed assertion is recorded
+# and the case carries on; the case still fails at the end.
+
+ASSERTION_TYPES = ("assert_text", "assert_contains", "assert_regex", "assert_attribute", "assert_visible",
+                   "assert_count")
+
+# Matchers whose element may legitimately be absent, so the page is not waited on for it.
+OPTIONAL_ELEMENT_TYPES = ("assert_count",)
+TEXT_TYPES = ("assert_text", "assert_contains", "assert_regex")
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assertions.js")
+COUNT_PATTERN = re.compile(r"^\s*(>=|<=|>|<|==)?\s*(\d+)\s*$")
+
+_bulk_script = None
+
+
+def bulk_script():
+    global _bulk_script
+    if _bulk_script is None:
+        with open(SCRIPT_PATH, "r") as f:
+            _bulk_script = f.read()
+    return _bulk_script
+
+
+def is_assertion(action):
+    return action.get("type", "") in ASSERTION_TYPES
+
+
+def requires_element(action):
+    """False for assertions that pass without their element (a count, or "not visible")."""
+    if action.get("type") in OPTIONAL_ELEMENT_TYPES:
+        return False
+    return not (action.get("type") == "assert_visible"
+                and str(action.get("value", "")).strip().lower() in ("false", "0", "no", "hidden"))
+
+
+def run_end(actions, first):
+    """Index one past the run of consecutive assertion steps starting at `first`."""
+    end = first
+    while end < len(actions) and is_assertion(actions[end]):
+        end += 1
+    return end
+
+
+def _attribute_spec(value):
+    name, sep, expected = str(value).partition("=")
+    return name.strip(), (expected if sep else None)
+
+
+def judge(action, observation):
+    """Returns (passed, message) for one assertion step given its in-page observation."""
+    action_type = action.get("type", "")
+    selector = action.get("selector", "")
+    value = "" if action.get("value") is None else str(action.get("value"))
+
+    if action_type == "assert_count":
+        match = COUNT_PATTERN.match(value)
+        if not match:
+            return False, f"Invalid count '{value}'"
+        operator, expected = match.group(1) or "==", int(match.group(2))
+        actual = observation["count"]
+        passed = {"==": actual == expected, ">=": actual >= expected, "<=": actual <= expected,
+                  ">": actual > expected, "<": actual < expected}[operator]
+        return passed, f"Expected {operator} {expected} match(es), found {actual}."
+
+    if action_type == "assert_visible":
+        expected = value.strip().lower() not in ("false", "0", "no", "hidden")
+        if observation["visible"] == expected:
+            return True, f"Element is {'visible' if expected else 'hidden'}."
+        if not observation["found"] and expected:
+            return False, f"Element not found: {selector}"
+        return False, f"Expected element to be {'visible' if expected else 'hidden'}."
+
+    if not observation["found"]:
+        return False, f"Element not found: {selector}"
+    text = observation.get("text", "")
+
+    if action_type == "assert_text":
+        if text == (value.strip() if observation.get("in_page") else value):
+            return True, f"Expected text '{value}' found."
+        return False, f"Expected '{value}', but found '{text}'."
+    if action_type == "assert_contains":
+        if value in text:
+            return True, f"Text contains '{value}'."
+        return False, f"Expected text containing '{value}', but found '{text}'."
+    if action_type == "assert_regex":
+        try:
+            matched = re.search(value, text) is not None
+        except re.error as e:
+            return False, f"Invalid pattern '{value}': {e}"
+        if matched:
+            return True, f"Text matches /{value}/."
+        return False, f"Expected text matching /{value}/, but found '{text}'."
+    if action_type == "assert_attribute":
+        name, expected = _attribute_spec(value)
+        actual = observation.get("attribute")
+        if expected is None:
+            return actual is not None, f"Attribute '{name}' {'present' if actual is not None else 'missing'}."
+        if actual == expected:
+            return True, f"Attribute '{name}' is '{expected}'."
+        return False, f"Expected attribute '{name}' to be '{expected}', but found {actual!r}."
+    return False, f"Unknown assertion type '{action_type}'"
+
+
+def run_assertions(driver, actions, first, end, timeout, log=print, timer=None, on_event=None, soft=False,
+                   in_page_text=False):
+    """Evaluates actions[first:end] (all assertions) with one in-page call.
+
+    Returns the step results. Without `soft` they stop at the first failure, matching the
+    native one-step-at-a-time semantics; with it every assertion is reported and failures
+    are marked "soft" so the run continues. `in_page_text` judges text with innerText
+    instead of reading WebDriver's element.text per text assertion.
+    """
+    specs = []
+    for action in actions[first:end]:
+        selectors, positional = step_selectors(action)
+        specs.append({
+            "selectors": selectors,
+            "positional": positional,
+            "required": requires_element(action),
+            "attribute": _attribute_spec(action.get("value", ""))[0] if action.get("type") == "assert_attribute" else None,
+        })
+
+    started = time.perf_counter()
+    try:
+        observations = driver.execute_async_script(bulk_script(), specs, int(timeout * 1000))
+        if not isinstance(observations, list) or len(observations) < len(specs):
+            raise RuntimeError("Assertion script returned no observations")
+    except Exception as e:
+        # A script error, script timeout or navigation mid-call fails the run's first step,
+        # like an exception during a native step.
+        return [_error_result(actions, first, started, e, log, timer, on_event)]
+    duration = time.perf_counter() - started
+    if timer:
+        timer.add("assertion", started, duration, first + 1, size=len(specs))
+
+    results = []
+    for offset, (action, observation) in enumerate(zip(actions[first:end], observations)):
+        i = first + offset + 1
+        action_type = action.get("type", "")
+        selector = action.get("selector", "")
+        log(f"Step {i}/{len(actions)}: {action_type} on '{selector}'")
+        observation["in_page"] = in_page_text
+        if action_type in TEXT_TYPES and observation["found"] and not in_page_text:
+            try:
+                observation["text"] = observation["element"].text
+            except Exception as e:
+                result = _error_result(actions, first + offset, time.perf_counter(), e, log, timer, on_event,
+                                       announce=False)
+                results.append(result)
+                break
+        passed, message = judge(action, observation)
+        step_soft = soft or bool(action.get("soft"))
+        # The single round-trip is shared evenly so per-step timings still add up.
+        result = {"step": i, "type": action_type, "selector": selector, "passed": passed,
+                  "message": "" if passed else message, "wait": 0.0, "duration": duration / len(specs)}
+        if observation.get("used") and observation["used"] != selector:
+            log_pipeline.warning(log, f"  Primary selector not found, used fallback '{observation['used']}'")
+            result["selector_used"] = observation["used"]
+        if passed:
+            log(f"  [Assertion Passed] {message}")
+        else:
+            log_pipeline.error(log, f"  [Assertion Failed{' (soft)' if step_soft else ''}] {message}")
+            if step_soft:
+                result["soft"] = True
+        if timer:
+            timer.add("step", started, result["duration"], i, type=action_type, selector=selector, passed=passed)
+        if on_event:
+            on_event("started", result)
+            on_event("passed" if passed else "failed", result)
+        results.append(result)
+        if not passed and not step_soft:
+            break
+    return results
+
+
+def _error_result(actions, first, started, error, log=print, timer=None, on_event=None, announce=True):
+    action = actions[first]
+    i = first + 1
+    action_type = action.get("type", "")
+    selector = action.get("selector", "")
+    if announce:
+        log(f"Step {i}/{len(actions)}: {action_type} on '{selector}'")
+    result = {"step": i, "type": action_type, "selector": selector, "passed": False, "message": str(error),
+              "wait": 0.0, "duration": time.perf_counter() - started}
+    log_pipeline.error(log, f"  Error during assertion: {error}")
+    if timer:
+        timer.add("step", started, result["duration"], i, type=action_type, selector=selector, passed=False)
+    if on_event:
+        on_event("started", result)
+        on_event("failed", result)
+    return result
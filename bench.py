@@ -0,0 +1,315 @@
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import replay
+from pool import SessionPool
+from timing import RunTimer, phase_stats, percentile
+
+# --- Replay / Recorder Benchmarks --- #
+# Usage: python bench.py [--save-baseline] [--write-cases DIR]
+# Serves synthetic fixture pages from a local HTTP server (no network needed), generates
+# test cases for them in the test_cases JSON format, and measures browser start cost,
+# replay throughput and latency, and recorder.js selector generation cost in headless
+# Chrome. Results are compared with bench_baseline.json to catch regressions.
+
+BASELINE_PATH = "bench_baseline.json"
+DEFAULT_TOLERANCE = 0.20  # Fractional slowdown tolerated before a metric counts as a regression
+
+# Metrics where a larger number is better; every other metric is a duration.
+HIGHER_IS_BETTER = {"steps_per_sec"}
+
+
+# --- Fixture Pages --- #
+def page(title, body, script=""):
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title></head>
+<body>{body}<script>{script}</script></body></html>"""
+
+
+def wide_page(rows):
+    items = "".join(f'<li><span>Item {i}</span><button type="button">Select</button></li>' for i in range(rows))
+    script = """
+document.getElementById('list').addEventListener('click', function(event) {
+    if (event.target.tagName === 'BUTTON') {
+        document.getElementById('status').textContent = event.target.previousElementSibling.textContent;
+    }
+});"""
+    return page("Wide DOM", f'<div id="status">none</div><ul id="list">{items}</ul>', script)
+
+
+def deep_page(depth):
+    opening = "".join(f'<div class="level-{i}">' for i in range(depth))
+    closing = "</div>" * depth
+    return page("Deep DOM", f'{opening}<p>Deepest</p><button type="button">Deep</button>{closing}<div id="status">idle</div>',
+                "document.querySelector('button').addEventListener('click', () => "
+                "{ document.getElementById('status').textContent = 'clicked'; });")
+
+
+def xhr_page(delay_ms):
+    script = f"""
+document.getElementById('load').addEventListener('click', function() {{
+    fetch('/api/data?delay={delay_ms}').then(r => r.json()).then(data => {{
+        document.getElementById('content').textContent = data.message;
+    }});
+}});"""
+    return page("Delayed XHR", '<button id="load" type="button">Load</button><div id="content">waiting</div>', script)
+
+
+def form_page(fields):
+    inputs = "".join(f'<label>Field {i} <input name="field{i}" type="text"></label>' for i in range(fields))
+    script = """
+document.getElementById('form').addEventListener('submit', function(event) {
+    event.preventDefault();
+    const filled = Array.from(this.elements).filter(e => e.name && e.value).length;
+    document.getElementById('status').textContent = 'filled ' + filled;
+});"""
+    return page("Form", f'<form id="form">{inputs}<button id="submit" type="submit">Submit</button></form>'
+                        '<div id="status">empty</div>', script)
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: int(values[0]) for key, values in parse_qs(url.query).items() if values[0].isdigit()}
+        if url.path == "/api/data":
+            time.sleep(query.get("delay", 0) / 1000.0)
+            self._send(json.dumps({"message": "loaded"}), "application/json")
+        elif url.path == "/wide":
+            self._send(wide_page(query.get("rows", 2000)))
+        elif url.path == "/deep":
+            self._send(deep_page(query.get("depth", 150)))
+        elif url.path == "/xhr":
+            self._send(xhr_page(query.get("delay", 300)))
+        elif url.path == "/form":
+            self._send(form_page(query.get("fields", 50)))
+        else:
+            self.send_error(404)
+
+    def _send(self, body, content_type="text/html; charset=utf-8"):
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# --- Generated Cases --- #
+def build_cases(base_url):
+    rows, depth, fields = 2000, 150, 50
+    deep_path = " > ".join(["body"] + [f"div.level-{i}" for i in range(depth)] + ["button"])
+    return {
+        "wide_dom": {
+            "url": f"{base_url}/wide?rows={rows}",
+            "actions": [
+                {"type": "click", "selector": f"#list > li:nth-of-type({rows}) > button", "value": ""},
+                {"type": "assert_text", "selector": "#status", "value": f"Item {rows - 1}"},
+                {"type": "click", "selector": f"#list > li:nth-of-type({rows // 2}) > button", "value": ""},
+                {"type": "assert_text", "selector": "#status", "value": f"Item {rows // 2 - 1}"},
+            ],
+        },
+        "deep_nesting": {
+            "url": f"{base_url}/deep?depth={depth}",
+            "actions": [
+                {"type": "click", "selector": deep_path, "value": ""},
+                {"type": "assert_text", "selector": "#status", "value": "clicked"},
+            ],
+        },
+        "delayed_xhr": {
+            "url": f"{base_url}/xhr?delay=300",
+            "actions": [
+                {"type": "click", "selector": "#load", "value": ""},
+                {"type": "assert_text", "selector": "#content", "value": "loaded"},
+            ],
+        },
+        "many_inputs": {
+            "url": f"{base_url}/form?fields={fields}",
+            "actions": [{"type": "input", "selector": f'input[name="field{i}"]', "value": f"value {i}"}
+                        for i in range(fields)] + [
+                {"type": "click", "selector": "#submit", "value": ""},
+                {"type": "assert_text", "selector": "#status", "value": f"filled {fields}"},
+            ],
+        },
+    }
+
+
+def write_cases(cases, directory):
+    os.makedirs(directory, exist_ok=True)
+    for name, test_case in cases.items():
+        with open(os.path.join(directory, f"bench_{name}.json"), "w") as f:
+            json.dump(test_case, f, indent=4)
+
+
+# --- Measurements --- #
+def measure_browser_start(samples):
+    cold = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        driver = replay.start_driver(headless=True)
+        cold.append(time.perf_counter() - started)
+        driver.quit()
+
+    session_pool = SessionPool(size=1)
+    session_pool.prewarm(headless=True)
+    warm = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        driver = session_pool.acquire(headless=True)
+        warm.append(time.perf_counter() - started)
+        session_pool.release(driver, headless=True)
+    session_pool.close()
+    return {"browser_start_cold_s": sorted(cold)[len(cold) // 2], "browser_start_warm_s": sorted(warm)[len(warm) // 2]}
+
+
+def measure_replay(cases, rounds):
+    metrics = {}
+    session_pool = SessionPool(size=1)
+    all_step_spans = []
+    try:
+        for name, test_case in cases.items():
+            step_durations = []
+            total_time = 0.0
+            total_steps = 0
+            for _ in range(rounds):
+                outcome = replay.run_test_case(test_case, headless=True, log=lambda text: None, pool=session_pool)
+                if not outcome["passed"]:
+                    raise RuntimeError(f"Benchmark case '{name}' failed: {outcome['error'] or outcome['steps'][-1]}")
+                timer = RunTimer.from_dict(outcome["timing"])
+                spans = [span for span in timer.spans if span["phase"] == "step"]
+                all_step_spans.extend(spans)
+                step_durations.extend(span["duration"] for span in spans)
+                total_time += sum(span["duration"] for span in spans)
+                total_steps += len(spans)
+            step_durations.sort()
+            metrics[f"{name}.steps_per_sec"] = total_steps / total_time if total_time else 0.0
+            metrics[f"{name}.step_p50_s"] = percentile(step_durations, 50)
+            metrics[f"{name}.step_p95_s"] = percentile(step_durations, 95)
+    finally:
+        session_pool.close()
+    overall = phase_stats(all_step_spans).get("step")
+    if overall:
+        metrics["all.steps_per_sec"] = overall["count"] / overall["total"] if overall["total"] else 0.0
+        metrics["all.step_p50_s"] = overall["p50"]
+        metrics["all.step_p95_s"] = overall["p95"]
+    return metrics
+
+
+# Times window.__quatyRecorder.getSelectors over every element, cold and then memoized.
+SELECTOR_BENCH_SCRIPT = """
+const elements = Array.from(document.body.querySelectorAll('*'));
+const recorder = window.__quatyRecorder;
+let started = performance.now();
+for (const element of elements) recorder.getSelectors(element);
+const cold = performance.now() - started;
+started = performance.now();
+for (const element of elements) recorder.getSelectors(element);
+const cached = performance.now() - started;
+return { count: elements.length, cold_ms: cold, cached_ms: cached };
+"""
+
+
+def measure_selectors(base_url):
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "recorder.js"), "r") as f:
+        recorder_script = f.read()
+    metrics = {}
+    driver = replay.start_driver(headless=True)
+    try:
+        for name, path in (("wide_dom", "/wide?rows=2000"), ("deep_nesting", "/deep?depth=150"),
+                           ("many_inputs", "/form?fields=50")):
+            driver.get(base_url + path)
+            driver.execute_script(recorder_script)
+            result = driver.execute_script(SELECTOR_BENCH_SCRIPT)
+            count = max(result["count"], 1)
+            metrics[f"{name}.get_selector_us"] = result["cold_ms"] * 1000 / count
+            metrics[f"{name}.get_selector_cached_us"] = result["cached_ms"] * 1000 / count
+    finally:
+        driver.quit()
+    return metrics
+
+
+# --- Baseline Comparison --- #
+def compare(results, baseline, tolerance):
+    """Returns (metric, baseline, current, change) tuples for metrics that regressed."""
+    regressions = []
+    for metric, current in results.items():
+        previous = baseline.get(metric)
+        if not previous:
+            continue
+        change = (current - previous) / previous
+        worse = -change if metric.rsplit(".", 1)[-1] in HIGHER_IS_BETTER else change
+        if worse > tolerance:
+            regressions.append((metric, previous, current, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="QUATY replay and recorder benchmarks")
+    parser.add_argument("--rounds", type=int, default=3, help="Replays per fixture case")
+    parser.add_argument("--start-samples", type=int, default=3, help="Browser launches to sample")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed fractional slowdown")
+    parser.add_argument("--write-cases", help="Also write the generated fixture test cases to this directory")
+    parser.add_argument("--output", help="Write the results JSON here as well")
+    args = parser.parse_args(argv)
+
+    server, base_url = start_fixture_server()
+    try:
+        cases = build_cases(base_url)
+        if args.write_cases:
+            write_cases(cases, args.write_cases)
+        results = {}
+        print("Measuring browser start cost...")
+        results.update(measure_browser_start(args.start_samples))
+        print("Measuring replay throughput...")
+        results.update(measure_replay(cases, args.rounds))
+        print("Measuring recorder selector generation...")
+        results.update(measure_selectors(base_url))
+    finally:
+        server.shutdown()
+
+    for metric in sorted(results):
+        print(f"  {metric:<40} {results[metric]:.4f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if not regressions:
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+        return 0
+    print("--- Regressions ---")
+    for metric, previous, current, change in regressions:
+        print(f"  {metric}: {previous:.4f} -> {current:.4f} ({change:+.1%})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
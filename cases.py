@@ -0,0 +1,60 @@
+
+import json
+import os
+
+# --- Test Case Files --- #
+# Reading and discovering test case JSON documents. Kept free of Selenium so the GUI can
+# index cases at startup without loading the browser stack; replay re-exports both.
+
+
+def load_test_case(file_path):
+    with open(file_path, 'r') as f:
+        return json.load(f)
+
+
+def collect_test_cases(paths):
+    """Expands files and directories into a sorted list of test case JSON paths."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs[:] = [d for d in dirs if not d.startswith('.')]
+                for name in files:
+                    if name.endswith('.json') and not name.startswith('.'):
+                        found.append(os.path.join(root, name))
+        elif os.path.isfile(path):
+            found.append(path)
+    return sorted(set(found))
+
+
+def suite_root(paths):
+    """The deepest directory containing every given case file."""
+    if not paths:
+        return os.getcwd()
+    return os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+
+
+def suite_name(path, root):
+    """The case's path relative to the suite root, with '/' separators and no extension."""
+    relative = os.path.relpath(os.path.abspath(path), root)
+    return os.path.splitext(relative)[0].replace(os.sep, "/")
+
+
+# --- Step Selectors --- #
+# recorder.js ranks an element's selectors: stable id/attribute ones first, then a
+# positional path (tag > tag:nth-of-type(n) ...). A positional path matches whatever sits
+# at that spot, so while the page is still rendering it can hit some other element before
+# the recorded one appears. Replay therefore polls the primary selector and the stable
+# fallbacks, and tries positional fallbacks only once that wait has timed out.
+
+
+def is_positional(selector):
+    return " > " in selector or ":nth-" in selector or not any(c in selector for c in "#[")
+
+
+def step_selectors(action):
+    """Returns (selectors to poll, positional fallbacks to try after the timeout)."""
+    primary = action.get("selector", "")
+    fallbacks = [selector for selector in action.get("selectors", []) if selector != primary]
+    return ([primary] + [selector for selector in fallbacks if not is_positional(selector)],
+            [selector for selector in fallbacks if is_positional(selector)])
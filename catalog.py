@@ -0,0 +1,198 @@
+
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import cases
+
+# --- Test Case Catalog --- #
+# A small SQLite index over test_cases/ so the explorer can search thousands of cases
+# without opening them. Each case is keyed by path and revalidated by mtime/size; the
+# content hash avoids re-parsing files that were touched but not changed. Opened cases go
+# through an LRU cache of parsed JSON.
+
+DEFAULT_DB_PATH = os.path.join(".quaty", "catalog.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cases (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    url TEXT NOT NULL DEFAULT '',
+    step_count INTEGER NOT NULL DEFAULT 0,
+    action_types TEXT NOT NULL DEFAULT '{}',
+    tags TEXT NOT NULL DEFAULT '[]',
+    error TEXT,
+    last_result TEXT,
+    last_run_at REAL
+);
+CREATE INDEX IF NOT EXISTS cases_url ON cases (url);
+CREATE INDEX IF NOT EXISTS cases_last_result ON cases (last_result);
+"""
+
+
+def parse_query(text):
+    """Splits a search box query into free text and `type:`, `tag:` and `result:` filters."""
+    filters = {"text": [], "type": None, "tag": None, "result": None}
+    for token in text.split():
+        key, sep, value = token.partition(":")
+        if sep and key in ("type", "tag", "result") and value:
+            filters[key] = value
+        else:
+            filters["text"].append(token)
+    filters["text"] = " ".join(filters["text"])
+    return filters
+
+
+class CaseCatalog:
+    def __init__(self, root, db_path=DEFAULT_DB_PATH, cache_size=64):
+        self.root = os.path.abspath(root)
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(SCHEMA)
+        self._cache = collections.OrderedDict()
+        self._cache_size = cache_size
+
+    def refresh(self):
+        """Brings the index in line with the files on disk. Returns (added, updated, removed).
+
+        Files are read and parsed outside the lock, so searches stay responsive while a
+        refresh runs on a background thread.
+        """
+        on_disk = {}
+        for path in cases.collect_test_cases([self.root]):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            on_disk[os.path.abspath(path)] = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            indexed = {row["path"]: (row["mtime_ns"], row["size"], row["hash"])
+                       for row in self._db.execute("SELECT path, mtime_ns, size, hash FROM cases")}
+        added = updated = 0
+        for path, (mtime_ns, size) in on_disk.items():
+            row = indexed.get(path)
+            if row and row[:2] == (mtime_ns, size):
+                continue
+            if self._index_file(path, mtime_ns, size, row[2] if row else None):
+                if row:
+                    updated += 1
+                else:
+                    added += 1
+        removed = [path for path in indexed if path not in on_disk]
+        with self._lock:
+            self._db.executemany("DELETE FROM cases WHERE path = ?", [(path,) for path in removed])
+            self._db.commit()
+        return added, updated, len(removed)
+
+    def watch_paths(self):
+        """The directories under the root, for a file system watcher. Files are not watched:
+        kqueue (macOS/BSD) holds a descriptor per watched path, so edits in place are found
+        by the stat check of refresh() instead."""
+        paths = []
+        for root, dirs, _ in os.walk(self.root):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            paths.append(root)
+        return paths
+
+    def _index_file(self, path, mtime_ns, size, known_hash):
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+        except OSError:
+            return False
+        digest = hashlib.sha256(content).hexdigest()
+        if digest == known_hash:
+            # Touched but unchanged: only the stat key moves.
+            with self._lock:
+                self._db.execute("UPDATE cases SET mtime_ns = ?, size = ? WHERE path = ?", (mtime_ns, size, path))
+            return False
+
+        url, actions, tags, error = "", [], [], None
+        try:
+            test_case = json.loads(content)
+            url = test_case.get("url", "")
+            actions = test_case.get("actions", [])
+            tags = test_case.get("tags", [])
+        except (ValueError, AttributeError) as e:
+            error = str(e)
+        histogram = collections.Counter(str(action.get("type", "")) for action in actions if isinstance(action, dict))
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO cases (path, mtime_ns, size, hash, url, step_count, action_types, tags, error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET mtime_ns = excluded.mtime_ns, size = excluded.size, "
+                "hash = excluded.hash, url = excluded.url, step_count = excluded.step_count, "
+                "action_types = excluded.action_types, tags = excluded.tags, error = excluded.error",
+                (path, mtime_ns, size, digest, url, len(actions), json.dumps(histogram), json.dumps(tags), error),
+            )
+        return True
+
+    def search(self, query="", limit=None):
+        """Returns matching cases as dicts, ordered by path. See parse_query for the syntax."""
+        filters = parse_query(query)
+        clauses, params = [], []
+        if filters["text"]:
+            clauses.append("(path LIKE ? OR url LIKE ?)")
+            params += [f"%{filters['text']}%"] * 2
+        if filters["type"]:
+            clauses.append("EXISTS (SELECT 1 FROM json_each(cases.action_types) WHERE key = ?)")
+            params.append(filters["type"])
+        if filters["tag"]:
+            clauses.append("EXISTS (SELECT 1 FROM json_each(cases.tags) WHERE value = ?)")
+            params.append(filters["tag"])
+        if filters["result"]:
+            clauses.append("last_result = ?")
+            params.append(filters["result"])
+        sql = "SELECT * FROM cases"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY path"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def _row_to_dict(self, row):
+        case = dict(row)
+        case["action_types"] = json.loads(case["action_types"])
+        case["tags"] = json.loads(case["tags"])
+        case["name"] = os.path.relpath(case["path"], self.root)
+        return case
+
+    def record_result(self, path, passed):
+        with self._lock:
+            self._db.execute("UPDATE cases SET last_result = ?, last_run_at = ? WHERE path = ?",
+                             ("passed" if passed else "failed", time.time(), os.path.abspath(path)))
+            self._db.commit()
+
+    def load(self, path):
+        """Returns the parsed test case, from the LRU cache while the file is unchanged.
+
+        The returned dict is shared with the cache and must be treated as read-only.
+        """
+        path = os.path.abspath(path)
+        mtime_ns = os.stat(path).st_mtime_ns
+        cached = self._cache.get(path)
+        if cached and cached[0] == mtime_ns:
+            self._cache.move_to_end(path)
+            return cached[1]
+        test_case = cases.load_test_case(path)
+        self._cache[path] = (mtime_ns, test_case)
+        self._cache.move_to_end(path)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return test_case
+
+    def close(self):
+        with self._lock:
+            self._db.close()
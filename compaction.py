@@ -0,0 +1,104 @@
+
+import difflib
+
+# --- Recorded-Step Compaction --- #
+# recorder.js emits every click and every input burst, so recordings carry steps that only cost
+# a lookup, a settle wait and a round-trip at replay. compact() drops the ones that are
+# provably redundant because they are adjacent to a step that subsumes them:
+#
+#   repeated_input      input on S directly followed by another input on S (clear + type wins)
+#   repeated_assertion  the same assert_text directly repeated
+#   repeated_scroll     scroll of S directly followed by another scroll of S (the last position wins)
+#   hover_before_click  hover on S directly followed by click on S (the click moves the pointer there)
+#
+# suspects() only reports steps that are often, but not provably, redundant; they are never
+# dropped automatically:
+#
+#   click_before_input  click on S directly followed by input on S (the click may open a
+#                       dropdown or toggle a checkbox or select)
+#   double_click        click on S repeated within DOUBLE_CLICK_MS (an increment or "add"
+#                       button counts both clicks)
+#
+# Steps that are not adjacent are never merged, since anything in between may depend on them.
+
+DOUBLE_CLICK_MS = 500
+
+
+def _same_target(a, b):
+    return a.get("selector", "") == b.get("selector", "")
+
+
+def redundancy(action, following):
+    """The rule that makes `action` redundant given the step right after it, or None."""
+    action_type = action.get("type", "")
+    following_type = following.get("type", "")
+    if not _same_target(action, following):
+        return None
+    if action_type == "input" and following_type == "input":
+        return "repeated_input"
+    if action_type == "assert_text" and following_type == "assert_text" and action.get("value") == following.get("value"):
+        return "repeated_assertion"
+    if action_type == "scroll" and following_type == "scroll":
+        return "repeated_scroll"
+    if action_type == "hover" and following_type == "click":
+        return "hover_before_click"
+    return None
+
+
+def _is_double_click(kept, action):
+    if kept.get("type") != "click" or action.get("type") != "click" or not _same_target(kept, action):
+        return False
+    if not isinstance(kept.get("t"), (int, float)) or not isinstance(action.get("t"), (int, float)):
+        return False
+    return 0 <= action["t"] - kept["t"] <= DOUBLE_CLICK_MS
+
+
+def compact(actions):
+    """Returns (compacted actions, changes); each change is {"rule", "step"} (1-based, original numbering)."""
+    compacted = []
+    changes = []
+    for i, action in enumerate(actions):
+        following = actions[i + 1] if i + 1 < len(actions) else None
+        rule = redundancy(action, following) if following is not None else None
+        if rule:
+            changes.append({"rule": rule, "step": i + 1})
+            continue
+        compacted.append(action)
+    return compacted, changes
+
+
+def suspects(actions):
+    """Steps that may be redundant but are left in: [{"rule", "step"}] (1-based)."""
+    found = []
+    for i, action in enumerate(actions):
+        following = actions[i + 1] if i + 1 < len(actions) else None
+        if following is not None and _same_target(action, following) and action.get("type") == "click" \
+                and following.get("type") == "input":
+            found.append({"rule": "click_before_input", "step": i + 1})
+        elif i > 0 and _is_double_click(actions[i - 1], action):
+            found.append({"rule": "double_click", "step": i + 1})
+    return found
+
+
+def describe(action):
+    line = f"{action.get('type', ''):<12} {action.get('selector', '')}"
+    if action.get("value") not in (None, ""):
+        line += f"  = {action['value']!r}"
+    return line
+
+
+def diff_lines(before, after, name="case"):
+    """A unified diff of the two step lists, one line per step."""
+    return list(difflib.unified_diff([describe(action) for action in before], [describe(action) for action in after],
+                                     fromfile=f"{name} (recorded)", tofile=f"{name} (compacted)", lineterm=""))
+
+
+def suspect_lines(suspects):
+    return [f"Step {suspect['step']} may be redundant ({suspect['rule']}), left in" for suspect in suspects]
+
+
+def summarize(changes):
+    counts = {}
+    for change in changes:
+        counts[change["rule"]] = counts.get(change["rule"], 0) + 1
+    return ", ".join(f"{rule}: {count}" for rule, count in sorted(counts.items()))
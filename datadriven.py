@@ -0,0 +1,134 @@
+
+import copy
+import csv
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import artifacts
+import history
+import pool
+import replay
+
+# --- Data-Driven Execution --- #
+# `${column}` placeholders in a case's url and in each step's selector/value are bound to
+# the rows of a CSV file, and every row runs as an independent replay. Rows are streamed
+# from disk and only a bounded number are in flight at once, so memory stays constant no
+# matter how large the data file is.
+
+PLACEHOLDER = re.compile(r"\$\{([^}]+)\}")
+BOUND_FIELDS = ("selector", "value")
+
+# How many rows may be queued per worker before the reader waits for results.
+IN_FLIGHT_PER_WORKER = 2
+
+
+def bind_text(text, row):
+    if not isinstance(text, str) or "${" not in text:
+        return text
+
+    def substitute(match):
+        column = match.group(1).strip()
+        if column not in row:
+            raise KeyError(f"CSV has no column '{column}'")
+        return row[column] if row[column] is not None else ""
+
+    return PLACEHOLDER.sub(substitute, text)
+
+
+def bind_test_case(test_case, row):
+    """Returns a copy of the test case with every placeholder replaced by the row's values."""
+    bound = copy.deepcopy(test_case)
+    bound["url"] = bind_text(bound.get("url", ""), row)
+    for action in bound.get("actions", []):
+        for field in BOUND_FIELDS:
+            if field in action:
+                action[field] = bind_text(action[field], row)
+        if "selectors" in action:
+            action["selectors"] = [bind_text(selector, row) for selector in action["selectors"]]
+    return bound
+
+
+def check_csv(csv_path):
+    """Reads the header and first row up front. Raises OSError for a missing or unreadable
+    file and ValueError for one without a header or without any data rows."""
+    try:
+        with open(csv_path, "r", newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            if not reader.fieldnames:
+                raise ValueError(f"{csv_path} has no header row")
+            if next(reader, None) is None:
+                raise ValueError(f"{csv_path} has no data rows")
+            return reader.fieldnames
+    except csv.Error as e:
+        raise ValueError(f"{csv_path}: {e}")
+
+
+def iter_rows(csv_path):
+    """Yields (row_number, row_dict) lazily; row numbers start at 1 after the header."""
+    with open(csv_path, "r", newline="", encoding="utf-8-sig") as f:
+        for row_number, row in enumerate(csv.DictReader(f), 1):
+            yield row_number, row
+
+
+# --- Worker Process Side --- #
+_test_case = None
+_policy = None
+_artifact_settings = None
+
+
+def init_worker(test_case, headless=True, max_uses=25, policy=None, artifact_settings=None):
+    """Ships the (unbound) case, its network policy and the artifact settings (directory,
+    budget MB, every N steps) to each worker once instead of with every row."""
+    global _test_case, _policy, _artifact_settings
+    _test_case = test_case
+    _policy = policy
+    _artifact_settings = artifact_settings
+    pool.init_worker(headless, max_uses)
+
+
+def _quiet(text):
+    pass
+
+
+def _stderr(text):
+    sys.stderr.write(f"{text}\n")
+
+
+def run_row(row_number, row, headless=True, verbose=False, fast=False, soft_assert=False):
+    log = _stderr if verbose else _quiet
+    try:
+        bound = bind_test_case(_test_case, row)
+    except KeyError as e:
+        return {"row": row_number, "data": row, "url": "", "passed": False, "steps": [], "duration": 0.0,
+                "error": e.args[0]}
+    run_artifacts = None
+    if _artifact_settings and _artifact_settings[0]:
+        directory, budget, every = _artifact_settings
+        run_artifacts = artifacts.RunArtifacts(artifacts.worker_writer(directory, budget),
+                                               artifacts.run_id(f"row{row_number}"), every)
+    outcome = replay.run_test_case(bound, headless=headless, log=log, pool=pool.worker_pool(), fast=fast,
+                                   policy=_policy, soft_assert=soft_assert, artifacts=run_artifacts)
+    outcome["row"] = row_number
+    outcome["data"] = row
+    outcome["case_hash"] = history.case_hash(bound)
+    return outcome
+
+
+def execute(test_case, csv_path, workers, headless=True, max_uses=25, verbose=False, fast=False, policy=None,
+            soft_assert=False, artifact_settings=None):
+    """Runs one replay per CSV row across `workers` processes, yielding outcomes as they finish."""
+    max_in_flight = workers * IN_FLIGHT_PER_WORKER
+    in_flight = set()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(test_case, headless, max_uses, policy, artifact_settings)) as executor:
+        for row_number, row in iter_rows(csv_path):
+            if len(in_flight) >= max_in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            in_flight.add(executor.submit(run_row, row_number, row, headless, verbose, fast, soft_assert))
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
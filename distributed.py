@@ -0,0 +1,260 @@
+
+import collections
+import json
+import os
+import platform
+import queue
+import threading
+import time
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Distributed Execution --- #
+# A coordinator hands out test cases to worker agents over plain HTTP + JSON, so any box
+# with Chrome and this checkout can add browsers to a suite run. Workers pull work; they
+# can join at any time and leave by simply stopping.
+#
+#   POST /lease      {worker}                  -> {job, path, case, policy, options} or {job: null, done}
+#   POST /heartbeat  {worker, job, events}     -> {ok}; events are the step results since the last beat
+#   POST /result     {worker, job, outcome}    -> {ok}
+#
+# A lease that is not renewed by a heartbeat within LEASE_TIMEOUT is considered lost and
+# its case goes back to the front of the queue, up to MAX_ATTEMPTS times. A result that
+# arrives for a lost lease is dropped, since the case has been handed to someone else.
+# There is no authentication: bind the coordinator to a trusted network only.
+
+DEFAULT_PORT = 8765
+LEASE_TIMEOUT = 15.0     # Seconds without a heartbeat before a lease is lost
+HEARTBEAT_INTERVAL = 2.0
+IDLE_POLL = 1.0          # Seconds an idle worker waits before asking again
+MAX_ATTEMPTS = 3         # Leases per case before it is failed
+REQUEST_TIMEOUT = 10
+RESULT_RETRIES = 5
+
+
+# --- Coordinator --- #
+class Coordinator:
+    def __init__(self, jobs, options=None, lease_timeout=LEASE_TIMEOUT, max_attempts=MAX_ATTEMPTS,
+                 on_event=None, log=print):
+        """`jobs` are {"path", "case", "policy"} dicts; `options` go out with every lease."""
+        self.options = options or {}
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.on_event = on_event  # (path, worker, event) for every streamed step result
+        self.log = log
+        self.outcomes = queue.Queue()  # Finished (or given up) outcomes, for the caller
+        self.workers = {}              # worker id -> last time it was heard from
+        self._pending = collections.deque(jobs)
+        self._attempts = collections.Counter()
+        self._leases = {}
+        self._remaining = len(jobs)
+        self._lock = threading.Lock()
+
+    def finished(self):
+        with self._lock:
+            return self._remaining == 0
+
+    def lease(self, worker):
+        with self._lock:
+            self.workers[worker] = time.time()
+            self._reap()
+            if not self._pending:
+                return {"job": None, "done": self._remaining == 0}
+            job = self._pending.popleft()
+            job_id = uuid.uuid4().hex
+            self._attempts[job["path"]] += 1
+            self._leases[job_id] = {"job": job, "worker": worker, "deadline": time.monotonic() + self.lease_timeout}
+        self.log(f"[LEASE] {job['path']} -> {worker}")
+        return {"job": job_id, "path": job["path"], "case": job["case"], "policy": job["policy"],
+                "options": self.options}
+
+    def heartbeat(self, worker, job_id, events=()):
+        with self._lock:
+            self.workers[worker] = time.time()
+            lease = self._leases.get(job_id)
+            alive = lease is not None and lease["worker"] == worker
+            if alive:
+                lease["deadline"] = time.monotonic() + self.lease_timeout
+        if alive and self.on_event:
+            for event in events:
+                self.on_event(lease["job"]["path"], worker, event)
+        return {"ok": alive}
+
+    def complete(self, worker, job_id, outcome):
+        with self._lock:
+            self.workers[worker] = time.time()
+            lease = self._leases.get(job_id)
+            if lease is None or lease["worker"] != worker:
+                lease = None
+            else:
+                del self._leases[job_id]
+                self._remaining -= 1
+        if lease is None:
+            self.log(f"[LATE] Dropped a result from {worker} for a lease it no longer holds")
+            return {"ok": False}
+        outcome["path"] = lease["job"]["path"]
+        outcome["worker"] = worker
+        self.outcomes.put(outcome)
+        return {"ok": True}
+
+    def reap(self):
+        with self._lock:
+            self._reap()
+
+    def _reap(self):
+        """Re-queues (or fails) the cases of expired leases. Call with the lock held."""
+        now = time.monotonic()
+        for job_id, lease in list(self._leases.items()):
+            if lease["deadline"] > now:
+                continue
+            del self._leases[job_id]
+            path = lease["job"]["path"]
+            if self._attempts[path] >= self.max_attempts:
+                self._remaining -= 1
+                self.log(f"[LOST] {path} on {lease['worker']}, giving up after {self._attempts[path]} attempt(s)")
+                self.outcomes.put({"path": path, "url": lease["job"]["case"].get("url", ""), "passed": False,
+                                   "steps": [], "duration": 0.0, "worker": lease["worker"],
+                                   "error": f"Lost {self._attempts[path]} worker(s) while running this case"})
+            else:
+                self.log(f"[LOST] {path} on {lease['worker']}, re-queued")
+                self._pending.appendleft(lease["job"])
+
+
+def _handler(coordinator):
+    routes = {
+        "/lease": lambda body: coordinator.lease(body["worker"]),
+        "/heartbeat": lambda body: coordinator.heartbeat(body["worker"], body["job"], body.get("events", [])),
+        "/result": lambda body: coordinator.complete(body["worker"], body["job"], body["outcome"]),
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            route = routes.get(self.path)
+            if route is None:
+                self.send_error(404)
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                reply = json.dumps(route(body)).encode("utf-8")
+            except (ValueError, KeyError) as e:
+                self.send_error(400, str(e))
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(reply)))
+            self.end_headers()
+            self.wfile.write(reply)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(coordinator, host="127.0.0.1", port=DEFAULT_PORT):
+    """Starts the coordinator's HTTP server on a background thread; call shutdown() when done."""
+    server = ThreadingHTTPServer((host, port), _handler(coordinator))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- Worker Agent --- #
+def _post(url, route, payload):
+    request = urllib.request.Request(url.rstrip("/") + route, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+        return json.loads(response.read())
+
+
+def worker_id():
+    return f"{platform.node()}-{os.getpid()}"
+
+
+class _Heartbeat:
+    """Renews a lease and streams the step results collected since the previous beat."""
+
+    def __init__(self, url, worker, job_id):
+        self.url = url
+        self.worker = worker
+        self.job_id = job_id
+        self.lost = threading.Event()
+        self._events = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def on_event(self, kind, result):
+        if kind != "started":
+            with self._lock:
+                self._events.append({"kind": kind, "result": dict(result)})
+
+    def beat(self):
+        with self._lock:
+            events, self._events = self._events, []
+        try:
+            if not _post(self.url, "/heartbeat", {"worker": self.worker, "job": self.job_id, "events": events})["ok"]:
+                self.lost.set()
+        except OSError:
+            with self._lock:
+                self._events[:0] = events
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.beat()
+
+    def _run(self):
+        while not self._stop.wait(HEARTBEAT_INTERVAL):
+            self.beat()
+
+
+def run_worker(url, run_case, log=print, worker=None):
+    """Leases and runs cases from the coordinator at `url` until the suite is done.
+
+    `run_case(lease, on_event, stop_event)` replays one leased case and returns its outcome;
+    `stop_event` is set when the lease is lost so the replay can stop early.
+    """
+    worker = worker or worker_id()
+    log(f"Worker {worker} joining {url}")
+    unreachable_since = None
+    while True:
+        try:
+            lease = _post(url, "/lease", {"worker": worker})
+            unreachable_since = None
+        except OSError as e:
+            unreachable_since = unreachable_since or time.monotonic()
+            if time.monotonic() - unreachable_since > LEASE_TIMEOUT:
+                log(f"Coordinator unreachable for {LEASE_TIMEOUT:.0f}s, leaving: {e}")
+                return
+            time.sleep(IDLE_POLL)
+            continue
+        if lease["job"] is None:
+            if lease["done"]:
+                log("Suite finished, leaving.")
+                return
+            time.sleep(IDLE_POLL)
+            continue
+
+        log(f"Running {lease['path']}")
+        heartbeat = _Heartbeat(url, worker, lease["job"])
+        try:
+            outcome = run_case(lease, heartbeat.on_event, heartbeat.lost)
+        except Exception as e:
+            outcome = {"url": lease["case"].get("url", ""), "passed": False, "steps": [], "duration": 0.0,
+                       "error": f"Worker error: {e}"}
+        finally:
+            heartbeat.stop()
+        if heartbeat.lost.is_set():
+            log(f"Lease on {lease['path']} was lost, dropping its result")
+            continue
+        log(f"[{'PASS' if outcome['passed'] else 'FAIL'}] {lease['path']} ({outcome['duration']:.1f}s)")
+        for attempt in range(RESULT_RETRIES):
+            try:
+                _post(url, "/result", {"worker": worker, "job": lease["job"], "outcome": outcome})
+                break
+            except OSError as e:
+                log(f"Could not report the result ({e}), retrying")
+                time.sleep(IDLE_POLL * (attempt + 1))
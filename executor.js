@@ -0,0 +1,131 @@
+
+// This script runs a batch of consecutive replay steps inside the page in a single
+// `execute_async_script` round-trip (see pipeline.py). For each step it waits for the
+// element, acts on it, and reports a per-step result.
+//
+// arguments[0]: steps, each {type, selectors, positional, value}; `positional` fallbacks
+//               are only tried once the element timeout has passed
+// arguments[1]: per-step element timeout in milliseconds
+// arguments[2]: time budget for the whole batch in milliseconds; a later step still waiting
+//               for its element when the budget runs out is handed back to run natively,
+//               with only what is left of its own element timeout
+// The reply is {results: [...], native: index|null, reason, waited}. `native` is the batch
+// index of a step the page cannot perform faithfully (it needs trusted input events) or
+// that ran out of budget; Python runs that step through WebDriver and continues from
+// there. `waited` is how long (ms) that step already waited for its element.
+
+const steps = arguments[0];
+const timeoutMs = arguments[1];
+const budgetMs = arguments[2];
+const callback = arguments[arguments.length - 1];
+const batchStarted = performance.now();
+const results = [];
+
+// Inputs whose value cannot be set faithfully from script.
+const NATIVE_INPUT_TYPES = ['file', 'checkbox', 'radio', 'range', 'color', 'date', 'datetime-local', 'month', 'time', 'week'];
+
+function find(selectors) {
+    for (const selector of selectors) {
+        try {
+            const element = document.querySelector(selector);
+            if (element) {
+                return [element, selector];
+            }
+        } catch (e) {
+            // Invalid selector: try the next candidate.
+        }
+    }
+    return [null, null];
+}
+
+function needsNative(step, element) {
+    if (step.type !== 'input') {
+        return false;
+    }
+    if (element.isContentEditable) {
+        return true;
+    }
+    if (element instanceof HTMLInputElement) {
+        return NATIVE_INPUT_TYPES.includes(element.type);
+    }
+    return !(element instanceof HTMLTextAreaElement || element instanceof HTMLSelectElement);
+}
+
+// Uses the prototype's value setter so framework-controlled inputs (React, Vue) see the change.
+function setValue(element, value) {
+    const prototype = Object.getPrototypeOf(element);
+    const descriptor = Object.getOwnPropertyDescriptor(prototype, 'value');
+    element.focus();
+    if (descriptor && descriptor.set) {
+        descriptor.set.call(element, value);
+    } else {
+        element.value = value;
+    }
+    element.dispatchEvent(new Event('input', { bubbles: true }));
+    element.dispatchEvent(new Event('change', { bubbles: true }));
+}
+
+function finish(native, reason, waited) {
+    callback({ results: results, native: native === undefined ? null : native, reason: reason || null,
+               waited: waited || 0 });
+}
+
+function runStep(index) {
+    if (index >= steps.length) {
+        finish();
+        return;
+    }
+    const step = steps[index];
+    const started = performance.now();
+
+    (function attempt() {
+        const timedOut = performance.now() - started >= timeoutMs;
+        let [element, used] = find(step.selectors);
+        if (!element && timedOut) {
+            // Positional fallbacks only once the recorded element had its chance to appear.
+            [element, used] = find(step.positional || []);
+        }
+        if (!element) {
+            if (timedOut) {
+                results.push({ status: 'not_found', used: null, start: started - batchStarted,
+                               duration: performance.now() - started });
+                finish();
+                return;
+            }
+            if (index > 0 && performance.now() - batchStarted >= budgetMs) {
+                finish(index, 'budget', performance.now() - started);
+                return;
+            }
+            setTimeout(attempt, 50);
+            return;
+        }
+        if (needsNative(step, element)) {
+            finish(index, 'trusted');
+            return;
+        }
+
+        const result = { status: 'passed', used: used, start: started - batchStarted };
+        results.push(result);
+        try {
+            if (step.type === 'click') {
+                element.scrollIntoView({ block: 'center' });
+                element.click();
+            } else if (step.type === 'input') {
+                setValue(element, step.value);
+            }
+        } catch (e) {
+            result.status = 'error';
+            result.message = String(e);
+        }
+        result.duration = performance.now() - started;
+
+        // A click may navigate away, which would discard this script; report right away.
+        if (result.status !== 'passed' || step.type === 'click') {
+            finish();
+            return;
+        }
+        runStep(index + 1);
+    })();
+}
+
+runStep(0);
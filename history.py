@@ -0,0 +1,222 @@
+
+import hashlib
+import json
+import os
+import platform
+import queue
+import sqlite3
+import threading
+import time
+
+import log_pipeline
+
+# --- Run History Store --- #
+# Every run and step result is kept in a local SQLite database (WAL mode) so results
+# survive the session. Writes go through a queue to one writer thread that commits them
+# in batches, so recording never blocks a replay. Reads use their own connection.
+#
+# Query paths and the indexes behind them:
+#   last N results for a case   runs (case_path, started_at)
+#   flakiest cases              runs (started_at, case_path, passed)
+#   slowest steps over time     step_daily, a per-day rollup maintained on write, so
+#                               trends stay fast however many rows `steps` holds
+
+DEFAULT_DB_PATH = os.path.join(".quaty", "history.db")
+BATCH_SIZE = 200        # Runs committed per transaction at most
+FLUSH_INTERVAL = 0.5    # Seconds the writer waits to fill a batch
+DAY = 24 * 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    case_path TEXT NOT NULL,
+    case_hash TEXT NOT NULL,
+    environment TEXT NOT NULL,
+    host TEXT NOT NULL,
+    source TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    duration REAL NOT NULL,
+    passed INTEGER NOT NULL,
+    error TEXT,
+    failed_step INTEGER,
+    failed_selector TEXT,
+    failed_message TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_case_time ON runs (case_path, started_at);
+CREATE INDEX IF NOT EXISTS runs_time_case ON runs (started_at, case_path, passed);
+
+CREATE TABLE IF NOT EXISTS steps (
+    run_id INTEGER NOT NULL,
+    step INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    selector TEXT NOT NULL,
+    passed INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    wait REAL NOT NULL,
+    message TEXT,
+    PRIMARY KEY (run_id, step)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS step_daily (
+    case_path TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    selector TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    total REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (case_path, step, day)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS step_daily_day ON step_daily (day);
+"""
+
+UPSERT_DAILY = """
+INSERT INTO step_daily (case_path, step, day, selector, count, total, max) VALUES (?, ?, ?, ?, 1, ?, ?)
+ON CONFLICT (case_path, step, day) DO UPDATE SET
+    selector = excluded.selector,
+    count = count + 1,
+    total = total + excluded.total,
+    max = MAX(max, excluded.max)
+"""
+
+
+def case_hash(test_case, suite_policy=None):
+    """Content hash of what a run replays, so results can be told apart across case edits.
+    The network policy and soft-assert mode change a replay too; they are only hashed when set,
+    so cases without them keep their hash."""
+    content = {"url": test_case.get("url", ""), "actions": test_case.get("actions", [])}
+    for key in ("network_policy", "soft_assert"):
+        if test_case.get(key):
+            content[key] = test_case[key]
+    if suite_policy:
+        content["suite_policy"] = suite_policy
+    text = json.dumps(content, sort_keys=True)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def environment():
+    """The environment label runs are filed under (QUATY_ENV, default 'local')."""
+    return os.environ.get("QUATY_ENV", "local")
+
+
+def _connect(db_path):
+    db = sqlite3.connect(db_path, check_same_thread=False)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+class RunHistory:
+    def __init__(self, db_path=DEFAULT_DB_PATH, log=log_pipeline.stderr):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.log = log  # Called from the writer thread
+        self._reader = _connect(db_path)
+        self._reader.executescript(SCHEMA)
+        self._read_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    # --- Writing --- #
+    def record_run(self, case_path, test_case_hash, outcome, source="cli"):
+        """Queues one run (a replay outcome dict: passed, duration, steps, error) for writing."""
+        self._queue.put((os.path.abspath(case_path) if case_path else "", test_case_hash, outcome, source,
+                         time.time()))
+
+    def flush(self):
+        """Blocks until everything queued so far is committed."""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+        with self._read_lock:
+            self._reader.close()
+
+    def _write_loop(self):
+        db = _connect(self.db_path)
+        host = platform.node()
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < BATCH_SIZE and batch[-1] is not None and not isinstance(batch[-1], threading.Event):
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            runs = [item for item in batch if isinstance(item, tuple)]
+            if runs:
+                try:
+                    with db:
+                        for run in runs:
+                            self._insert(db, host, *run)
+                except sqlite3.Error as e:
+                    log_pipeline.error(self.log, f"Could not record run history: {e}")
+            for item in batch:
+                if item is None:
+                    running = False
+                elif isinstance(item, threading.Event):
+                    item.set()
+        db.close()
+
+    def _insert(self, db, host, case_path, test_case_hash, outcome, source, finished_at):
+        steps = outcome.get("steps", [])
+        failed = next((step for step in steps if not step["passed"]), None)
+        started_at = finished_at - outcome.get("duration", 0.0)
+        cursor = db.execute(
+            "INSERT INTO runs (case_path, case_hash, environment, host, source, started_at, duration, passed, error, "
+            "failed_step, failed_selector, failed_message) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (case_path, test_case_hash, environment(), host, source, started_at, outcome.get("duration", 0.0),
+             int(bool(outcome.get("passed"))), outcome.get("error") or None,
+             failed["step"] if failed else None, failed["selector"] if failed else None,
+             failed["message"] if failed else None))
+        run_id = cursor.lastrowid
+        day = int(started_at // DAY)
+        # Steps restored from a snapshot were not replayed in this run.
+        replayed = [step for step in steps if not step.get("snapshot")]
+        db.executemany(
+            "INSERT OR REPLACE INTO steps (run_id, step, type, selector, passed, duration, wait, message) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(run_id, step["step"], step.get("type", ""), step.get("selector", ""), int(step["passed"]),
+              step.get("duration", 0.0), step.get("wait", 0.0), step.get("message") or None) for step in replayed])
+        db.executemany(UPSERT_DAILY, [(case_path, step["step"], day, step.get("selector", ""),
+                                       step.get("duration", 0.0), step.get("duration", 0.0)) for step in replayed])
+
+    # --- Queries --- #
+    def _query(self, sql, params=()):
+        with self._read_lock:
+            return [dict(row) for row in self._reader.execute(sql, params)]
+
+    def last_results(self, case_path, limit=10):
+        return self._query(
+            "SELECT id, case_hash, environment, source, started_at, duration, passed, failed_step, failed_selector, "
+            "failed_message, error FROM runs WHERE case_path = ? ORDER BY started_at DESC LIMIT ?",
+            (os.path.abspath(case_path), limit))
+
+    def flakiest(self, days=14, limit=20):
+        """Cases with both passes and failures in the window, most evenly mixed first."""
+        return self._query(
+            "SELECT case_path, COUNT(*) AS runs, SUM(passed) AS passes, MAX(started_at) AS last_run "
+            "FROM runs WHERE started_at >= ? AND case_path != '' GROUP BY case_path "
+            "HAVING passes > 0 AND passes < runs "
+            "ORDER BY MIN(passes, runs - passes) * 1.0 / runs DESC, runs DESC LIMIT ?",
+            (time.time() - days * DAY, limit))
+
+    def slowest_steps(self, days=14, limit=20):
+        """Steps with the highest mean duration over the window, from the daily rollup."""
+        return self._query(
+            "SELECT case_path, step, MAX(selector) AS selector, SUM(count) AS runs, SUM(total) / SUM(count) AS mean, "
+            "MAX(max) AS max FROM step_daily WHERE day >= ? GROUP BY case_path, step ORDER BY mean DESC LIMIT ?",
+            (int((time.time() - days * DAY) // DAY), limit))
+
+    def step_trend(self, case_path, step, days=30):
+        """Per-day mean/max duration of one step, oldest first."""
+        return self._query(
+            "SELECT day * ? AS day_start, count, total / count AS mean, max FROM step_daily "
+            "WHERE case_path = ? AND step = ? AND day >= ? ORDER BY day",
+            (DAY, os.path.abspath(case_path), step, int((time.time() - days * DAY) // DAY)))
@@ -0,0 +1,151 @@
+
+import hashlib
+import json
+import os
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import history
+import network_policy
+from cases import load_test_case
+
+# --- Change-Aware Incremental Runs --- #
+# Each run records the case's content hash (history.case_hash: its url, actions, network
+# policy and soft-assert mode, plus the suite's .network_policy.json) and whether it passed
+# in .quaty/changes.json. `quaty run --changed` then skips every case whose hash is
+# unchanged since a passing run, and `quaty watch` re-runs cases as soon as they are saved.
+# With fingerprints enabled, a change to the target page (its ETag or Last-Modified
+# header, or a hash of its body) also counts as a change. Pages that render something
+# different on every load have no stable fingerprint and always re-run.
+
+DEFAULT_PATH = os.path.join(".quaty", "changes.json")
+FINGERPRINT_TIMEOUT = 5  # Seconds per page request
+FINGERPRINT_WORKERS = 8
+
+
+def case_hash(test_case, path):
+    """history.case_hash of a case loaded from `path`, including its suite network policy."""
+    try:
+        suite_policy = network_policy.load_suite_policy(path)
+    except (OSError, ValueError):
+        suite_policy = None
+    return history.case_hash(test_case, suite_policy)
+
+
+def current_hash(path):
+    """The case file's content hash, or None when it cannot be read (e.g. mid-save)."""
+    try:
+        return case_hash(load_test_case(path), path)
+    except (OSError, ValueError):
+        return None
+
+
+def page_fingerprint(url, timeout=FINGERPRINT_TIMEOUT):
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+            if validator:
+                return validator
+            return hashlib.sha1(response.read()).hexdigest()
+    except Exception:
+        return None
+
+
+def fingerprints(urls, timeout=FINGERPRINT_TIMEOUT):
+    """Fingerprints each distinct url concurrently; unreachable pages map to None."""
+    urls = sorted(set(url for url in urls if url))
+    if not urls:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(FINGERPRINT_WORKERS, len(urls))) as executor:
+        return dict(zip(urls, executor.map(lambda url: page_fingerprint(url, timeout), urls)))
+
+
+class ChangeTracker:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.cases = {}
+        try:
+            with open(path, "r") as f:
+                self.cases = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def key(path):
+        return os.path.abspath(path)
+
+    def record(self, path, case_hash, passed, fingerprint=None):
+        self.cases[self.key(path)] = {"hash": case_hash, "passed": bool(passed), "fingerprint": fingerprint}
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.cases, f, indent=4, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+    def unchanged(self, path, case_hash, fingerprint=None):
+        """True when the case last passed with this hash (and, if given, this page fingerprint)."""
+        entry = self.cases.get(self.key(path))
+        if not entry or case_hash is None or entry["hash"] != case_hash or not entry["passed"]:
+            return False
+        return fingerprint is None or entry.get("fingerprint") == fingerprint
+
+
+def changed_cases(paths, tracker, use_fingerprints=False):
+    """Returns (paths that need a run, {url: fingerprint}) for the given case files."""
+    urls = {}
+    if use_fingerprints:
+        for path in paths:
+            try:
+                urls[path] = load_test_case(path).get("url", "")
+            except (OSError, ValueError):
+                pass
+    pages = fingerprints(urls.values()) if use_fingerprints else {}
+    changed = []
+    for path in paths:
+        fingerprint = pages.get(urls.get(path)) if use_fingerprints else None
+        # An unreachable page cannot prove it is unchanged.
+        if use_fingerprints and fingerprint is None:
+            changed.append(path)
+        elif not tracker.unchanged(path, current_hash(path), fingerprint):
+            changed.append(path)
+    return changed, pages
+
+
+# --- Watching --- #
+class CaseWatcher:
+    """Polls case files for additions and modifications. A file is reported once its size and
+    mtime have stayed the same for one poll, so half-written saves are not picked up."""
+
+    def __init__(self, paths, collect):
+        self.paths = paths
+        self.collect = collect  # paths -> case files, e.g. cases.collect_test_cases
+        self.seen = {path: self._stat(path) for path in collect(paths)}
+        self.pending = {}
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def poll(self):
+        ready = []
+        current = self.collect(self.paths)
+        for path in current:
+            stat = self._stat(path)
+            if stat is None or self.seen.get(path) == stat:
+                self.pending.pop(path, None)
+                continue
+            if self.pending.get(path) == stat:
+                del self.pending[path]
+                self.seen[path] = stat
+                ready.append(path)
+            else:
+                self.pending[path] = stat
+        for path in set(self.seen) - set(current):
+            del self.seen[path]
+        return ready
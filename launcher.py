@@ -1,24 +1,32 @@
 
 import sys
 import subprocess
-import os
 from PySide6.QtWidgets import QApplication, QWidget, QVBoxLayout, QPushButton, QTextEdit
-from PySide6.QtCore import QTimer
+from PySide6.QtCore import QTimer, QProcess
+
+# Updates are applied before QUATY starts, never under a running session: the launcher
+# fetches, pulls when new commits exist and then launches. If the check has not finished
+# after UPDATE_CHECK_TIMEOUT_MS (slow network, no remote), QUATY starts on the current
+# version right away and any updates wait for the next launch.
+UPDATE_CHECK_TIMEOUT_MS = 3000
+CLOSE_DELAY_MS = 2000
 
 class Launcher(QWidget):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("QUATY Updater & Launcher")
         self.resize(500, 250)
+        self.app_process = None
+        self.git_process = None
 
         layout = QVBoxLayout(self)
 
         self.log_output = QTextEdit()
         self.log_output.setReadOnly(True)
-        self.log_output.setText("Click the button to update and launch the application.")
 
-        self.launch_button = QPushButton("Update & Launch QUATY")
-        self.launch_button.clicked.connect(self.update_and_launch)
+        self.launch_button = QPushButton("Checking for updates...")
+        self.launch_button.setEnabled(False)
+        self.updating = False  # A pull is running; the app must not start mid-update
         # Apply some basic styling to the button
         self.launch_button.setStyleSheet("""
             QPushButton {
@@ -35,72 +43,102 @@ class Launcher(QWidget):
             QPushButton:pressed {
                 background-color: #457045;
             }
+            QPushButton:disabled {
+                background-color: #3a4a3a;
+                color: #a0a0a0;
+            }
         """)
 
         layout.addWidget(self.log_output)
         layout.addWidget(self.launch_button)
 
-    def run_command(self, command):
-        self.log_output.append(f"\n> {' '.join(command)}")
-        QApplication.processEvents()
-        try:
-            # Execute command
-            result = subprocess.run(command, check=True, capture_output=True, text=True, encoding='utf-8')
-            
-            # Display stdout
-            if result.stdout:
-                self.log_output.append("--- Output ---")
-                self.log_output.append(result.stdout)
-            
-            # Display stderr
-            if result.stderr:
-                self.log_output.append("--- Warnings/Errors ---")
-                self.log_output.append(result.stderr)
-
-            QApplication.processEvents()
-            return True
-        except subprocess.CalledProcessError as e:
-            self.log_output.append("\n--- COMMAND FAILED ---")
-            self.log_output.append(e.stdout)
-            self.log_output.append(e.stderr)
-            return False
-        except FileNotFoundError:
-            self.log_output.append(f"\n--- ERROR: 'git' command not found ---")
-            self.log_output.append("Please ensure Git is installed and in your system's PATH.")
-            return False
-        except Exception as e:
-            self.log_output.append(f"\n--- AN UNEXPECTED ERROR OCCURRED --- \n{str(e)}")
-            return False
-
-    def update_and_launch(self):
-        self.log_output.clear()
+        QTimer.singleShot(0, self.check_for_updates)
+
+    def launch_app(self):
+        if self.app_process is not None:
+            return
+        # Use the same python executable as the launcher
         self.launch_button.setEnabled(False)
+        self.launch_button.setText("Launching...")
+        self.log_output.append(f"\n> Launching main application with {sys.executable}...")
+        self.app_process = subprocess.Popen([sys.executable, "main.py"])
+        self.log_output.append("\nApplication started. This launcher will close automatically.")
+        self.close_later()
+
+    def check_timed_out(self):
+        if self.app_process is None and not self.updating:
+            self.log_output.append("\nThe update check is taking too long; starting the current version.")
+            self.launch_app()
+
+    def run_git(self, args, on_finished):
+        """Runs git asynchronously and calls on_finished(ok, stdout)."""
+        self.log_output.append(f"\n> git {' '.join(args)}")
+        process = QProcess(self)
+        self.git_process = process
+
+        def finished(exit_code, exit_status):
+            stdout = bytes(process.readAllStandardOutput()).decode("utf-8", errors="replace").strip()
+            stderr = bytes(process.readAllStandardError()).decode("utf-8", errors="replace").strip()
+            ok = exit_status == QProcess.ExitStatus.NormalExit and exit_code == 0
+            if stderr:
+                self.log_output.append(stderr)
+            if not ok:
+                self.log_output.append("--- COMMAND FAILED ---")
+            on_finished(ok, stdout)
+
+        def failed(error):
+            if error == QProcess.ProcessError.FailedToStart:
+                self.log_output.append("\n--- ERROR: 'git' command not found ---")
+                self.log_output.append("Please ensure Git is installed and in your system's PATH.")
+                on_finished(False, "")
+
+        process.finished.connect(finished)
+        process.errorOccurred.connect(failed)
+        process.start("git", args)
+
+    def check_for_updates(self):
+        QTimer.singleShot(UPDATE_CHECK_TIMEOUT_MS, self.check_timed_out)
+        self.run_git(["fetch", "origin", "main"], self.handle_fetched)
+
+    def handle_fetched(self, ok, output):
+        if not ok:
+            self.log_output.append("\nCould not check for updates. Starting the current version.")
+            self.launch_app()
+            return
+        self.run_git(["rev-list", "--count", "HEAD..origin/main"], self.handle_update_count)
+
+    def handle_update_count(self, ok, output):
+        count = int(output) if ok and output.isdigit() else 0
+        if not count:
+            self.log_output.append("\nQUATY is up to date.")
+            self.launch_app()
+            return
+        if self.app_process is not None:
+            # Never pull under a running session; lazily imported modules would mix versions.
+            self.log_output.append(f"\n{count} update(s) available; they will be applied on the next launch.")
+            return
+        self.log_output.append(f"\n--- {count} UPDATE(S) AVAILABLE ---")
         self.launch_button.setText("Updating...")
-        
-        # Step 1: Git Pull
-        update_success = self.run_command(["git", "pull", "origin", "main"])
+        self.updating = True
+        self.run_git(["pull", "origin", "main"], self.handle_pulled)
 
-        if update_success:
+    def handle_pulled(self, ok, output):
+        self.updating = False
+        if output:
+            self.log_output.append(output)
+        if ok:
             self.log_output.append("\n--- UPDATE SUCCESSFUL ---")
-            self.launch_button.setText("Launching...")
-            QApplication.processEvents()
-            
-            # Step 2: Launch main application using the same python executable
-            self.log_output.append(f"\n> Launching main application with {sys.executable}...")
-            subprocess.Popen([sys.executable, "main.py"]) # Use sys.executable
-            
-            # Close the launcher after a delay
-            self.log_output.append("\nApplication started. This launcher will close automatically.")
-            QTimer.singleShot(2000, self.close) # Close after 2 seconds
         else:
             self.log_output.append("\n--- UPDATE FAILED ---")
-            self.log_output.append("Could not launch application. Please check the errors above.")
-            self.launch_button.setText("Update Failed. Try Again.")
-            self.launch_button.setEnabled(True)
+            self.log_output.append("Starting the current version. Please check the errors above.")
+        self.launch_app()
+
+    def close_later(self):
+        QTimer.singleShot(CLOSE_DELAY_MS, self.close)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    
+
     # Try to apply the main stylesheet for consistency
     try:
         with open("stylesheet.qss", "r") as f:
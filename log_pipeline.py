@@ -0,0 +1,125 @@
+
+import collections
+import itertools
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# --- Execution Log Pipeline --- #
+# Everything printed by the app goes through here instead of straight into the log widget.
+# Writes are split into lines, tagged with a level and the current run id, and buffered;
+# the GUI drains the buffer on a short timer and only keeps the last `max_lines` lines.
+# The full log streams to a rotating file on disk from a background thread.
+#
+# Levels come from the call site, never from the text: plain print() output is INFO, and
+# code that reports a warning or an error says so through a RunLog (or warning()/error()
+# below, which also accept plain print-like log functions).
+
+DEFAULT_LOG_DIR = os.path.join(".quaty", "logs")
+
+
+class RunLog:
+    """A print-compatible log function that carries levels: run_log(text) logs at INFO,
+    run_log.warning(text) and run_log.error(text) at those levels."""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+
+    def __call__(self, text, level=logging.INFO):
+        self.pipeline.write(f"{text}\n", level)
+
+    def warning(self, text):
+        self(text, logging.WARNING)
+
+    def error(self, text):
+        self(text, logging.ERROR)
+
+
+def warning(log, text):
+    """Logs `text` through `log` at WARNING if it carries levels (a RunLog), as is otherwise."""
+    getattr(log, "warning", log)(text)
+
+
+def error(log, text):
+    """Logs `text` through `log` at ERROR if it carries levels (a RunLog), as is otherwise."""
+    getattr(log, "error", log)(text)
+
+
+def stderr(text):
+    """A print-like log function for background threads: stdout may carry JSON output."""
+    sys.stderr.write(f"{text}\n")
+
+
+class LogRecord:
+    __slots__ = ("run_id", "level", "text")
+
+    def __init__(self, run_id, level, text):
+        self.run_id = run_id
+        self.level = level
+        self.text = text
+
+
+class LogPipeline:
+    def __init__(self, log_dir=DEFAULT_LOG_DIR, max_lines=5000, max_bytes=5 * 1024 * 1024, backup_count=5):
+        self.max_lines = max_lines
+        self.records = collections.deque(maxlen=max_lines)
+        self.run_id = None
+        self._run_numbers = itertools.count(1)
+        self._pending = []
+        self._partial = ""
+        self._lock = threading.Lock()
+
+        os.makedirs(log_dir, exist_ok=True)
+        file_handler = RotatingFileHandler(os.path.join(log_dir, "quaty.log"), maxBytes=max_bytes,
+                                           backupCount=backup_count, encoding="utf-8")
+        file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s [%(run_id)s] %(message)s"))
+        self._queue = queue.SimpleQueue()
+        self._listener = QueueListener(self._queue, file_handler)
+        self._listener.start()
+        self.logger = logging.getLogger("quaty.execution")
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+        self.logger.handlers = [QueueHandler(self._queue)]
+
+    def begin_run(self):
+        # The counter keeps runs started within the same second apart.
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{next(self._run_numbers)}"
+        return self.run_id
+
+    def end_run(self):
+        self.run_id = None
+
+    def write(self, text, level=logging.INFO):
+        """Accepts arbitrary print() fragments; only complete lines become records."""
+        with self._lock:
+            lines = (self._partial + str(text)).split("\n")
+            self._partial = lines.pop()
+            run_id = self.run_id
+            for line in lines:
+                record = LogRecord(run_id, level, line)
+                self.records.append(record)
+                self._pending.append(record)
+                self.logger.log(level, line, extra={"run_id": run_id or "-"})
+
+    def drain(self):
+        """Returns the records written since the previous drain."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        # Only the last max_lines can be visible anyway.
+        return pending[-self.max_lines:]
+
+    def filtered(self, min_level=logging.DEBUG, run_id=None):
+        with self._lock:
+            return [record for record in self.records
+                    if record.level >= min_level and (run_id is None or record.run_id == run_id)]
+
+    def close(self):
+        with self._lock:
+            if self._partial:
+                self.logger.log(logging.INFO, self._partial, extra={"run_id": self.run_id or "-"})
+                self._partial = ""
+        self._listener.stop()
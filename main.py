@@ -1,12 +1,14 @@
 
+import startup_profile  # First: takes the process start time for --profile-startup
+import time
 import sys
 import os
 import json
 import threading
-import time
 import traceback
-from PySide6.QtCore import Signal, QObject, Qt, QDir
-from PySide6.QtGui import QKeySequence, QKeyEvent
+import logging
+from PySide6.QtCore import Signal, QObject, Qt, QTimer, QFileSystemWatcher, QEvent
+from PySide6.QtGui import QKeyEvent, QColor, QFontDatabase
 from PySide6.QtWidgets import (
     QApplication,
     QMainWindow,
@@ -15,41 +17,103 @@ from PySide6.QtWidgets import (
     QHBoxLayout,
     QLineEdit,
     QPushButton,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QHeaderView,
     QFileDialog,
     QAbstractItemView,
-    QTextEdit,
+    QPlainTextEdit,
+    QComboBox,
     QSplitter,
-    QTreeView,
-    QFileSystemModel,
+    QListWidget,
+    QListWidgetItem,
     QCheckBox,
-    QLabel
+    QLabel,
+    QDialog,
+    QDialogButtonBox,
+    QTabWidget,
+    QTableWidget,
+    QTableWidgetItem
 )
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options as ChromeOptions
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import JavascriptException, WebDriverException, TimeoutException
+
+# Selenium, replay and pool are imported lazily (see TestAutomationTool.browser_pool) so
+# they stay off the startup path.
+import artifacts
+import compaction
+from catalog import CaseCatalog
+from log_pipeline import LogPipeline, RunLog
+import history
+import network_policy
+import scheduler
+from step_model import StepTableModel
+from timing import RunTimer
+
+startup_profile.mark("modules imported")
+
+# The browser stack is loaded and pre-warmed in the background once the window has painted.
+BROWSER_PREWARM_DELAY_MS = 500
 
 # --- Stream Redirection for stdout --- #
-class Stream(QObject):
-    """Redirects console output (stdout) to a QTextEdit widget."""
-    new_text = Signal(str)
+class Stream:
+    """Redirects console output (stdout) into the log pipeline, from any thread."""
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
 
     def write(self, text):
-        self.new_text.emit(str(text))
+        self.pipeline.write(text)
 
     def flush(self):
         pass
 
 class RecordingSignals(QObject):
     finished = Signal()
-    action_recorded = Signal(dict)
-
-class DeletableTableWidget(QTableWidget):
+    actions_recorded = Signal(list)  # One drained batch of recorded actions
+
+class ReplaySignals(QObject):
+    step_started = Signal(int)           # step index (0-based)
+    step_passed = Signal(int, float)     # step index, duration in seconds
+    step_failed = Signal(int, str, float) # step index, message, duration in seconds
+    finished = Signal(str)               # "success", "failed" or "stopped"
+
+class CatalogSignals(QObject):
+    refreshed = Signal(int, int, int, list)  # added, updated, removed, directories to watch
+
+# --- Recorder Event Queue --- #
+# recorder.js buffers (and coalesces) actions in-page; this long-poll drains the whole
+# buffer in one round-trip. It answers null when the current document has no recorder yet
+# (navigation). Each drain reaches the table as one batch, and after a non-empty drain the
+# listener waits RECORDER_BATCH_MS so busy pages produce fewer, larger table updates.
+RECORDER_POLL_MS = 500
+RECORDER_BATCH_MS = 250
+# Recorded steps that continue the table's last row instead of adding one (see compaction.py).
+RECORDER_MERGED_RULES = ("repeated_input", "repeated_scroll")
+RECORDER_DRAIN_SCRIPT = """
+const timeoutMs = arguments[0];
+const callback = arguments[arguments.length - 1];
+const recorder = window.__quatyRecorder;
+if (!recorder) {
+    callback(null);
+    return;
+}
+const started = Date.now();
+(function poll() {
+    if (recorder.size() > 0 || Date.now() - started >= timeoutMs) {
+        callback(recorder.drain());
+        return;
+    }
+    setTimeout(poll, 50);
+})();
+"""
+
+# --- Execution Log Panel --- #
+LOG_FLUSH_INTERVAL_MS = 100  # Buffered log lines are pushed to the widget at most this often
+LOG_MAX_LINES = 5000         # The widget keeps only the most recent lines
+LOG_LEVEL_FILTERS = [("All", logging.DEBUG), ("Warnings", logging.WARNING), ("Errors", logging.ERROR)]
+
+# --- Test Case Explorer --- #
+CATALOG_REFRESH_DELAY_MS = 300  # Debounce for bursts of file system notifications
+CASE_RESULT_COLORS = {"passed": QColor("#7fbf7f"), "failed": QColor("#e07070")}
+
+class DeletableTableView(QTableView):
     delete_triggered = Signal()
 
     def keyPressEvent(self, event: QKeyEvent):
@@ -64,6 +128,64 @@ class DeletableTableWidget(QTableWidget):
         else:
             super().keyPressEvent(event)
 
+class CompactionDialog(QDialog):
+    """Shows the diff of a compaction pass; accepted means apply it."""
+    def __init__(self, diff, summary, accept_text="Apply", reject_text="Cancel", parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Compact Recorded Steps")
+        self.resize(700, 450)
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(summary))
+        diff_view = QPlainTextEdit("\n".join(diff))
+        diff_view.setReadOnly(True)
+        diff_view.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+        layout.addWidget(diff_view)
+        buttons = QDialogButtonBox()
+        buttons.addButton(accept_text, QDialogButtonBox.ButtonRole.AcceptRole)
+        buttons.addButton(reject_text, QDialogButtonBox.ButtonRole.RejectRole)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+class HistoryDialog(QDialog):
+    """Flakiest cases, slowest steps and the current case's last results from the run history."""
+    def __init__(self, run_history, case_path=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Run History")
+        self.resize(900, 500)
+        layout = QVBoxLayout(self)
+        tabs = QTabWidget()
+        layout.addWidget(tabs)
+
+        if case_path:
+            rows = [(time.strftime("%Y-%m-%d %H:%M", time.localtime(run["started_at"])),
+                     "PASS" if run["passed"] else "FAIL", f"{run['duration']:.1f}s",
+                     f"{run['environment']}/{run['source']}", run["case_hash"][:8],
+                     "" if run["passed"] else f"step {run['failed_step']}: {run['failed_message'] or run['error']}")
+                    for run in run_history.last_results(case_path, 50)]
+            tabs.addTab(self._table(["When", "Result", "Duration", "Env", "Version", "Failure"], rows),
+                        f"Last Results: {os.path.basename(case_path)}")
+        rows = [(case["case_path"], f"{case['passes']}/{case['runs']}") for case in run_history.flakiest(limit=100)]
+        tabs.addTab(self._table(["Case", "Passed"], rows), "Flakiest Cases")
+        rows = [(step["case_path"], str(step["step"]), step["selector"], f"{step['mean']:.2f}s", f"{step['max']:.2f}s",
+                 str(step["runs"])) for step in run_history.slowest_steps(limit=100)]
+        tabs.addTab(self._table(["Case", "Step", "Selector", "Mean", "Max", "Runs"], rows), "Slowest Steps")
+
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def _table(self, headers, rows):
+        table = QTableWidget(len(rows), len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        table.horizontalHeader().setStretchLastSection(True)
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                table.setItem(row, column, QTableWidgetItem(value))
+        return table
+
 class TestAutomationTool(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -72,11 +194,27 @@ class TestAutomationTool(QMainWindow):
         self.resize(1200, 800)
         self.driver = None
         self.test_driver = None
+        # Browsers stay warm between runs; see pool.SessionPool. Created on first use.
+        self.session_pool = None
+        self._pool_lock = threading.Lock()
         self.is_recording = False
         self.is_asserting = False # State for assertion mode
+        self.is_running = False
+        self.stop_event = threading.Event()
         self.signals = RecordingSignals()
         self.signals.finished.connect(self.handle_recording_finished)
-        self.signals.action_recorded.connect(self.add_action_to_table)
+        self.signals.actions_recorded.connect(self.add_actions_to_table)
+        self.step_model = StepTableModel(self)
+        self.step_model.step_edited.connect(self.handle_step_edited)
+        self.replay_signals = ReplaySignals()
+        self.replay_signals.step_started.connect(self.handle_step_started)
+        self.replay_signals.step_passed.connect(self.handle_step_passed)
+        self.replay_signals.step_failed.connect(self.handle_step_failed)
+        self.replay_signals.finished.connect(self.handle_test_finished)
+        self.catalog_signals = CatalogSignals()
+        self.catalog_signals.refreshed.connect(self.handle_catalog_refreshed)
+        self.catalog_refreshing = False
+        self.catalog_dirty = False  # A change arrived while a refresh was running
 
         # --- Main Layout -- #
         main_splitter = QSplitter(Qt.Vertical)
@@ -103,8 +241,12 @@ class TestAutomationTool(QMainWindow):
         self.record_button.setObjectName("record_button")
         self.start_button = QPushButton("Test Run")
         self.start_button.setObjectName("start_button")
+        self.stop_button = QPushButton("Stop")
+        self.stop_button.setObjectName("stop_button")
+        self.stop_button.setEnabled(False)
         buttons_layout.addWidget(self.record_button)
         buttons_layout.addWidget(self.start_button)
+        buttons_layout.addWidget(self.stop_button)
         controls_layout.addLayout(buttons_layout)
 
         checkboxes_layout = QHBoxLayout()
@@ -113,8 +255,16 @@ class TestAutomationTool(QMainWindow):
         self.assertion_checkbox.setEnabled(True)
         self.headless_checkbox = QCheckBox("Headless Mode")
         self.headless_checkbox.setObjectName("headless_checkbox")
+        self.fast_checkbox = QCheckBox("Fast Mode")
+        self.fast_checkbox.setObjectName("fast_checkbox")
+        self.fast_checkbox.setToolTip("Run consecutive steps in one browser round-trip")
+        self.soft_assert_checkbox = QCheckBox("Soft Assertions")
+        self.soft_assert_checkbox.setObjectName("soft_assert_checkbox")
+        self.soft_assert_checkbox.setToolTip("Keep going after a failed assertion; the run still fails")
         checkboxes_layout.addWidget(self.assertion_checkbox)
         checkboxes_layout.addWidget(self.headless_checkbox)
+        checkboxes_layout.addWidget(self.fast_checkbox)
+        checkboxes_layout.addWidget(self.soft_assert_checkbox)
         controls_layout.addLayout(checkboxes_layout)
         
         status_layout = QHBoxLayout()
@@ -125,36 +275,53 @@ class TestAutomationTool(QMainWindow):
         status_layout.addStretch()
         controls_layout.addLayout(status_layout)
 
+        self.timing_label = QLabel("")
+        self.timing_label.setObjectName("timing_label")
+        self.timing_label.setAlignment(Qt.AlignCenter)
+        controls_layout.addWidget(self.timing_label)
+
         file_ops_layout = QHBoxLayout()
         self.save_button = QPushButton("Save Test")
         self.add_step_button = QPushButton("+ Step")
         self.delete_button = QPushButton("Delete Step")
+        self.compact_button = QPushButton("Compact")
+        self.compact_button.setToolTip("Drop redundant recorded steps (shows a diff first)")
+        self.history_button = QPushButton("History")
+        self.export_timing_button = QPushButton("Export Timing")
+        self.export_timing_button.setEnabled(False)
         file_ops_layout.addWidget(self.save_button)
         file_ops_layout.addWidget(self.add_step_button)
         file_ops_layout.addWidget(self.delete_button)
+        file_ops_layout.addWidget(self.compact_button)
+        file_ops_layout.addWidget(self.history_button)
+        file_ops_layout.addWidget(self.export_timing_button)
         controls_layout.addLayout(file_ops_layout)
 
         # File Explorer (for the Left Panel)
         self.test_cases_dir = os.path.join(os.getcwd(), "test_cases")
         if not os.path.exists(self.test_cases_dir):
             os.makedirs(self.test_cases_dir)
-        self.file_model = QFileSystemModel()
-        self.file_model.setRootPath(self.test_cases_dir)
-        self.file_model.setFilter(QDir.NoDotAndDotDot | QDir.Files)
-        self.file_model.setNameFilters(["*.json"])
-        self.file_model.setNameFilterDisables(False)
-        self.file_explorer = QTreeView()
-        self.file_explorer.setModel(self.file_model)
-        self.file_explorer.setRootIndex(self.file_model.index(self.test_cases_dir))
-        self.file_explorer.setHeaderHidden(True)
-        for i in range(1, self.file_model.columnCount()):
-            self.file_explorer.hideColumn(i)
+        self.catalog = CaseCatalog(self.test_cases_dir)
+        self.last_run = None
+        self.current_case_path = None
+        self.case_network_policy = None  # The loaded case's own "network_policy", kept on save
+        self.explorer_search = QLineEdit()
+        self.explorer_search.setPlaceholderText("Search cases (text, type:click, tag:smoke, result:failed)")
+        self.file_explorer = QListWidget()
+        self.file_explorer.setUniformItemSizes(True)
+        self.catalog_watcher = QFileSystemWatcher([self.test_cases_dir], self)
+        self.catalog_refresh_timer = QTimer(self)
+        self.catalog_refresh_timer.setSingleShot(True)
+        self.catalog_refresh_timer.setInterval(CATALOG_REFRESH_DELAY_MS)
 
         # Steps Table (for the Center Panel)
-        self.steps_table = DeletableTableWidget()
-        self.steps_table.setColumnCount(4)
-        self.steps_table.setHorizontalHeaderLabels(["Step", "Action", "Selector", "Value"])
+        self.steps_table = DeletableTableView()
+        self.steps_table.setModel(self.step_model)
         self.steps_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        # Uniform rows let the view skip measuring off-screen rows on very large cases.
+        self.steps_table.setWordWrap(False)
+        self.steps_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.steps_table.verticalHeader().setDefaultSectionSize(28)
         header = self.steps_table.horizontalHeader()
         header.setSectionResizeMode(0, QHeaderView.ResizeMode.Interactive)
         header.setSectionResizeMode(1, QHeaderView.ResizeMode.Interactive)
@@ -164,10 +331,11 @@ class TestAutomationTool(QMainWindow):
 
         # --- Assemble Layout ---
 
-        # Left Panel (File Explorer Only)
+        # Left Panel (Case Search + File Explorer)
         left_panel = QWidget()
         left_layout = QVBoxLayout(left_panel)
         left_layout.setContentsMargins(0, 0, 0, 0)
+        left_layout.addWidget(self.explorer_search)
         left_layout.addWidget(self.file_explorer)
 
         # Center Panel (Controls + Steps Table)
@@ -183,13 +351,32 @@ class TestAutomationTool(QMainWindow):
         top_splitter.setSizes([250, 950]) # Adjusted for a smaller file explorer view
 
         # Bottom Half (Log Window)
-        self.log_window = QTextEdit()
+        self.log_window = QPlainTextEdit()
         self.log_window.setReadOnly(True)
         self.log_window.setObjectName("execution_log")
+        self.log_window.setMaximumBlockCount(LOG_MAX_LINES)
+
+        self.log_level_combo = QComboBox()
+        for label, _ in LOG_LEVEL_FILTERS:
+            self.log_level_combo.addItem(label)
+        self.log_run_combo = QComboBox()
+        self.log_run_combo.addItems(["All Runs", "Last Run"])
+        log_filter_layout = QHBoxLayout()
+        log_filter_layout.addWidget(QLabel("Log Level:"))
+        log_filter_layout.addWidget(self.log_level_combo)
+        log_filter_layout.addWidget(QLabel("Show:"))
+        log_filter_layout.addWidget(self.log_run_combo)
+        log_filter_layout.addStretch()
+
+        log_panel = QWidget()
+        log_layout = QVBoxLayout(log_panel)
+        log_layout.setContentsMargins(0, 0, 0, 0)
+        log_layout.addLayout(log_filter_layout)
+        log_layout.addWidget(self.log_window)
 
         # Add top splitter and log window to the main splitter
         main_splitter.addWidget(top_splitter)
-        main_splitter.addWidget(self.log_window)
+        main_splitter.addWidget(log_panel)
         main_splitter.setSizes([600, 200])
 
         # --- Connections ---
@@ -197,28 +384,136 @@ class TestAutomationTool(QMainWindow):
         self.record_button.clicked.connect(self.start_recording)
         self.assertion_checkbox.toggled.connect(self.toggle_assertion_mode)
         self.start_button.clicked.connect(self.start_test)
+        self.stop_button.clicked.connect(self.stop_test)
         self.save_button.clicked.connect(self.save_test)
         self.add_step_button.clicked.connect(self.add_manual_step)
         self.delete_button.clicked.connect(self.delete_selected_steps)
-        self.steps_table.cellChanged.connect(self.update_step_data)
+        self.compact_button.clicked.connect(self.compact_steps)
+        self.history_button.clicked.connect(self.show_history)
+        self.export_timing_button.clicked.connect(self.export_timing)
         self.steps_table.delete_triggered.connect(self.delete_selected_steps)
-        self.file_explorer.clicked.connect(self.load_test_from_explorer)
+        self.file_explorer.itemClicked.connect(self.load_test_from_explorer)
+        self.explorer_search.textChanged.connect(self.populate_explorer)
+        self.catalog_watcher.directoryChanged.connect(self.catalog_refresh_timer.start)
+        self.catalog_refresh_timer.timeout.connect(self.refresh_catalog)
 
         # --- Instance Variables ---
         self.saved_url = ""
-        self.recorded_actions = []
-
-        # Redirect stdout
-        self.log_stream = Stream()
-        self.log_stream.new_text.connect(self.append_log)
+        self.last_timer = None
+
+        # Redirect stdout through the batched log pipeline
+        self.last_run_id = None
+        self.log_pipeline = LogPipeline(max_lines=LOG_MAX_LINES)
+        self.log_stream = Stream(self.log_pipeline)
+        # print() is INFO; warnings and errors go through run_log with their level.
+        self.run_log = RunLog(self.log_pipeline)
+        self.run_history = history.RunHistory(log=self.run_log)
+        self.artifact_writer = artifacts.ArtifactWriter(log=self.run_log)
         sys.stdout = self.log_stream
+        self.log_flush_timer = QTimer(self)
+        self.log_flush_timer.timeout.connect(self.flush_log)
+        self.log_flush_timer.start(LOG_FLUSH_INTERVAL_MS)
+        self.log_level_combo.currentIndexChanged.connect(self.refresh_log_view)
+        self.log_run_combo.currentIndexChanged.connect(self.refresh_log_view)
 
         print("Application started. Logs will appear here.")
+        # Indexing test_cases/ and loading the browser stack wait until the window is up.
+        QTimer.singleShot(0, self.refresh_catalog)
+        QTimer.singleShot(BROWSER_PREWARM_DELAY_MS, self._start_prewarm)
+        startup_profile.mark("window built")
+
+    def browser_pool(self):
+        """The session pool, importing Selenium and the replay engine on first use."""
+        with self._pool_lock:
+            if self.session_pool is None:
+                started = time.perf_counter()
+                from pool import SessionPool
+                self.session_pool = SessionPool(size=1, max_uses=20)
+                startup_profile.note(f"Browser stack imported in {(time.perf_counter() - started) * 1000:.1f} ms")
+            return self.session_pool
+
+    def _start_prewarm(self):
+        # Launch a headless browser in the background so the first test run starts warm.
+        threading.Thread(target=self._prewarm_browser, daemon=True).start()
+
+    def _prewarm_browser(self):
+        try:
+            self.browser_pool().prewarm(headless=True)
+        except Exception as e:
+            self.run_log.warning(f"Could not pre-warm a browser: {e}")
+
+    def append_log(self, text, level=logging.INFO):
+        if not text.endswith("\n"):
+            text += "\n"
+        self.log_pipeline.write(text, level)
+
+    def _log_filter(self):
+        min_level = LOG_LEVEL_FILTERS[self.log_level_combo.currentIndex()][1]
+        run_id = self.last_run_id if self.log_run_combo.currentIndex() == 1 else None
+        return min_level, run_id
+
+    def _matches_log_filter(self, record):
+        min_level, run_id = self._log_filter()
+        return record.level >= min_level and (run_id is None or record.run_id == run_id)
+
+    def flush_log(self):
+        records = [record for record in self.log_pipeline.drain() if self._matches_log_filter(record)]
+        if records:
+            self.log_window.appendPlainText("\n".join(record.text for record in records))
+            self.log_window.ensureCursorVisible()
+
+    def refresh_log_view(self):
+        self.log_pipeline.drain()
+        min_level, run_id = self._log_filter()
+        records = self.log_pipeline.filtered(min_level, run_id)
+        self.log_window.setPlainText("\n".join(record.text for record in records))
+        self.log_window.moveCursor(self.log_window.textCursor().MoveOperation.End)
+
+    def refresh_catalog(self):
+        """Re-indexes test_cases/ on a worker thread; changes seen meanwhile queue one more pass."""
+        if self.catalog_refreshing:
+            self.catalog_dirty = True
+            return
+        self.catalog_refreshing = True
+        threading.Thread(target=self._refresh_catalog_worker, daemon=True).start()
 
-    def append_log(self, text):
-        self.log_window.moveCursor(self.log_window.textCursor().End)
-        self.log_window.insertPlainText(text)
-        self.log_window.ensureCursorVisible()
+    def _refresh_catalog_worker(self):
+        added = updated = removed = 0
+        try:
+            added, updated, removed = self.catalog.refresh()
+        except Exception as e:
+            self.run_log.error(f"Error indexing test cases: {e}")
+        self.catalog_signals.refreshed.emit(added, updated, removed, self.catalog.watch_paths())
+
+    def handle_catalog_refreshed(self, added, updated, removed, paths):
+        self.catalog_refreshing = False
+        # Watch every subdirectory for new, renamed and removed cases. Edits in place are
+        # picked up by the refresh that runs whenever the window is activated.
+        watched = set(self.catalog_watcher.directories())
+        stale = list(watched - set(paths))
+        new = [path for path in paths if path not in watched]
+        if stale:
+            self.catalog_watcher.removePaths(stale)
+        if new:
+            self.catalog_watcher.addPaths(new)
+        if added or updated or removed:
+            print(f"Case catalog updated: {added} added, {updated} changed, {removed} removed.")
+        self.populate_explorer()
+        if self.catalog_dirty:
+            self.catalog_dirty = False
+            self.refresh_catalog()
+
+    def populate_explorer(self):
+        self.file_explorer.clear()
+        for case in self.catalog.search(self.explorer_search.text()):
+            item = QListWidgetItem(case["name"])
+            item.setData(Qt.UserRole, case["path"])
+            histogram = ", ".join(f"{name}: {count}" for name, count in sorted(case["action_types"].items()))
+            item.setToolTip(f"{case['url']}\n{case['step_count']} steps ({histogram})\n"
+                            f"Tags: {', '.join(case['tags']) or '-'}\nLast result: {case['last_result'] or 'not run'}")
+            if case["last_result"] in CASE_RESULT_COLORS:
+                item.setForeground(CASE_RESULT_COLORS[case["last_result"]])
+            self.file_explorer.addItem(item)
 
     def _set_status(self, status):
         if status == "success":
@@ -228,7 +523,11 @@ class TestAutomationTool(QMainWindow):
         elif status == "failed":
             self.status_label.setText("Status: Failed")
             self.status_label.setStyleSheet("color: red; font-weight: bold;")
-            print("--- Test Execution Failed ---")
+            self.run_log.error("--- Test Execution Failed ---")
+        elif status == "stopped":
+            self.status_label.setText("Status: Stopped")
+            self.status_label.setStyleSheet("color: orange; font-weight: bold;")
+            self.run_log.warning("--- Test Execution Stopped ---")
         elif status == "running":
             self.status_label.setText("Status: Running...")
             self.status_label.setStyleSheet("") # Reset style
@@ -267,13 +566,12 @@ class TestAutomationTool(QMainWindow):
         self.assertion_checkbox.setEnabled(False)
         self.headless_checkbox.setEnabled(False)
 
-        self.recorded_actions = []
-        self.steps_table.setRowCount(0)
+        self.step_model.load([])
+        self.current_case_path = None
+        self.case_network_policy = None
 
         try:
-            options = ChromeOptions()
-            # options.browser_version = 'dev' # This might not be needed anymore
-            self.driver = webdriver.Chrome(options=options)
+            self.driver = self.browser_pool().acquire(headless=False)
             self.driver.get(self.saved_url)
             
             with open("recorder.js", "r") as f:
@@ -284,72 +582,56 @@ class TestAutomationTool(QMainWindow):
             self.recording_thread.start()
 
         except Exception as e:
-            print(f"Error starting browser: {e}")
+            self.run_log.error(f"Error starting browser: {e}")
             self.handle_recording_finished()
 
     def listen_for_actions(self, recorder_script):
+        from selenium.common.exceptions import JavascriptException, WebDriverException
+
         script_with_state = f"window.isAsserting = {str(self.is_asserting).lower()};\n{recorder_script}"
 
+        try:
+            # Arm the recorder in every future document before the page's own scripts run.
+            self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": script_with_state})
+        except WebDriverException:
+            pass  # Falls back to re-arming after each navigation below.
+
         while self.is_recording:
             try:
-                self.driver.current_url
-                action = self.driver.execute_async_script(script_with_state)
-                if action:
-                    self.signals.action_recorded.emit(action)
+                actions = self.driver.execute_async_script(RECORDER_DRAIN_SCRIPT, RECORDER_POLL_MS)
+                if actions is None:
+                    self.driver.execute_script(script_with_state)
+                    continue
+                if actions:
+                    self.signals.actions_recorded.emit(actions)
+                    time.sleep(RECORDER_BATCH_MS / 1000)
+            except JavascriptException:
+                pass  # The document was replaced mid-poll; its queue is carried to the next one.
             except WebDriverException:
                 self.is_recording = False
                 break
-            except JavascriptException:
-                pass
         self.signals.finished.emit()
 
-    def add_action_to_table(self, action, is_loading=False):
-        self.steps_table.blockSignals(True)
-        if not is_loading:
-            self.recorded_actions.append(action)
-
-        row_position = self.steps_table.rowCount()
-        self.steps_table.insertRow(row_position)
-
-        step_num = QTableWidgetItem(str(row_position + 1))
-        action_type = QTableWidgetItem(action.get("type", ""))
-        selector = QTableWidgetItem(action.get("selector", ""))
-        value = QTableWidgetItem(action.get("value", ""))
-
-        step_num.setFlags(step_num.flags() & ~Qt.ItemIsEditable)
-
-        self.steps_table.setItem(row_position, 0, step_num)
-        self.steps_table.setItem(row_position, 1, action_type)
-        self.steps_table.setItem(row_position, 2, selector)
-        self.steps_table.setItem(row_position, 3, value)
-        self.steps_table.blockSignals(False)
+    def add_actions_to_table(self, actions):
+        # A burst the page flushed across two drains (e.g. a typing pause) continues the last row.
+        last_row = self.step_model.rowCount() - 1
+        if last_row >= 0 and compaction.redundancy(self.step_model.action(last_row), actions[0]) in RECORDER_MERGED_RULES:
+            self.step_model.replace_action(last_row, actions[0])
+            actions = actions[1:]
+        self.step_model.append_actions(actions)
+        self.steps_table.scrollToBottom()
 
     def add_manual_step(self):
-        self.steps_table.blockSignals(True)
-        new_action = {"type": "", "selector": "", "value": ""}
-        self.recorded_actions.append(new_action)
-
-        row_position = self.steps_table.rowCount()
-        self.steps_table.insertRow(row_position)
-
-        step_num = QTableWidgetItem(str(row_position + 1))
-        step_num.setFlags(step_num.flags() & ~Qt.ItemIsEditable)
-
-        action_type = QTableWidgetItem("")
-        selector = QTableWidgetItem("")
-        value = QTableWidgetItem("")
-
-        self.steps_table.setItem(row_position, 0, step_num)
-        self.steps_table.setItem(row_position, 1, action_type)
-        self.steps_table.setItem(row_position, 2, selector)
-        self.steps_table.setItem(row_position, 3, value)
-        
-        self.steps_table.blockSignals(False)
+        self.step_model.append_actions([{"type": "", "selector": "", "value": ""}])
+        self.steps_table.scrollToBottom()
         print("Added a new empty step. Double-click cells to edit.")
 
     def handle_recording_finished(self):
         print("...Recording finished.")
         self.is_recording = False
+        # Recording ends when the user closes the window, so the session is gone.
+        if self.driver:
+            self.browser_pool().release(self.driver, headless=False, broken=True)
         self.driver = None
         
         self.record_button.setEnabled(True)
@@ -357,132 +639,248 @@ class TestAutomationTool(QMainWindow):
         self.assertion_checkbox.setEnabled(True)
         self.headless_checkbox.setEnabled(True)
 
-        if self.recorded_actions:
-            print(f"\n--- Total Actions Recorded: {len(self.recorded_actions)} ---")
+        if self.step_model.rowCount():
+            print(f"\n--- Total Actions Recorded: {self.step_model.rowCount()} ---")
         else:
             print("No actions were recorded.")
             
     def delete_selected_steps(self):
+        if self.is_running:
+            print("Cannot delete steps while a test is running.")
+            return
         selected_rows_indices = self.steps_table.selectionModel().selectedRows()
         if not selected_rows_indices:
             print("No steps selected to delete.")
             return
 
-        self.steps_table.blockSignals(True)
-        rows_to_delete = sorted([index.row() for index in selected_rows_indices], reverse=True)
-
-        for row_index in rows_to_delete:
-            self.steps_table.removeRow(row_index)
-            self.recorded_actions.pop(row_index)
-        
-        for i in range(self.steps_table.rowCount()):
-            item = self.steps_table.item(i, 0)
-            if item:
-                item.setText(str(i + 1))
-        
-        self.steps_table.blockSignals(False)
-        print(f"Deleted {len(rows_to_delete)} step(s).")
-
-    def update_step_data(self, row, column):
-        if not self.recorded_actions or row >= len(self.recorded_actions):
-            return
-
-        new_value = self.steps_table.item(row, column).text()
-        key_map = {1: "type", 2: "selector", 3: "value"}
+        deleted = self.step_model.delete_rows([index.row() for index in selected_rows_indices])
+        print(f"Deleted {deleted} step(s).")
 
-        if column in key_map:
-            key_to_update = key_map[column]
-            if self.recorded_actions[row].get(key_to_update) != new_value:
-                self.recorded_actions[row][key_to_update] = new_value
-                print(f"Updated Step {row + 1}: Set '{key_to_update}' to '{new_value}'")
+    def handle_step_edited(self, row, key, new_value):
+        print(f"Updated Step {row + 1}: Set '{key}' to '{new_value}'")
 
     def start_test(self):
-        if not self.recorded_actions:
+        if not self.step_model.rowCount():
             print("No actions recorded to test. Please record a session first.")
             return
         if not self.saved_url:
             print("URL not set. Please save a URL before starting a test.")
             return
+        if self.is_running:
+            print("A test is already running.")
+            return
 
+        self.last_run_id = self.log_pipeline.begin_run()
+        if self.log_run_combo.currentIndex() == 1:
+            self.refresh_log_view()
         self._set_status("running")
-        print("--- Starting Test Execution ---")
-        if self.headless_checkbox.isChecked():
+        print(f"--- Starting Test Execution (run {self.last_run_id}) ---")
+        headless = self.headless_checkbox.isChecked()
+        if headless:
             print("Running in HEADLESS mode.")
-            
+        fast = self.fast_checkbox.isChecked()
+        if fast:
+            print("Running in FAST mode (pipelined steps).")
+        soft_assert = self.soft_assert_checkbox.isChecked()
+        # Headed runs are for watching the page, so the network policy only trims headless ones.
+        policy = None
+        if headless:
+            try:
+                policy = network_policy.policy_for({"network_policy": self.case_network_policy},
+                                                   self.current_case_path)
+            except Exception as e:
+                self.run_log.warning(f"Ignoring unreadable network policy: {e}")
+
+        self.is_running = True
+        self.stop_event.clear()
+        self.step_model.clear_step_states()
         self.record_button.setEnabled(False)
         self.start_button.setEnabled(False)
+        self.stop_button.setEnabled(True)
         self.assertion_checkbox.setEnabled(False)
         self.headless_checkbox.setEnabled(False)
+        self.fast_checkbox.setEnabled(False)
+        self.soft_assert_checkbox.setEnabled(False)
+        self.add_step_button.setEnabled(False)
+        self.delete_button.setEnabled(False)
+        self.compact_button.setEnabled(False)
+
+        # The worker gets its own copy so table edits cannot race with the replay.
+        actions = self.step_model.to_actions()
+        self.replay_thread = threading.Thread(target=self.run_test_worker,
+                                              args=(self.saved_url, actions, headless, fast, policy, soft_assert))
+        self.replay_thread.daemon = True
+        self.replay_thread.start()
+
+    def run_test_worker(self, url, actions, headless, fast=False, policy=None, soft_assert=False):
+        import replay
 
         test_succeeded = True
+        driver_broken = False
+        timer = RunTimer(url)
+        self.last_timer = timer
+        self.last_run = {"case": {"url": url, "actions": actions}, "steps": [], "error": ""}
+        run_artifacts = artifacts.RunArtifacts(self.artifact_writer,
+                                               artifacts.run_id(self.current_case_path or "run", self.test_cases_dir))
         try:
-            options = ChromeOptions()
-            if self.headless_checkbox.isChecked():
-                options.add_argument("--headless")
-                options.add_argument("--disable-gpu")
-
-            self.test_driver = webdriver.Chrome(options=options)
-            self.test_driver.get(self.saved_url)
-            wait = WebDriverWait(self.test_driver, 10)
-
-            for i, action in enumerate(self.recorded_actions, 1):
-                action_type = action.get('type', '')
-                selector = action.get('selector', '')
-                value = action.get('value', '')
-                
-                print(f"Step {i}/{len(self.recorded_actions)}: {action_type} on '{selector}'")
-
-                try:
-                    if action_type == 'assert_text':
-                        element = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
-                        actual_text = element.text
-                        if actual_text == value:
-                            print(f"  [Assertion Passed] Expected text '{value}' found.")
-                        else:
-                            print(f"  [Assertion Failed] Expected '{value}', but found '{actual_text}'.")
-                            test_succeeded = False
-                            break
-                        continue
-
-                    # All other action types require a located element first
-                    element = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
-
-                    if action_type == 'click':
-                        element.click()
-                    elif action_type == 'input':
-                        element.clear()
-                        element.send_keys(value)
-
-                    time.sleep(1)
-
-                except TimeoutException:
-                    print(f"  Error: Element not found: {selector}")
-                    test_succeeded = False
-                    break
-                except Exception as e:
-                    print(f"  Error during action: {e}")
-                    test_succeeded = False
-                    break
+            with timer.span("driver_start"):
+                self.test_driver = self.browser_pool().acquire(headless)
+            with network_policy.enforce(self.test_driver, policy, log=self.run_log):
+                with timer.span("get"):
+                    self.test_driver.get(url)
+                results = replay.run_steps(self.test_driver, actions, log=self.run_log,
+                                           on_event=self._emit_step_event, stop_event=self.stop_event,
+                                           timer=timer, fast=fast,
+                                           soft_assert=soft_assert, artifacts=run_artifacts)
+            self.last_run["steps"] = results
+            test_succeeded = all(result["passed"] for result in results)
 
         except Exception as e:
-            print(f"An error occurred during test setup: {e}")
+            self.last_run["error"] = f"An error occurred during test setup: {e}"
+            self.run_log.error(f"An error occurred during test setup: {e}")
             test_succeeded = False
-        finally:
+            driver_broken = True
             if self.test_driver:
-                self.test_driver.quit()
+                run_artifacts.capture(self.test_driver, "error", timer=timer)
+        finally:
+            self.browser_pool().release(self.test_driver, headless, broken=driver_broken)
+            self.test_driver = None
 
-            if test_succeeded:
-                self._set_status("success")
+            if self.stop_event.is_set() and test_succeeded:
+                self.replay_signals.finished.emit("stopped")
+            elif test_succeeded:
+                self.replay_signals.finished.emit("success")
             else:
-                self._set_status("failed")
+                self.replay_signals.finished.emit("failed")
+
+    def _emit_step_event(self, kind, result):
+        row = result["step"] - 1
+        if kind == "started":
+            self.replay_signals.step_started.emit(row)
+        elif kind == "passed":
+            self.replay_signals.step_passed.emit(row, result["duration"])
+        else:
+            self.replay_signals.step_failed.emit(row, result["message"], result["duration"])
+
+    def stop_test(self):
+        if self.is_running:
+            self.run_log.warning("Stopping after the current step...")
+            self.stop_event.set()
+            self.stop_button.setEnabled(False)
+
+    def handle_step_started(self, row):
+        self.step_model.set_step_state(row, "running")
+        self.steps_table.scrollTo(self.step_model.index(row, 0))
+
+    def handle_step_passed(self, row, duration):
+        self.step_model.set_step_state(row, "passed")
+
+    def handle_step_failed(self, row, message, duration):
+        self.step_model.set_step_state(row, "failed")
+        self.run_log.error(f"  Step {row + 1} failed after {duration:.2f}s: {message}")
+
+    def handle_test_finished(self, status):
+        self.is_running = False
+        self._set_status(status)
+        self.show_timing_summary()
+        self.log_pipeline.end_run()
+        if self.last_run and status in ("success", "failed"):
+            self.run_history.record_run(self.current_case_path, history.case_hash(self.last_run["case"]), {
+                "passed": status == "success",
+                "duration": time.perf_counter() - self.last_timer.origin,
+                "steps": self.last_run["steps"],
+                "error": self.last_run["error"],
+            }, source="gui")
+        if self.current_case_path and status in ("success", "failed"):
+            self.catalog.record_result(self.current_case_path, status == "success")
+            self.record_duration(self.current_case_path, status == "success")
+            self.populate_explorer()
+
+        self.record_button.setEnabled(True)
+        self.start_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+        self.assertion_checkbox.setEnabled(True)
+        self.headless_checkbox.setEnabled(True)
+        self.fast_checkbox.setEnabled(True)
+        self.soft_assert_checkbox.setEnabled(True)
+        self.add_step_button.setEnabled(True)
+        self.delete_button.setEnabled(True)
+        self.compact_button.setEnabled(True)
+
+    def record_duration(self, path, passed):
+        # Feeds the batch runner's longest-first ordering and --failed-only selection.
+        if not self.last_timer:
+            return
+        try:
+            durations = scheduler.DurationStore()
+            durations.record(path, time.perf_counter() - self.last_timer.origin, passed)
+            durations.save()
+        except OSError as e:
+            self.run_log.warning(f"Could not record the run duration: {e}")
+
+    def show_history(self):
+        self.run_history.flush()
+        try:
+            HistoryDialog(self.run_history, self.current_case_path, self).exec()
+        except Exception as e:
+            self.run_log.error(f"Error reading run history: {e}")
+
+    def show_timing_summary(self):
+        if not self.last_timer or not self.last_timer.spans:
+            self.timing_label.setText("")
+            return
+        lines = self.last_timer.summary_lines()
+        print("--- Timing Summary ---")
+        for line in lines:
+            print(line)
+        slowest = self.last_timer.slowest_steps(1)
+        headline = lines[0] if lines and lines[0].startswith("Step time") else ""
+        if slowest:
+            headline += f" | slowest: step {slowest[0]['step']} ({slowest[0]['duration']:.2f}s)"
+        self.timing_label.setText(headline)
+        self.timing_label.setToolTip("\n".join(lines))
+        self.export_timing_button.setEnabled(True)
+
+    def export_timing(self):
+        if not self.last_timer:
+            print("No timing data yet. Run a test first.")
+            return
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export Timing (Chrome Trace)", "timing.trace.json",
+                                                   "Chrome Trace Files (*.json)")
+        if not file_path:
+            return
+        if not file_path.endswith('.json'):
+            file_path += '.json'
+        csv_path = os.path.splitext(file_path)[0] + ".csv"
+        try:
+            self.last_timer.export_chrome_trace(file_path)
+            self.last_timer.export_csv(csv_path)
+            print(f"Timing exported to {os.path.basename(file_path)} and {os.path.basename(csv_path)}")
+        except Exception as e:
+            self.run_log.error(f"Error exporting timing: {e}")
+
+    def compact_steps(self):
+        if self.is_running:
+            print("Cannot compact steps while a test is running.")
+            return
+        actions = self.step_model.to_actions()
+        compacted, changes = compaction.compact(actions)
+        for line in compaction.suspect_lines(compaction.suspects(actions)):
+            print(line)
+        if not changes:
+            print("Nothing to compact.")
+            return
+        if self._confirm_compaction(actions, compacted, changes):
+            self.step_model.load(compacted)
+            print(f"Compacted {len(actions)} steps to {len(compacted)} ({compaction.summarize(changes)}).")
+
+    def _confirm_compaction(self, actions, compacted, changes, accept_text="Apply", reject_text="Cancel"):
+        summary = f"{len(actions)} -> {len(compacted)} steps ({compaction.summarize(changes)})"
+        dialog = CompactionDialog(compaction.diff_lines(actions, compacted), summary, accept_text, reject_text, self)
+        return dialog.exec() == QDialog.DialogCode.Accepted
 
-            self.record_button.setEnabled(True)
-            self.start_button.setEnabled(True)
-            self.assertion_checkbox.setEnabled(True)
-            self.headless_checkbox.setEnabled(True)
-            
     def save_test(self):
-        if not self.recorded_actions:
+        if not self.step_model.rowCount():
             print("No actions to save.")
             return
 
@@ -497,65 +895,86 @@ class TestAutomationTool(QMainWindow):
             if not file_path.endswith('.json'):
                 file_path += '.json'
 
+            actions = self.step_model.to_actions()
+            compacted, changes = compaction.compact(actions)
+            if changes and self._confirm_compaction(actions, compacted, changes, "Compact && Save", "Save All Steps"):
+                actions = compacted
+                self.step_model.load(actions)
+
             test_case = {
                 "url": self.saved_url,
-                "actions": self.recorded_actions
+                "actions": actions
             }
+            if self.case_network_policy:
+                test_case["network_policy"] = self.case_network_policy
             try:
                 with open(file_path, 'w') as f:
                     json.dump(test_case, f, indent=4)
+                self.current_case_path = file_path
                 print(f"Test case saved to {os.path.basename(file_path)}")
+                self.refresh_catalog()
             except Exception as e:
-                print(f"Error saving file: {e}")
+                self.run_log.error(f"Error saving file: {e}")
 
-    def load_test_from_explorer(self, index):
-        file_path = self.file_model.filePath(index)
+    def load_test_from_explorer(self, item):
+        file_path = item.data(Qt.UserRole)
         if not file_path or not os.path.isfile(file_path):
             return
+        if self.is_running:
+            print("Cannot load a test case while a test is running.")
+            return
             
         self._set_status("reset")
         print(f"--- Loading Test Case from {os.path.basename(file_path)} ---")
-        self.steps_table.blockSignals(True)
-        self.steps_table.setRowCount(0)
 
         try:
-            with open(file_path, 'r') as f:
-                test_case = json.load(f)
+            test_case = self.catalog.load(file_path)
+            self.current_case_path = file_path
+            self.case_network_policy = test_case.get("network_policy")
 
             self.saved_url = test_case.get("url", "")
             self.url_input.setText(self.saved_url)
             
-            self.recorded_actions = test_case.get("actions", [])
-                            
-            for action in self.recorded_actions:
-                self.add_action_to_table(action, is_loading=True)
+            self.step_model.load(test_case.get("actions", []))
             print(f"Test case loaded successfully.")
 
         except Exception as e:
-            print(f"Error loading test case: {e}")
-        finally:
-            self.steps_table.blockSignals(False)
+            self.step_model.load([])
+            self.current_case_path = None
+            self.case_network_policy = None
+            self.run_log.error(f"Error loading test case: {e}")
+
+    def changeEvent(self, event):
+        # Coming back from an editor: re-check the catalog for cases edited in place.
+        if event.type() == QEvent.ActivationChange and self.isActiveWindow():
+            self.catalog_refresh_timer.start()
+        super().changeEvent(event)
 
     def closeEvent(self, event):
         print("Closing application...")
         self.is_recording = False
-        if self.driver:
-            try:
-                self.driver.quit()
-            except WebDriverException:
-                pass
-        if self.test_driver:
-            try:
-                self.test_driver.quit()
-            except WebDriverException:
-                pass
-        
+        self.stop_event.set()
+        for driver in (self.driver, self.test_driver):
+            if driver:
+                try:
+                    driver.quit()
+                except Exception:
+                    pass
+        if self.session_pool:
+            self.session_pool.close()
+        self.catalog.close()
+        self.run_history.close()
+        self.artifact_writer.close()
+
         sys.stdout = sys.__stdout__
+        self.log_flush_timer.stop()
+        self.log_pipeline.close()
         event.accept()
 
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    startup_profile.mark("QApplication created")
 
     try:
         with open("stylesheet.qss", "r") as f:
@@ -563,6 +982,7 @@ if __name__ == "__main__":
         app.setStyleSheet(stylesheet)
     except FileNotFoundError:
         print("stylesheet.qss not found, using default style.")
+    startup_profile.mark("stylesheet applied")
 
     window = TestAutomationTool()
 
@@ -572,9 +992,15 @@ if __name__ == "__main__":
         
         if hasattr(window, 'log_window'):
             error_msg = "".join(traceback.format_exception(exc_type, exc_value, exc_traceback))
-            window.append_log(f"--- UNCAUGHT EXCEPTION ---\n{error_msg}")
+            window.append_log(f"--- UNCAUGHT EXCEPTION ---\n{error_msg}", logging.ERROR)
 
     sys.excepthook = handle_exception
     
     window.show()
+
+    def first_paint():
+        startup_profile.mark("window shown (first event)")
+        startup_profile.report()
+
+    QTimer.singleShot(0, first_paint)
     sys.exit(app.exec())
@@ -0,0 +1,323 @@
+
+import base64
+import fnmatch
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import log_pipeline
+
+# --- Replay Network Policy --- #
+# Headless replays do not need most of what a page downloads. A network policy, stored in
+# a case under "network_policy" or for a whole suite in a `.network_policy.json` next to
+# its cases, is enforced with DevTools request interception (Fetch domain):
+#
+#   {"block_types": ["image", "media", "font"],      CDP resource types to fail
+#    "block_urls": ["*://cdn.example.com/promo/*"],  URL wildcard patterns to fail
+#    "block_trackers": true,                         also fail KNOWN_TRACKERS
+#    "cache_types": ["script", "stylesheet"],        serve these from the asset cache
+#    "enabled": true}
+#
+# Cached assets live on disk in .quaty/assets, shared by every worker process and run.
+# Without an event-capable DevTools connection (trio / bidi_connection), blocking falls
+# back to Network.setBlockedURLs and the asset cache is skipped.
+
+POLICY_FILE = ".network_policy.json"
+ASSET_CACHE_DIR = os.path.join(".quaty", "assets")
+ASSET_MAX_AGE = 24 * 60 * 60      # Seconds a cached asset is served before it is refetched
+MAX_ASSET_BYTES = 5 * 1024 * 1024  # Larger responses are not cached
+START_TIMEOUT = 10                # Seconds to wait for interception to be in place
+STOP_TIMEOUT = 5                  # Seconds to wait for the interception thread to end
+# Every request pauses, and selenium drops events once a listener's buffer is full, which
+# would leave those requests paused forever: the listener buffer is unbounded.
+EVENT_BUFFER = math.inf
+
+KNOWN_TRACKERS = (
+    "*google-analytics.com/*",
+    "*googletagmanager.com/*",
+    "*doubleclick.net/*",
+    "*connect.facebook.net/*",
+    "*hotjar.com/*",
+    "*clarity.ms/*",
+    "*segment.io/*",
+    "*mixpanel.com/*",
+)
+
+# URL patterns used for resource types when only Network.setBlockedURLs is available.
+TYPE_URL_PATTERNS = {
+    "image": ("*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.svg*", "*.ico*", "*.avif*"),
+    "font": ("*.woff*", "*.woff2*", "*.ttf*", "*.otf*", "*.eot*"),
+    "media": ("*.mp4*", "*.webm*", "*.mp3*", "*.ogg*", "*.wav*", "*.m4a*"),
+}
+
+# Decoded bodies are served back, so these headers from the original response would lie.
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+# --- Policy Lookup --- #
+def load_suite_policy(case_path):
+    """The nearest `.network_policy.json` in the case's directory or its parents, or None."""
+    directory = os.path.dirname(os.path.abspath(case_path))
+    while True:
+        candidate = os.path.join(directory, POLICY_FILE)
+        if os.path.isfile(candidate):
+            with open(candidate, "r") as f:
+                return json.load(f)
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+def policy_for(test_case, case_path=None):
+    """Merges the suite policy with the case's own "network_policy" keys. None when disabled."""
+    policy = dict(load_suite_policy(case_path) or {}) if case_path else {}
+    policy.update(test_case.get("network_policy") or {})
+    if not policy or not policy.get("enabled", True):
+        return None
+    return policy
+
+
+def blocked_patterns(policy):
+    patterns = list(policy.get("block_urls", []))
+    if policy.get("block_trackers"):
+        patterns.extend(KNOWN_TRACKERS)
+    return patterns
+
+
+# --- Asset Cache --- #
+class AssetCache:
+    """GET responses stored as <hash>.json (status, headers) + <hash>.body on disk."""
+
+    def __init__(self, directory=ASSET_CACHE_DIR, max_age=ASSET_MAX_AGE):
+        self.directory = directory
+        self.max_age = max_age
+
+    def _paths(self, url):
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, key[:2], key)
+        return base + ".json", base + ".body"
+
+    def get(self, url):
+        """Returns (status, headers, body bytes) for a fresh entry, or None."""
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            if time.time() - meta["stored"] > self.max_age:
+                return None
+            with open(body_path, "rb") as f:
+                return meta["status"], meta["headers"], f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, url, status, headers, body):
+        if len(body) > MAX_ASSET_BYTES:
+            return False
+        if any(name.lower() == "cache-control" and "no-store" in value.lower() for name, value in headers):
+            return False
+        meta_path, body_path = self._paths(url)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        # Body first, then metadata: a reader only trusts entries whose metadata exists.
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(body_path + suffix, "wb") as f:
+            f.write(body)
+        os.replace(body_path + suffix, body_path)
+        with open(meta_path + suffix, "w") as f:
+            json.dump({"url": url, "status": status, "headers": headers, "stored": time.time()}, f)
+        os.replace(meta_path + suffix, meta_path)
+        return True
+
+
+# --- Enforcement --- #
+class Interceptor:
+    """Enforces a policy on one driver's page target until stop() is called."""
+
+    def __init__(self, driver, policy, cache=None, log=print):
+        self.driver = driver
+        self.policy = policy
+        self.cache = cache or AssetCache()
+        self.log = log
+        self.block_types = {value.lower() for value in policy.get("block_types", [])}
+        self.cache_types = {value.lower() for value in policy.get("cache_types", [])}
+        self.patterns = blocked_patterns(policy)
+        self.stats = {"requests": 0, "blocked": 0, "cache_hits": 0, "cache_stores": 0, "bytes_from_cache": 0,
+                      "mode": "fetch"}
+        self._ready = threading.Event()
+        self._thread = None
+        self._token = None
+        self._scope = None
+        self._listening = False
+        self._abandoned = False  # start() gave up on the loop; it must not intercept anymore
+        self.error = None
+
+    # --- Lifecycle --- #
+    def start(self):
+        try:
+            import trio  # noqa: F401 (bidi_connection runs on trio)
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            self._ready.wait(START_TIMEOUT)
+            if not self._listening:
+                raise RuntimeError(self.error or "DevTools connection did not start")
+        except Exception as e:
+            log_pipeline.warning(self.log, f"  Request interception unavailable ({e}); blocking by URL only, asset cache off")
+            # Only one mechanism may act on the page: end the loop before falling back.
+            self._stop_thread()
+            self._start_fallback()
+        return self
+
+    def stop(self):
+        self._stop_thread()
+        if self.stats["mode"] == "blocked_urls":
+            try:
+                self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": []})
+            except Exception:
+                pass
+        return self.stats
+
+    def _stop_thread(self):
+        """Cancels the trio loop, if there is one, and waits a bounded time for its thread."""
+        if self._thread is None:
+            return
+        self._abandoned = True
+        if self._token is not None:
+            import trio
+            try:
+                trio.from_thread.run_sync(self._scope.cancel, trio_token=self._token)
+            except Exception:
+                pass  # The loop already ended (page or browser closed)
+        self._thread.join(timeout=STOP_TIMEOUT)
+        self._thread = None
+
+    def _start_fallback(self):
+        self.stats["mode"] = "blocked_urls"
+        urls = list(self.patterns)
+        for resource_type in self.block_types:
+            urls.extend(TYPE_URL_PATTERNS.get(resource_type, ()))
+        self.driver.execute_cdp_cmd("Network.enable", {})
+        self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": urls})
+
+    def _run(self):
+        import trio
+        try:
+            trio.run(self._serve)
+        except Exception as e:
+            self.error = e
+        finally:
+            self._ready.set()
+
+    async def _serve(self):
+        import trio
+        with trio.CancelScope() as scope:
+            self._scope = scope
+            self._token = trio.lowlevel.current_trio_token()
+            if self._abandoned:
+                return
+            async with self.driver.bidi_connection() as connection:
+                session, devtools = connection.session, connection.devtools
+                fetch = devtools.fetch
+                patterns = [fetch.RequestPattern(url_pattern="*", request_stage=fetch.RequestStage.REQUEST)]
+                # Cacheable types pause a second time with their response so it can be stored.
+                for resource_type in devtools.network.ResourceType:
+                    if resource_type.value.lower() in self.cache_types:
+                        patterns.append(fetch.RequestPattern(url_pattern="*", resource_type=resource_type,
+                                                             request_stage=fetch.RequestStage.RESPONSE))
+                await session.execute(fetch.enable(patterns=patterns))
+                events = session.listen(fetch.RequestPaused, buffer_size=EVENT_BUFFER)
+                if self._abandoned:
+                    return
+                self._listening = True
+                self._ready.set()
+                async with trio.open_nursery() as nursery:
+                    async for event in events:
+                        nursery.start_soon(self._handle, session, devtools, event)
+
+    # --- Request Handling --- #
+    def should_block(self, url, resource_type):
+        if resource_type in self.block_types:
+            return True
+        return any(fnmatch.fnmatchcase(url, pattern) for pattern in self.patterns)
+
+    async def _handle(self, session, devtools, event):
+        fetch = devtools.fetch
+        url = event.request.url
+        resource_type = event.resource_type.value.lower()
+        try:
+            if event.response_status_code is not None or event.response_error_reason is not None:
+                await self._store(session, devtools, event, url)
+                await session.execute(fetch.continue_request(request_id=event.request_id))
+                return
+
+            self.stats["requests"] += 1
+            if self.should_block(url, resource_type):
+                self.stats["blocked"] += 1
+                await session.execute(fetch.fail_request(request_id=event.request_id,
+                                                         error_reason=devtools.network.ErrorReason.BLOCKED_BY_CLIENT))
+                return
+
+            cached = self.cache.get(url) if resource_type in self.cache_types and event.request.method == "GET" else None
+            if cached:
+                status, headers, body = cached
+                self.stats["cache_hits"] += 1
+                self.stats["bytes_from_cache"] += len(body)
+                await session.execute(fetch.fulfill_request(
+                    request_id=event.request_id, response_code=status,
+                    response_headers=[fetch.HeaderEntry(name=name, value=value) for name, value in headers],
+                    body=base64.b64encode(body).decode("ascii")))
+                return
+            await session.execute(fetch.continue_request(request_id=event.request_id))
+        except Exception:
+            pass  # The request was cancelled or its page navigated away
+
+    async def _store(self, session, devtools, event, url):
+        if event.response_status_code != 200 or event.request.method != "GET":
+            return
+        try:
+            body, encoded = await session.execute(devtools.fetch.get_response_body(request_id=event.request_id))
+        except Exception:
+            return
+        data = base64.b64decode(body) if encoded else body.encode("utf-8")
+        headers = [(header.name, header.value) for header in event.response_headers or []
+                   if header.name.lower() not in DROPPED_HEADERS]
+        try:
+            if self.cache.put(url, event.response_status_code, headers, data):
+                self.stats["cache_stores"] += 1
+        except OSError:
+            pass
+
+
+@contextmanager
+def enforce(driver, policy, log=print, cache=None):
+    """Applies `policy` (None: no-op) to `driver` for the duration of the block; yields the stats dict."""
+    if not policy:
+        yield None
+        return
+    interceptor = Interceptor(driver, policy, cache=cache, log=log).start()
+    try:
+        yield interceptor.stats
+    finally:
+        interceptor.stop()
+        log(format_stats(interceptor.stats))
+
+
+def format_stats(stats):
+    if stats.get("mode") == "blocked_urls":
+        return "Network policy: blocking by URL pattern (no request counts without interception)"
+    return (f"Network policy: blocked {stats['blocked']} of {stats['requests']} request(s), served "
+            f"{stats['cache_hits']} from cache ({stats['bytes_from_cache'] / 1024:.0f} KB), "
+            f"cached {stats['cache_stores']} new asset(s)")
+
+
+def merge_stats(all_stats):
+    """Sums per-case stats dicts (Nones are skipped) into suite totals."""
+    totals = {"requests": 0, "blocked": 0, "cache_hits": 0, "cache_stores": 0, "bytes_from_cache": 0}
+    for stats in all_stats:
+        if stats:
+            for key in totals:
+                totals[key] += stats.get(key, 0)
+    return totals
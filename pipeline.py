@@ -0,0 +1,121 @@
+
+import os
+import time
+
+import log_pipeline
+import readiness
+from cases import step_selectors
+
+# --- Pipelined Step Execution --- #
+# Fast mode: instead of several WebDriver HTTP round-trips per step (presence poll, click or
+# clear + send_keys), runs of consecutive steps are shipped to executor.js
+# and performed in-page with one execute_async_script. A click always ends a batch because
+# it may navigate. Steps marked `"trusted": true`, and inputs the page reports it cannot fill
+# faithfully (file pickers, checkboxes, contenteditable...), fall back to native WebDriver.
+
+# Assertions have their own bulk path (assertions.py).
+PIPELINED_TYPES = ("click", "input")
+MAX_BATCH = 50
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "executor.js")
+
+_executor_script = None
+
+
+def executor_script():
+    global _executor_script
+    if _executor_script is None:
+        with open(SCRIPT_PATH, "r") as f:
+            _executor_script = f.read()
+    return _executor_script
+
+
+def can_pipeline(action):
+    return action.get("type", "") in PIPELINED_TYPES and not action.get("trusted")
+
+
+def batch_end(actions, first):
+    """Index one past the last step of the batch starting at `first` (== first when none)."""
+    end = first
+    while end < len(actions) and end - first < MAX_BATCH and can_pipeline(actions[end]):
+        end += 1
+        if actions[end - 1].get("type") == "click":
+            break
+    return end
+
+
+def run_batch(driver, actions, first, end, timeout, settle_timeout, log=print, timer=None, on_event=None):
+    """Executes actions[first:end] in-page.
+
+    Returns (results, native_index, waited). Results cover the steps performed in-page, in
+    order; native_index is the absolute index of a step that must run natively next (it
+    needs trusted input events, or the batch ran out of time waiting for it), or None.
+    `waited` is how many seconds that step already waited for its element, to be taken off
+    its native timeout.
+    """
+    steps = []
+    for action in actions[first:end]:
+        selectors, positional = step_selectors(action)
+        steps.append({
+            "type": action.get("type", ""),
+            "selectors": selectors,
+            "positional": positional,
+            "value": "" if action.get("value") is None else str(action.get("value")),
+        })
+
+    started = time.perf_counter()
+    # The batch as a whole gets one step's timeout in-page (see executor.js), so the
+    # driver-level script timeout never has to cover a whole batch of waits.
+    reply = driver.execute_async_script(executor_script(), steps, int(timeout * 1000), int(timeout * 1000))
+    if timer:
+        timer.add("batch", started, time.perf_counter() - started, first + 1, size=len(steps))
+    if not reply or not isinstance(reply.get("results"), list):
+        return [], first, 0.0
+
+    results = []
+    for offset, step_reply in enumerate(reply["results"]):
+        action = actions[first + offset]
+        i = first + offset + 1
+        action_type = action.get("type", "")
+        selector = action.get("selector", "")
+        log(f"Step {i}/{len(actions)}: {action_type} on '{selector}' [pipelined]")
+        result = {"step": i, "type": action_type, "selector": selector, "passed": step_reply["status"] == "passed",
+                  "message": "", "wait": 0.0, "duration": step_reply.get("duration", 0.0) / 1000.0, "pipelined": True}
+        used = step_reply.get("used")
+        if used and used != selector:
+            log_pipeline.warning(log, f"  Primary selector not found, used fallback '{used}'")
+            result["selector_used"] = used
+
+        status = step_reply["status"]
+        if status == "not_found":
+            result["message"] = f"Element not found: {selector}"
+            log_pipeline.error(log, f"  Error: {result['message']}")
+        elif status == "error":
+            result["message"] = step_reply.get("message", "")
+            log_pipeline.error(log, f"  Error during action: {result['message']}")
+
+        if timer:
+            timer.add("step", started + step_reply.get("start", 0.0) / 1000.0, result["duration"], i,
+                      type=action_type, selector=selector, passed=result["passed"])
+        if on_event:
+            on_event("started", result)
+            on_event("passed" if result["passed"] else "failed", result)
+        results.append(result)
+
+    # One settle wait for the whole batch, after its last page-changing step.
+    if results and results[-1]["passed"]:
+        settle_started = time.perf_counter()
+        settled = readiness.wait_until_ready(driver, settle_timeout)
+        if timer:
+            timer.add("settle", settle_started, settled["waited"], results[-1]["step"])
+        results[-1]["wait"] = settled["waited"]
+        readiness.log_settle(settled, log)
+
+    native = reply.get("native")
+    if native is None:
+        return results, None, 0.0
+    if reply.get("reason") == "budget":
+        log("  Batch used its time budget, running the next step natively")
+    else:
+        log("  Step needs trusted input events, running it natively")
+    return results, first + native, reply.get("waited", 0) / 1000.0
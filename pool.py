@@ -0,0 +1,168 @@
+
+import sys
+import threading
+from contextlib import contextmanager
+from multiprocessing.util import Finalize
+from urllib.parse import urlsplit
+from selenium.common.exceptions import WebDriverException
+
+import replay
+
+# --- Warm WebDriver Session Pool --- #
+# Starting chromedriver + Chrome costs seconds, so browsers are kept alive between cases.
+# A leased browser is reset when it is returned: the case's tabs are replaced by one fresh
+# tab (which drops sessionStorage), cookies are cleared, and localStorage, IndexedDB, caches
+# and service workers are cleared for every origin in the navigation history of the case's
+# tabs, not just the last one. A browser
+# that cannot be reset that way is recycled, as is one that has served `max_uses` cases or
+# stops responding.
+
+class SessionPool:
+    def __init__(self, size=2, max_uses=25):
+        self.size = size          # Idle browsers kept alive per variant (headless / headed)
+        self.max_uses = max_uses  # Cases served before a browser is recycled
+        self._idle = {True: [], False: []}
+        self._uses = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def prewarm(self, headless=True, count=None):
+        """Launches browsers until `count` (default: pool size) idle ones of the variant exist."""
+        target = self.size if count is None else min(count, self.size)
+        while True:
+            with self._lock:
+                if self._closed or len(self._idle[headless]) >= target:
+                    return
+            driver = replay.start_driver(headless)
+            with self._lock:
+                self._uses[driver] = 0
+                if self._closed or len(self._idle[headless]) >= target:
+                    surplus = driver
+                else:
+                    self._idle[headless].append(driver)
+                    surplus = None
+            if surplus is not None:
+                self._discard(surplus)
+                return
+
+    def acquire(self, headless=True):
+        while True:
+            with self._lock:
+                driver = self._idle[headless].pop() if self._idle[headless] else None
+            if driver is None:
+                break
+            if self._is_alive(driver):
+                return driver
+            self._discard(driver)
+
+        driver = replay.start_driver(headless)
+        with self._lock:
+            self._uses[driver] = 0
+        return driver
+
+    def release(self, driver, headless=True, broken=False):
+        if driver is None:
+            return
+        with self._lock:
+            self._uses[driver] = self._uses.get(driver, 0) + 1
+            worn_out = self._uses[driver] >= self.max_uses
+
+        if broken or worn_out or self._closed or not self._reset(driver):
+            self._discard(driver)
+            return
+
+        with self._lock:
+            if not self._closed and len(self._idle[headless]) < self.size:
+                self._idle[headless].append(driver)
+                return
+        self._discard(driver)
+
+    @contextmanager
+    def lease(self, headless=True):
+        """Context manager form of acquire/release. A WebDriverException marks the browser broken."""
+        driver = self.acquire(headless)
+        broken = False
+        try:
+            yield driver
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            self.release(driver, headless, broken=broken)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            drivers = self._idle[True] + self._idle[False]
+            self._idle = {True: [], False: []}
+        for driver in drivers:
+            self._discard(driver)
+
+    def _is_alive(self, driver):
+        try:
+            driver.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    def _reset(self, driver):
+        try:
+            handles = driver.window_handles
+            origins = set()
+            for handle in handles:
+                driver.switch_to.window(handle)
+                origins.update(visited_origins(driver))
+            driver.switch_to.new_window("tab")
+            fresh = driver.current_window_handle
+            for handle in handles:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(fresh)
+            for origin in sorted(origins):
+                driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            return True
+        except Exception:
+            # Without CDP there is no way to reach the other origins' storage.
+            return False
+
+    def _discard(self, driver):
+        with self._lock:
+            self._uses.pop(driver, None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+
+def visited_origins(driver):
+    """The http(s) origins in the current tab's navigation history."""
+    entries = driver.execute_cdp_cmd("Page.getNavigationHistory", {}).get("entries", [])
+    origins = set()
+    for url in [entry.get("url", "") for entry in entries] + [driver.current_url]:
+        parts = urlsplit(url)
+        if parts.scheme in ("http", "https") and parts.netloc:
+            origins.add(f"{parts.scheme}://{parts.netloc}")
+    return origins
+
+
+# --- Process Pool Workers --- #
+# Batch runners execute cases in a ProcessPoolExecutor; each worker process keeps its own
+# warm pool for its whole lifetime. Pass init_worker as the executor's initializer.
+_worker_pool = None
+
+
+def init_worker(headless=True, max_uses=25):
+    global _worker_pool
+    _worker_pool = SessionPool(size=1, max_uses=max_uses)
+    # Worker processes skip atexit handlers; a multiprocessing finalizer still runs on shutdown.
+    Finalize(_worker_pool, _worker_pool.close, exitpriority=10)
+    try:
+        _worker_pool.prewarm(headless)
+    except Exception as e:
+        sys.stderr.write(f"Could not pre-warm a browser: {e}\n")
+
+
+def worker_pool():
+    """The current process's pool, or None outside a pool worker (cases then cold-start)."""
+    return _worker_pool
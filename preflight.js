@@ -0,0 +1,33 @@
+
+// This script resolves the selectors of every step that runs on the current page in one
+// synchronous pass (see preflight.py), instead of one WebDriverWait per step at replay.
+//
+// arguments[0]: specs, each {selectors} with the primary selector first
+// The reply is one result per spec: {used, count, visible}; `used` is null when no
+// selector matches, `count` is how many elements the used selector matches.
+
+const specs = arguments[0];
+
+function isVisible(element) {
+    const style = window.getComputedStyle(element);
+    if (style.display === 'none' || style.visibility === 'hidden' || style.opacity === '0') {
+        return false;
+    }
+    const rect = element.getBoundingClientRect();
+    return rect.width > 0 && rect.height > 0;
+}
+
+return specs.map(spec => {
+    for (const selector of spec.selectors) {
+        let matches;
+        try {
+            matches = document.querySelectorAll(selector);
+        } catch (e) {
+            continue;  // Invalid selector: try the next candidate.
+        }
+        if (matches.length) {
+            return { used: selector, count: matches.length, visible: isVisible(matches[0]) };
+        }
+    }
+    return { used: null, count: 0, visible: false };
+});
@@ -0,0 +1,152 @@
+
+import json
+import os
+import time
+
+import assertions
+import readiness
+
+# --- Selector Pre-Flight --- #
+# A broken selector otherwise costs the full element timeout at replay before its step
+# fails. `quaty check` loads the case url (and each page the recorder saw steps on, from
+# their `page` field), waits for it to settle and resolves every step selector of that
+# page in one querySelectorAll pass (preflight.js). Per step:
+#
+#   ok         exactly one match, visible
+#   fallback   the primary selector is gone but a recorded fallback matches
+#   ambiguous  several matches; replay would act on the first one
+#   hidden     matched but not visible
+#   missing    no match although the step runs on the case url, before any interaction,
+#              and the page loaded as requested
+#   deferred   no match on load, but an earlier step (or a redirect) may still bring it
+#              in, so the check cannot tell. Later pages are opened cold, without the
+#              state (login, cart...) the steps before them built up, so their steps are
+#              never more than deferred
+#   skipped    nothing to resolve (no selector, or an assertion that passes without one)
+#
+# Missing steps are stored per case (with the case hash), and `quaty run --fail-fast`
+# gives them FAIL_FAST_TIMEOUT instead of the full timeout.
+
+DEFAULT_PATH = os.path.join(".quaty", "preflight.json")
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "preflight.js")
+FAIL_FAST_TIMEOUT = 2
+# Steps that may change what is on the page before the next step runs.
+INTERACTION_TYPES = ("click", "input", "hover", "press", "scroll")
+
+_check_script = None
+
+
+def check_script():
+    global _check_script
+    if _check_script is None:
+        with open(SCRIPT_PATH, "r") as f:
+            _check_script = f.read()
+    return _check_script
+
+
+def page_groups(test_case):
+    """Splits the steps into runs on the same page: [(page url, [step indices])]."""
+    groups = []
+    page = test_case.get("url", "")
+    for i, action in enumerate(test_case.get("actions", [])):
+        page = action.get("page") or page
+        if groups and groups[-1][0] == page:
+            groups[-1][1].append(i)
+        else:
+            groups.append((page, [i]))
+    return groups
+
+
+def _same_page(a, b):
+    return a.split("#")[0].rstrip("/") == b.split("#")[0].rstrip("/")
+
+
+def status_of(action, observation, definite):
+    if observation["used"] is None:
+        return "missing" if definite else "deferred"
+    if observation["count"] > 1:
+        return "ambiguous"
+    if not observation["visible"]:
+        return "hidden"
+    if observation["used"] != action.get("selector", ""):
+        return "fallback"
+    return "ok"
+
+
+def check_page(driver, page, actions, indices, settle_timeout=readiness.DEFAULT_SETTLE_TIMEOUT, definite=True):
+    """Loads `page` and checks the given steps on it. Returns one report dict per step.
+    Without `definite`, unmatched steps are only ever "deferred"."""
+    driver.get(page)
+    readiness.wait_until_ready(driver, settle_timeout)
+    loaded_as_requested = definite and _same_page(driver.current_url, page)
+    checked = [i for i in indices if actions[i].get("selector") and assertions.requires_element(actions[i])]
+    specs = []
+    for i in checked:
+        selector = actions[i].get("selector", "")
+        specs.append({"selectors": [selector] + [s for s in actions[i].get("selectors", []) if s != selector]})
+    observations = dict(zip(checked, driver.execute_script(check_script(), specs) if specs else []))
+
+    reports = []
+    interacted = False
+    for i in indices:
+        action = actions[i]
+        report = {"step": i + 1, "type": action.get("type", ""), "selector": action.get("selector", ""), "page": page}
+        if i in observations:
+            observation = observations[i]
+            report["status"] = status_of(action, observation, loaded_as_requested and not interacted)
+            report["count"] = observation["count"]
+            if observation["used"] and observation["used"] != report["selector"]:
+                report["used"] = observation["used"]
+        else:
+            report["status"] = "skipped"
+        interacted = interacted or action.get("type") in INTERACTION_TYPES
+        reports.append(report)
+    return reports
+
+
+def check_case(driver, test_case, log=print, settle_timeout=readiness.DEFAULT_SETTLE_TIMEOUT):
+    """Checks every step of the case, one page load and one script call per page."""
+    readiness.install(driver, settle_timeout)
+    actions = test_case.get("actions", [])
+    steps = []
+    for index, (page, indices) in enumerate(page_groups(test_case)):
+        log(f"Checking {len(indices)} step(s) on {page}")
+        first = index == 0 and _same_page(page, test_case.get("url", ""))
+        steps.extend(check_page(driver, page, actions, indices, settle_timeout, definite=first))
+    counts = {}
+    for step in steps:
+        counts[step["status"]] = counts.get(step["status"], 0) + 1
+    return {"url": test_case.get("url", ""), "steps": steps, "counts": counts,
+            "missing": [step["step"] for step in steps if step["status"] == "missing"]}
+
+
+class PreflightStore:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.cases = {}
+        try:
+            with open(path, "r") as f:
+                self.cases = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def key(path):
+        return os.path.abspath(path)
+
+    def record(self, path, case_hash, report):
+        self.cases[self.key(path)] = {"hash": case_hash, "missing": report["missing"], "checked_at": time.time()}
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.cases, f, indent=4, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+    def broken_steps(self, path, case_hash):
+        """Step numbers found missing by the last check, if the case has not changed since."""
+        entry = self.cases.get(self.key(path))
+        if not entry or case_hash is None or entry["hash"] != case_hash:
+            return []
+        return entry["missing"]
@@ -0,0 +1,829 @@
+
+import argparse
+import json
+import os
+import queue
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import artifacts
+import compaction
+import datadriven
+import distributed
+import history
+import incremental
+import network_policy
+import pool
+import preflight
+import replay
+import scheduler
+import snapshots
+from cases import suite_name, suite_root
+from catalog import CaseCatalog
+from timing import RunTimer, phase_stats, write_phase_csv
+
+# --- Headless Command Line Runner --- #
+# Usage: python -m quaty run test_cases/ --workers 4 --output summary.json
+
+
+def _quiet(text):
+    pass
+
+
+def _stderr(text):
+    sys.stderr.write(f"{text}\n")
+
+
+def run_case_file(file_path, headless=True, verbose=False, fast=False, snapshot_key=None,
+                  snapshot_ttl=snapshots.DEFAULT_TTL, use_network_policy=True, soft_assert=False,
+                  artifact_dir=None, artifact_budget=artifacts.DEFAULT_BUDGET_MB, artifact_every=0,
+                  broken_steps=None):
+    """Process pool entry point. Must never raise: failures are reported in the result.
+
+    With a `snapshot_key` the case resumes from that cached prefix snapshot when it is
+    still fresh, and replays from scratch otherwise. The case's or suite's network policy
+    is enforced unless `use_network_policy` is False. With an `artifact_dir`, failures
+    (and every `artifact_every` steps) are captured there (see artifacts.py). Steps in
+    `broken_steps` fail fast (see preflight.py).
+    """
+    log = _stderr if verbose else _quiet
+    try:
+        test_case = replay.load_test_case(file_path)
+        policy = network_policy.policy_for(test_case, file_path) if use_network_policy else None
+    except Exception as e:
+        return {"path": file_path, "url": "", "passed": False, "steps": [], "duration": 0.0,
+                "error": f"Error loading test case: {e}"}
+    snapshot = snapshots.SnapshotCache(ttl=snapshot_ttl).get(snapshot_key) if snapshot_key else None
+    run_artifacts = None
+    if artifact_dir:
+        run_artifacts = artifacts.RunArtifacts(artifacts.worker_writer(artifact_dir, artifact_budget),
+                                               artifacts.run_id(file_path), artifact_every)
+    outcome = replay.run_test_case(test_case, headless=headless, log=log, pool=pool.worker_pool(), fast=fast,
+                                   snapshot=snapshot, policy=policy, soft_assert=soft_assert,
+                                   artifacts=run_artifacts, broken_steps=broken_steps)
+    outcome["path"] = file_path
+    outcome["case_hash"] = incremental.case_hash(test_case, file_path)
+    outcome["snapshot_key"] = snapshot_key if snapshot else None
+    return outcome
+
+
+def capture_prefix(key, url, actions, headless=True, verbose=False, fast=False, snapshot_ttl=snapshots.DEFAULT_TTL,
+                   policy=None):
+    """Process pool entry point: replays a shared prefix once and caches its snapshot.
+
+    The prefix runs under `policy`, the network policy of the cases that will restore it.
+    Returns (key, error); error is empty when the snapshot was stored.
+    """
+    log = _stderr if verbose else _quiet
+    outcome = replay.run_test_case({"url": url, "actions": actions}, headless=headless, log=log,
+                                   pool=pool.worker_pool(), fast=fast, capture=True, policy=policy)
+    if not outcome.get("snapshot"):
+        failed = next((step for step in outcome["steps"] if not step["passed"]), None)
+        return key, outcome["error"] or (failed["message"] if failed else "prefix did not complete")
+    for step in outcome["snapshot"]["results"]:
+        step["snapshot"] = True
+    try:
+        snapshots.SnapshotCache(ttl=snapshot_ttl).put(key, outcome["snapshot"])
+    except OSError as e:
+        return key, f"Could not store snapshot: {e}"
+    return key, ""
+
+
+def plan_snapshots(case_paths, ttl, use_network_policy=True):
+    """Returns ({path: prefix key}, {key: group} of prefixes that still need capturing)."""
+    cases = {}
+    policies = {}
+    for path in case_paths:
+        try:
+            cases[path] = replay.load_test_case(path)
+            policies[path] = network_policy.policy_for(cases[path], path) if use_network_policy else None
+        except Exception:
+            cases.pop(path, None)
+            continue  # Reported when the case itself runs
+    groups = snapshots.plan(cases, policies=policies)
+    cache = snapshots.SnapshotCache(ttl=ttl)
+    cache.prune()
+    key_for = {path: key for key, group in groups.items() for path in group["paths"]}
+    missing = {key: group for key, group in groups.items() if cache.get(key) is None}
+    if groups:
+        skipped = sum(len(group["actions"]) * len(group["paths"]) for group in groups.values())
+        _stderr(f"Shared prefixes: {len(groups)} ({len(missing)} to capture), "
+                f"{len(key_for)} case(s) skip {skipped} step(s)")
+    return key_for, missing
+
+
+def artifact_settings(args):
+    """(directory, budget MB, every N steps) for run_case_file; no directory disables capture."""
+    return (None if args.no_artifacts else args.artifact_dir), args.artifact_budget, args.artifact_every
+
+
+def add_artifact_arguments(parser):
+    parser.add_argument("--artifact-dir", default=artifacts.DEFAULT_ARTIFACT_DIR,
+                        help="Where failure screenshots, page sources and console logs go")
+    parser.add_argument("--artifact-budget", type=float, default=artifacts.DEFAULT_BUDGET_MB,
+                        help="MB the artifact directory may use before the oldest runs are evicted")
+    parser.add_argument("--artifact-every", type=int, default=0, metavar="N",
+                        help="Also capture artifacts every N steps of passing runs")
+    parser.add_argument("--no-artifacts", action="store_true", help="Do not capture failure artifacts")
+
+
+def summarize_case(outcome):
+    failed = next((step for step in outcome["steps"] if not step["passed"]), None)
+    return {
+        "path": outcome["path"],
+        "url": outcome["url"],
+        "passed": outcome["passed"],
+        "duration": round(outcome["duration"], 3),
+        "steps": len(outcome["steps"]),
+        "failed_step": failed["step"] if failed else None,
+        "failed_selector": failed["selector"] if failed else None,
+        "error": failed["message"] if failed else outcome["error"],
+        "soft_failures": [step["step"] for step in outcome["steps"] if step.get("soft")],
+        "artifacts": outcome.get("artifacts"),
+    }
+
+
+def write_summary(summary, output):
+    text = json.dumps(summary, indent=4)
+    if output == "-":
+        sys.stdout.write(text + "\n")
+    else:
+        with open(output, 'w') as f:
+            f.write(text)
+        _stderr(f"Summary written to {output}")
+
+
+def export_timing(outcomes, trace_dir):
+    """Writes one Chrome trace per case plus a phase CSV aggregated over the whole suite."""
+    os.makedirs(trace_dir, exist_ok=True)
+    all_spans = []
+    # Traces mirror the suite's directory layout, so same-named cases in different
+    # directories do not overwrite each other.
+    root = suite_root([outcome["path"] for outcome in outcomes])
+    for outcome in outcomes:
+        timer = RunTimer.from_dict(outcome.get("timing", {}))
+        all_spans.extend(timer.spans)
+        trace_path = os.path.join(trace_dir, *suite_name(outcome["path"], root).split("/")) + ".trace.json"
+        os.makedirs(os.path.dirname(trace_path), exist_ok=True)
+        timer.export_chrome_trace(trace_path)
+    write_phase_csv(phase_stats(all_spans), os.path.join(trace_dir, "timing.csv"))
+    _stderr(f"Timing traces written to {trace_dir}")
+
+
+def cmd_run(args):
+    case_paths = replay.collect_test_cases(args.paths)
+    if not case_paths:
+        _stderr("No test cases found.")
+        return 2
+    durations = scheduler.DurationStore(args.durations)
+    changes = incremental.ChangeTracker(args.changes)
+    checks = preflight.PreflightStore(args.preflight) if args.fail_fast else None
+    root = suite_root(case_paths)
+    shared_durations = scheduler.DurationStore(args.shard_durations, root) if args.shard_durations else None
+    pages = {}
+    # Shard the full collected suite first: local state must not change what a machine gets.
+    if args.shard:
+        try:
+            index, count = scheduler.parse_shard(args.shard)
+        except ValueError as e:
+            _stderr(str(e))
+            return 2
+        case_paths = scheduler.shard(case_paths, index, count, root, shared_durations)
+        _stderr(f"Shard {args.shard}: {len(case_paths)} case(s)")
+        if not case_paths:
+            return 0
+    if args.changed:
+        total = len(case_paths)
+        case_paths, pages = incremental.changed_cases(case_paths, changes, args.fingerprint)
+        if not case_paths:
+            _stderr("No case changed since its last passing run.")
+            return 0
+        _stderr(f"Running {len(case_paths)} changed case(s), skipping {total - len(case_paths)} unchanged")
+    if args.failed_only:
+        case_paths = [path for path in case_paths if durations.needs_rerun(path)]
+        if not case_paths:
+            _stderr("No case failed or flaked in the previous run.")
+            return 0
+        _stderr(f"Re-running {len(case_paths)} case(s) that failed or flaked in the previous run")
+    # Longest first, so no worker is left running a long case alone at the end.
+    case_paths = scheduler.longest_first(case_paths, durations)
+
+    workers = max(1, min(args.workers, len(case_paths)))
+    _stderr(f"--- Running {len(case_paths)} test case(s) on {workers} worker(s) ---")
+    started = time.perf_counter()
+    cases = []
+    outcomes = []
+    network_stats = []
+
+    key_for, missing = ({}, {}) if args.no_snapshots else plan_snapshots(
+        case_paths, args.snapshot_ttl, not args.no_network_policy)
+    run_history = history.RunHistory(args.history_db)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=pool.init_worker,
+                             initargs=(not args.headed, args.max_uses)) as executor:
+        def submit(path, snapshot_key=None):
+            return executor.submit(run_case_file, path, not args.headed, args.verbose, args.fast, snapshot_key,
+                                   args.snapshot_ttl, not args.no_network_policy, args.soft_assert,
+                                   *artifact_settings(args),
+                                   checks.broken_steps(path, incremental.current_hash(path)) if checks else None)
+
+        # Cases whose prefix snapshot is not cached yet wait for its capture; the rest start now.
+        captures = [executor.submit(capture_prefix, key, group["url"], group["actions"], not args.headed,
+                                    args.verbose, args.fast, args.snapshot_ttl, group["policy"])
+                    for key, group in missing.items()]
+        futures = [submit(path, key_for.get(path)) for path in case_paths
+                   if key_for.get(path) not in missing]
+        for capture in as_completed(captures):
+            key, error = capture.result()
+            if error:
+                _stderr(f"Prefix snapshot {key[:8]} not captured, its cases replay in full: {error}")
+            futures.extend(submit(path, None if error else key) for path in missing[key]["paths"])
+
+        for future in as_completed(futures):
+            outcome = future.result()
+            if args.trace_dir:
+                outcomes.append(outcome)
+            run_history.record_run(outcome["path"], outcome.get("case_hash", ""), outcome, source="cli")
+            changes.record(outcome["path"], outcome.get("case_hash"), outcome["passed"], pages.get(outcome["url"]))
+            network_stats.append(outcome.get("network"))
+            case = summarize_case(outcome)
+            cases.append(case)
+            status = "PASS" if case["passed"] else "FAIL"
+            _stderr(f"[{status}] {case['path']} ({case['duration']:.1f}s)")
+            if not case["passed"] and case["error"]:
+                _stderr(f"  {case['error']}")
+
+    cases.sort(key=lambda case: case["path"])
+    if args.trace_dir:
+        export_timing(outcomes, args.trace_dir)
+    catalog = CaseCatalog(args.catalog_root)
+    for case in cases:
+        catalog.record_result(case["path"], case["passed"])
+        durations.record(case["path"], case["duration"], case["passed"])
+        # A sharded run only sees its own cases, so only unsharded runs update the shared file.
+        if shared_durations and not args.shard:
+            shared_durations.record(case["path"], case["duration"], case["passed"])
+    catalog.close()
+    durations.save()
+    if shared_durations and not args.shard:
+        shared_durations.save()
+    changes.save()
+    run_history.close()
+
+    passed = sum(1 for case in cases if case["passed"])
+    summary = {
+        "total": len(cases),
+        "passed": passed,
+        "failed": len(cases) - passed,
+        "workers": workers,
+        "shard": args.shard,
+        "duration": round(time.perf_counter() - started, 3),
+        "cases": cases,
+    }
+    if any(network_stats):
+        summary["network"] = network_policy.merge_stats(network_stats)
+        _stderr(network_policy.format_stats(summary["network"]))
+    _stderr(f"--- {passed}/{len(cases)} passed in {summary['duration']:.1f}s ---")
+    write_summary(summary, args.output)
+    return 0 if passed == len(cases) else 1
+
+
+def check_case_file(file_path, headless=True, verbose=False):
+    """Process pool entry point for `check`. Must never raise: failures are reported in the result."""
+    log = _stderr if verbose else _quiet
+    try:
+        test_case = replay.load_test_case(file_path)
+    except Exception as e:
+        return {"path": file_path, "error": f"Error loading test case: {e}", "steps": [], "counts": {}, "missing": []}
+    session_pool = pool.worker_pool()
+    try:
+        driver = session_pool.acquire(headless) if session_pool else replay.start_driver(headless)
+    except Exception as e:
+        return {"path": file_path, "error": f"Could not start a browser: {e}", "steps": [], "counts": {},
+                "missing": []}
+    broken = False
+    try:
+        report = preflight.check_case(driver, test_case, log=log)
+        report["error"] = ""
+    except Exception as e:
+        broken = True
+        report = {"error": f"Error during the check: {e}", "steps": [], "counts": {}, "missing": []}
+    finally:
+        if session_pool:
+            session_pool.release(driver, headless, broken=broken)
+        else:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+    report["path"] = file_path
+    report["case_hash"] = incremental.case_hash(test_case, file_path)
+    return report
+
+
+def cmd_check(args):
+    case_paths = replay.collect_test_cases(args.paths)
+    if not case_paths:
+        _stderr("No test cases found.")
+        return 2
+    workers = max(1, min(args.workers, len(case_paths)))
+    _stderr(f"--- Checking selectors of {len(case_paths)} test case(s) on {workers} worker(s) ---")
+    started = time.perf_counter()
+    checks = preflight.PreflightStore(args.preflight)
+    reports = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=pool.init_worker,
+                             initargs=(not args.headed, args.max_uses)) as executor:
+        futures = [executor.submit(check_case_file, path, not args.headed, args.verbose) for path in case_paths]
+        for future in as_completed(futures):
+            report = future.result()
+            reports.append(report)
+            if report["error"]:
+                _stderr(f"[ERROR] {report['path']}: {report['error']}")
+                continue
+            checks.record(report["path"], report["case_hash"], report)
+            problems = [step for step in report["steps"] if step["status"] not in ("ok", "skipped")]
+            _stderr(f"[{'BROKEN' if report['missing'] else 'OK'}] {report['path']}")
+            for step in problems:
+                detail = f" ({step['count']} matches)" if step["status"] == "ambiguous" else ""
+                detail += f", matched fallback '{step['used']}'" if step.get("used") else ""
+                _stderr(f"  step {step['step']} {step['type']} '{step['selector']}': {step['status']}{detail}")
+    checks.save()
+
+    reports.sort(key=lambda report: report["path"])
+    broken = sum(1 for report in reports if report["missing"] or report["error"])
+    summary = {
+        "total": len(reports),
+        "broken": broken,
+        "duration": round(time.perf_counter() - started, 3),
+        "cases": reports,
+    }
+    _stderr(f"--- {len(reports) - broken}/{len(reports)} case(s) without missing selectors "
+            f"in {summary['duration']:.1f}s ---")
+    write_summary(summary, args.output)
+    return 0 if not broken else 1
+
+
+def cmd_watch(args):
+    """Re-runs cases in the background as soon as they are saved, until interrupted."""
+    changes = incremental.ChangeTracker(args.changes)
+    durations = scheduler.DurationStore(args.durations)
+    run_history = history.RunHistory(args.history_db)
+    catalog = CaseCatalog(args.catalog_root)
+    watcher = incremental.CaseWatcher(args.paths, replay.collect_test_cases)
+    waiting, pages = incremental.changed_cases(sorted(watcher.seen), changes, args.fingerprint)
+    _stderr(f"--- Watching {len(watcher.seen)} case(s), {len(waiting)} changed since their last passing run "
+            f"(Ctrl+C to stop) ---")
+    running = {}
+
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=pool.init_worker,
+                             initargs=(not args.headed, args.max_uses)) as executor:
+        try:
+            while True:
+                saved = watcher.poll()
+                if saved:
+                    fresh, fresh_pages = incremental.changed_cases(saved, changes, args.fingerprint)
+                    pages.update(fresh_pages)
+                    for path in saved:
+                        if path not in fresh:
+                            _stderr(f"[SAME] {path} is unchanged since its last pass")
+                    waiting.extend(path for path in fresh if path not in waiting)
+
+                # A case saved again while it runs waits for that run to finish.
+                for path in [path for path in waiting if path not in running.values()]:
+                    waiting.remove(path)
+                    _stderr(f"[RUN ] {path}")
+                    running[executor.submit(run_case_file, path, not args.headed, args.verbose, args.fast, None,
+                                            snapshots.DEFAULT_TTL, not args.no_network_policy, args.soft_assert,
+                                            *artifact_settings(args))] = path
+
+                for future in [future for future in running if future.done()]:
+                    del running[future]
+                    outcome = future.result()
+                    case = summarize_case(outcome)
+                    _stderr(f"[{'PASS' if case['passed'] else 'FAIL'}] {case['path']} ({case['duration']:.1f}s)")
+                    if not case["passed"] and case["error"]:
+                        _stderr(f"  {case['error']}")
+                    run_history.record_run(outcome["path"], outcome.get("case_hash", ""), outcome, source="watch")
+                    changes.record(outcome["path"], outcome.get("case_hash"), outcome["passed"],
+                                   pages.get(outcome["url"]))
+                    catalog.record_result(case["path"], case["passed"])
+                    durations.record(case["path"], case["duration"], case["passed"])
+                    changes.save()
+                    durations.save()
+                time.sleep(args.interval)
+        except KeyboardInterrupt:
+            _stderr("Stopped watching.")
+        finally:
+            catalog.close()
+            changes.save()
+            durations.save()
+            run_history.close()
+    return 0
+
+
+def cmd_serve(args):
+    """Coordinates a suite run across worker agents (see distributed.py) and reports like `run`."""
+    case_paths = replay.collect_test_cases(args.paths)
+    if not case_paths:
+        _stderr("No test cases found.")
+        return 2
+    durations = scheduler.DurationStore(args.durations)
+    cases = []
+    jobs = []
+    for path in scheduler.longest_first(case_paths, durations):
+        try:
+            test_case = replay.load_test_case(path)
+            policy = None if args.no_network_policy else network_policy.policy_for(test_case, path)
+        except Exception as e:
+            cases.append(summarize_case({"path": path, "url": "", "passed": False, "steps": [], "duration": 0.0,
+                                         "error": f"Error loading test case: {e}"}))
+            continue
+        jobs.append({"path": path, "case": test_case, "policy": policy})
+    case_hashes = {job["path"]: incremental.case_hash(job["case"], job["path"]) for job in jobs}
+
+    def on_event(path, worker, event):
+        result = event["result"]
+        if args.verbose or event["kind"] == "failed":
+            detail = f": {result['message']}" if result.get("message") else ""
+            _stderr(f"  [{worker}] {path} step {result['step']} {event['kind']}{detail}")
+
+    coordinator = distributed.Coordinator(jobs, options={"fast": args.fast, "soft_assert": args.soft_assert},
+                                          lease_timeout=args.lease_timeout, on_event=on_event, log=_stderr)
+    try:
+        server = distributed.serve(coordinator, args.host, args.port)
+    except OSError as e:
+        _stderr(f"Could not listen on {args.host}:{args.port}: {e}")
+        return 2
+    host = "127.0.0.1" if args.host in ("", "0.0.0.0") else args.host
+    url = f"http://{host}:{server.server_address[1]}"
+    _stderr(f"--- Coordinating {len(jobs)} test case(s) at {url} ---")
+    _stderr(f"Add workers with: python quaty.py worker {url}")
+
+    worker_command = [sys.executable, os.path.abspath(__file__), "worker", url, "--max-uses", str(args.max_uses)]
+    worker_command += ["--headed"] if args.headed else []
+    worker_command += ["--verbose"] if args.verbose else []
+    local_workers = [subprocess.Popen(worker_command) for _ in range(args.local_workers)]
+
+    started = time.perf_counter()
+    run_history = history.RunHistory(args.history_db)
+    changes = incremental.ChangeTracker(args.changes)
+    received = 0
+    try:
+        while received < len(jobs):
+            try:
+                outcome = coordinator.outcomes.get(timeout=1.0)
+            except queue.Empty:
+                # Lost leases are also noticed here when no worker is left to ask for work.
+                coordinator.reap()
+                continue
+            received += 1
+            outcome["case_hash"] = case_hashes[outcome["path"]]
+            run_history.record_run(outcome["path"], outcome["case_hash"], outcome, source="distributed")
+            changes.record(outcome["path"], outcome["case_hash"], outcome["passed"])
+            case = summarize_case(outcome)
+            case["worker"] = outcome.get("worker")
+            cases.append(case)
+            _stderr(f"[{'PASS' if case['passed'] else 'FAIL'}] {case['path']} on {case['worker']} "
+                    f"({case['duration']:.1f}s)")
+            if not case["passed"] and case["error"]:
+                _stderr(f"  {case['error']}")
+    except KeyboardInterrupt:
+        _stderr(f"Interrupted, {len(jobs) - received} case(s) not reported.")
+    finally:
+        # Idle workers leave once a lease request tells them the suite is done.
+        for process in local_workers:
+            try:
+                process.wait(timeout=distributed.IDLE_POLL * 5)
+            except subprocess.TimeoutExpired:
+                process.terminate()
+        server.shutdown()
+        run_history.close()
+        changes.save()
+
+    cases.sort(key=lambda case: case["path"])
+    catalog = CaseCatalog(args.catalog_root)
+    for case in cases:
+        catalog.record_result(case["path"], case["passed"])
+        durations.record(case["path"], case["duration"], case["passed"])
+    catalog.close()
+    durations.save()
+
+    passed = sum(1 for case in cases if case["passed"])
+    summary = {
+        "total": len(cases),
+        "passed": passed,
+        "failed": len(cases) - passed,
+        "workers": sorted(coordinator.workers),
+        "duration": round(time.perf_counter() - started, 3),
+        "cases": cases,
+    }
+    _stderr(f"--- {passed}/{len(cases)} passed on {len(coordinator.workers)} worker(s) "
+            f"in {summary['duration']:.1f}s ---")
+    write_summary(summary, args.output)
+    return 0 if passed == len(cases) else 1
+
+
+def cmd_worker(args):
+    """Runs cases leased from a coordinator until its suite is done."""
+    session_pool = pool.SessionPool(size=1, max_uses=args.max_uses)
+    log = _stderr if args.verbose else _quiet
+    artifact_dir, artifact_budget, artifact_every = artifact_settings(args)
+    writer = artifacts.ArtifactWriter(artifact_dir, artifact_budget) if artifact_dir else None
+
+    def run_case(lease, on_event, stop_event):
+        options = lease["options"]
+        run_artifacts = None
+        if writer:
+            run_artifacts = artifacts.RunArtifacts(writer, artifacts.run_id(lease["path"]), artifact_every)
+        return replay.run_test_case(lease["case"], headless=not args.headed, log=log, pool=session_pool,
+                                    fast=options.get("fast", False), policy=lease["policy"],
+                                    soft_assert=options.get("soft_assert", False), artifacts=run_artifacts,
+                                    on_event=on_event, stop_event=stop_event)
+
+    try:
+        distributed.run_worker(args.coordinator, run_case, log=_stderr)
+    except KeyboardInterrupt:
+        _stderr("Worker stopped.")
+    finally:
+        session_pool.close()
+        if writer:
+            writer.close()
+    return 0
+
+
+def cmd_data(args):
+    try:
+        test_case = replay.load_test_case(args.case)
+        policy = None if args.no_network_policy else network_policy.policy_for(test_case, args.case)
+    except Exception as e:
+        _stderr(f"Error loading test case: {e}")
+        return 2
+    try:
+        datadriven.check_csv(args.csv)
+    except (OSError, ValueError) as e:
+        _stderr(f"Error reading data file: {e}")
+        return 2
+
+    _stderr(f"--- Running {args.case} for every row of {args.csv} on {args.workers} worker(s) ---")
+    started = time.perf_counter()
+    total = passed = 0
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    run_history = history.RunHistory(args.history_db)
+    try:
+        outcomes = datadriven.execute(test_case, args.csv, max(1, args.workers), headless=not args.headed,
+                                      max_uses=args.max_uses, verbose=args.verbose, fast=args.fast, policy=policy,
+                                      soft_assert=args.soft_assert, artifact_settings=artifact_settings(args))
+        for outcome in outcomes:
+            outcome["path"] = args.case
+            run_history.record_run(args.case, outcome.get("case_hash", ""), outcome, source="data")
+            record = summarize_case(outcome)
+            record["row"] = outcome["row"]
+            record["data"] = outcome["data"]
+            # One JSON line per row, flushed as it completes.
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            total += 1
+            passed += 1 if record["passed"] else 0
+            if not record["passed"]:
+                _stderr(f"[FAIL] row {record['row']}: {record['error']}")
+    finally:
+        run_history.close()
+        if output is not sys.stdout:
+            output.close()
+
+    _stderr(f"--- {passed}/{total} rows passed in {time.perf_counter() - started:.1f}s ---")
+    return 0 if total and passed == total else 1
+
+
+def cmd_compact(args):
+    """Shows the compaction diff for each case; --apply rewrites the files (after --verify, if given)."""
+    changed = 0
+    for path in replay.collect_test_cases(args.paths):
+        try:
+            test_case = replay.load_test_case(path)
+        except Exception as e:
+            _stderr(f"Error loading {path}: {e}")
+            continue
+        actions = test_case.get("actions", [])
+        compacted, changes = compaction.compact(actions)
+        for line in compaction.suspect_lines(compaction.suspects(actions)):
+            _stderr(f"{path}: {line}")
+        if not changes:
+            continue
+        changed += 1
+        sys.stdout.write("\n".join(compaction.diff_lines(actions, compacted, path)) + "\n")
+        _stderr(f"{path}: {len(actions)} -> {len(compacted)} step(s) ({compaction.summarize(changes)})")
+        if not args.apply:
+            continue
+
+        if args.verify:
+            outcome = replay.run_test_case(dict(test_case, actions=compacted), headless=not args.headed,
+                                           log=_stderr if args.verbose else _quiet)
+            if not outcome["passed"]:
+                failed = next((step for step in outcome["steps"] if not step["passed"]), None)
+                _stderr(f"  Not applied: compacted case fails ({failed['message'] if failed else outcome['error']})")
+                continue
+            _stderr("  Verified: compacted case passes")
+        test_case["actions"] = compacted
+        with open(path, "w") as f:
+            json.dump(test_case, f, indent=4)
+        _stderr("  Applied")
+
+    if not changed:
+        _stderr("Nothing to compact.")
+    elif not args.apply:
+        _stderr(f"{changed} case(s) can be compacted; run again with --apply to rewrite them.")
+    return 0
+
+
+def _format_time(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))
+
+
+def cmd_history(args):
+    run_history = history.RunHistory(args.history_db)
+    try:
+        report = {}
+        if args.case:
+            report["last_results"] = run_history.last_results(args.case, args.limit)
+        if args.flaky or not (args.case or args.slowest):
+            report["flakiest"] = run_history.flakiest(args.days, args.limit)
+        if args.slowest or not (args.case or args.flaky):
+            report["slowest_steps"] = run_history.slowest_steps(args.days, args.limit)
+    finally:
+        run_history.close()
+
+    if args.json:
+        sys.stdout.write(json.dumps(report, indent=4) + "\n")
+        return 0
+    if "last_results" in report:
+        print(f"--- Last {args.limit} results for {args.case} ---")
+        for run in report["last_results"]:
+            status = "PASS" if run["passed"] else "FAIL"
+            detail = "" if run["passed"] else f"  step {run['failed_step']} '{run['failed_selector']}': " \
+                                              f"{run['failed_message'] or run['error']}"
+            print(f"  {_format_time(run['started_at'])}  {status}  {run['duration']:6.1f}s  "
+                  f"[{run['environment']}/{run['source']}] {run['case_hash'][:8]}{detail}")
+    if "flakiest" in report:
+        print(f"--- Flakiest cases (last {args.days} days) ---")
+        for case in report["flakiest"]:
+            print(f"  {case['passes']}/{case['runs']} passed  {case['case_path']}")
+    if "slowest_steps" in report:
+        print(f"--- Slowest steps (last {args.days} days) ---")
+        for step in report["slowest_steps"]:
+            print(f"  mean {step['mean']:6.2f}s  max {step['max']:6.2f}s  x{step['runs']:<5} "
+                  f"{step['case_path']} step {step['step']} '{step['selector']}'")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="quaty", description="QUATY headless test runner")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Replay test cases in parallel headless browsers")
+    run_parser.add_argument("paths", nargs="+", help="Test case files or directories")
+    run_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of parallel browsers")
+    run_parser.add_argument("--output", default="-", help="Where to write the JSON summary ('-' for stdout)")
+    run_parser.add_argument("--headed", action="store_true", help="Show the browser windows")
+    run_parser.add_argument("--max-uses", type=int, default=25, help="Cases a browser serves before it is recycled")
+    run_parser.add_argument("--trace-dir", help="Write per-case Chrome traces and an aggregate timing CSV here")
+    run_parser.add_argument("--catalog-root", default="test_cases", help="Case catalog to record last results in")
+    run_parser.add_argument("--verbose", action="store_true", help="Print every step to stderr")
+    run_parser.add_argument("--fast", action="store_true", help="Pipeline consecutive steps in one browser round-trip")
+    run_parser.add_argument("--soft-assert", action="store_true",
+                            help="Keep going after a failed assertion (the case still fails)")
+    run_parser.add_argument("--shard", help="Run only shard i of N of the suite, e.g. 2/4 (split by path, or by "
+                                            "--shard-durations)")
+    run_parser.add_argument("--shard-durations", metavar="FILE",
+                            help="Shared durations file (keyed by path within the suite) to balance shards by; "
+                                 "unsharded runs update it, sharded runs only read it")
+    run_parser.add_argument("--changed", action="store_true",
+                            help="Skip cases unchanged since their last passing run")
+    run_parser.add_argument("--fingerprint", action="store_true",
+                            help="With --changed, also re-run cases whose target page changed")
+    run_parser.add_argument("--changes", default=incremental.DEFAULT_PATH, help="Per-case content hash file")
+    run_parser.add_argument("--fail-fast", action="store_true",
+                            help="Give steps the last `check` found missing a short timeout")
+    run_parser.add_argument("--preflight", default=preflight.DEFAULT_PATH, help="Selector check results file")
+    run_parser.add_argument("--failed-only", action="store_true",
+                            help="Run only cases that failed or flaked in the previous run")
+    run_parser.add_argument("--durations", default=scheduler.DEFAULT_PATH, help="Per-case duration history file")
+    run_parser.add_argument("--no-network-policy", action="store_true",
+                            help="Ignore network policies and let pages load everything")
+    run_parser.add_argument("--no-snapshots", action="store_true", help="Replay shared step prefixes in every case")
+    run_parser.add_argument("--snapshot-ttl", type=int, default=snapshots.DEFAULT_TTL,
+                            help="Seconds a shared-prefix snapshot may be reused")
+    run_parser.add_argument("--history-db", default=history.DEFAULT_DB_PATH, help="Run history database")
+    add_artifact_arguments(run_parser)
+    run_parser.set_defaults(func=cmd_run)
+
+    data_parser = subparsers.add_parser("data", help="Replay one test case per row of a CSV file")
+    data_parser.add_argument("case", help="Test case with ${column} placeholders")
+    data_parser.add_argument("csv", help="CSV file whose header names the columns")
+    data_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of parallel browsers")
+    data_parser.add_argument("--output", default="-", help="Where to write per-row JSON lines ('-' for stdout)")
+    data_parser.add_argument("--headed", action="store_true", help="Show the browser windows")
+    data_parser.add_argument("--max-uses", type=int, default=25, help="Rows a browser serves before it is recycled")
+    data_parser.add_argument("--verbose", action="store_true", help="Print every step to stderr")
+    data_parser.add_argument("--no-network-policy", action="store_true",
+                             help="Ignore network policies and let pages load everything")
+    data_parser.add_argument("--fast", action="store_true", help="Pipeline consecutive steps in one browser round-trip")
+    data_parser.add_argument("--soft-assert", action="store_true",
+                             help="Keep going after a failed assertion (the row still fails)")
+    data_parser.add_argument("--history-db", default=history.DEFAULT_DB_PATH, help="Run history database")
+    add_artifact_arguments(data_parser)
+    data_parser.set_defaults(func=cmd_data)
+
+    check_parser = subparsers.add_parser("check", help="Check every step's selector without replaying")
+    check_parser.add_argument("paths", nargs="+", help="Test case files or directories")
+    check_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of parallel browsers")
+    check_parser.add_argument("--output", default="-", help="Where to write the JSON report ('-' for stdout)")
+    check_parser.add_argument("--headed", action="store_true", help="Show the browser windows")
+    check_parser.add_argument("--max-uses", type=int, default=25, help="Cases a browser serves before it is recycled")
+    check_parser.add_argument("--verbose", action="store_true", help="Print every checked page to stderr")
+    check_parser.add_argument("--preflight", default=preflight.DEFAULT_PATH, help="Selector check results file")
+    check_parser.set_defaults(func=cmd_check)
+
+    watch_parser = subparsers.add_parser("watch", help="Re-run test cases as soon as they are saved")
+    watch_parser.add_argument("paths", nargs="*", default=["test_cases"], help="Test case files or directories")
+    watch_parser.add_argument("--workers", type=int, default=2, help="Number of parallel browsers")
+    watch_parser.add_argument("--interval", type=float, default=1.0, help="Seconds between checks for saved cases")
+    watch_parser.add_argument("--headed", action="store_true", help="Show the browser windows")
+    watch_parser.add_argument("--max-uses", type=int, default=25, help="Cases a browser serves before it is recycled")
+    watch_parser.add_argument("--verbose", action="store_true", help="Print every step to stderr")
+    watch_parser.add_argument("--fast", action="store_true", help="Pipeline consecutive steps in one browser round-trip")
+    watch_parser.add_argument("--soft-assert", action="store_true",
+                              help="Keep going after a failed assertion (the case still fails)")
+    watch_parser.add_argument("--fingerprint", action="store_true",
+                              help="Also re-run cases whose target page changed")
+    watch_parser.add_argument("--no-network-policy", action="store_true",
+                              help="Ignore network policies and let pages load everything")
+    watch_parser.add_argument("--changes", default=incremental.DEFAULT_PATH, help="Per-case content hash file")
+    watch_parser.add_argument("--durations", default=scheduler.DEFAULT_PATH, help="Per-case duration history file")
+    watch_parser.add_argument("--catalog-root", default="test_cases", help="Case catalog to record last results in")
+    watch_parser.add_argument("--history-db", default=history.DEFAULT_DB_PATH, help="Run history database")
+    add_artifact_arguments(watch_parser)
+    watch_parser.set_defaults(func=cmd_watch)
+
+    serve_parser = subparsers.add_parser("serve", help="Coordinate a suite run across worker agents")
+    serve_parser.add_argument("paths", nargs="+", help="Test case files or directories")
+    serve_parser.add_argument("--host", default="127.0.0.1",
+                              help="Address to listen on (0.0.0.0 to accept workers from other machines)")
+    serve_parser.add_argument("--port", type=int, default=distributed.DEFAULT_PORT, help="Port to listen on (0: any)")
+    serve_parser.add_argument("--local-workers", type=int, default=0,
+                              help="Also start this many worker processes on this machine")
+    serve_parser.add_argument("--lease-timeout", type=float, default=distributed.LEASE_TIMEOUT,
+                              help="Seconds without a heartbeat before a worker's case is re-queued")
+    serve_parser.add_argument("--output", default="-", help="Where to write the JSON summary ('-' for stdout)")
+    serve_parser.add_argument("--headed", action="store_true", help="Show the local workers' browser windows")
+    serve_parser.add_argument("--max-uses", type=int, default=25, help="Cases a local worker's browser serves")
+    serve_parser.add_argument("--verbose", action="store_true", help="Print every streamed step to stderr")
+    serve_parser.add_argument("--fast", action="store_true", help="Pipeline consecutive steps in one browser round-trip")
+    serve_parser.add_argument("--soft-assert", action="store_true",
+                              help="Keep going after a failed assertion (the case still fails)")
+    serve_parser.add_argument("--no-network-policy", action="store_true",
+                              help="Ignore network policies and let pages load everything")
+    serve_parser.add_argument("--catalog-root", default="test_cases", help="Case catalog to record last results in")
+    serve_parser.add_argument("--durations", default=scheduler.DEFAULT_PATH, help="Per-case duration history file")
+    serve_parser.add_argument("--changes", default=incremental.DEFAULT_PATH, help="Per-case content hash file")
+    serve_parser.add_argument("--history-db", default=history.DEFAULT_DB_PATH, help="Run history database")
+    serve_parser.set_defaults(func=cmd_serve)
+
+    worker_parser = subparsers.add_parser("worker", help="Run cases leased from a `quaty serve` coordinator")
+    worker_parser.add_argument("coordinator", help="Coordinator URL, e.g. http://10.0.0.5:8765")
+    worker_parser.add_argument("--headed", action="store_true", help="Show the browser window")
+    worker_parser.add_argument("--max-uses", type=int, default=25, help="Cases the browser serves before it is recycled")
+    worker_parser.add_argument("--verbose", action="store_true", help="Print every step to stderr")
+    add_artifact_arguments(worker_parser)
+    worker_parser.set_defaults(func=cmd_worker)
+
+    compact_parser = subparsers.add_parser("compact", help="Drop redundant recorded steps (shows a diff first)")
+    compact_parser.add_argument("paths", nargs="+", help="Test case files or directories")
+    compact_parser.add_argument("--apply", action="store_true", help="Rewrite the cases instead of only showing the diff")
+    compact_parser.add_argument("--verify", action="store_true", help="With --apply, only keep compactions that still pass")
+    compact_parser.add_argument("--headed", action="store_true", help="Show the browser while verifying")
+    compact_parser.add_argument("--verbose", action="store_true", help="Print every verified step to stderr")
+    compact_parser.set_defaults(func=cmd_compact)
+
+    history_parser = subparsers.add_parser("history", help="Query stored run and step results")
+    history_parser.add_argument("--case", help="Show the last results for this test case file")
+    history_parser.add_argument("--flaky", action="store_true", help="Show the flakiest cases")
+    history_parser.add_argument("--slowest", action="store_true", help="Show the slowest steps")
+    history_parser.add_argument("--days", type=int, default=14, help="Window for flaky/slowest queries")
+    history_parser.add_argument("--limit", type=int, default=20, help="Rows per section")
+    history_parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    history_parser.add_argument("--history-db", default=history.DEFAULT_DB_PATH, help="Run history database")
+    history_parser.set_defaults(func=cmd_history)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
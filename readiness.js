@@ -0,0 +1,60 @@
+
+// This script is installed into every document during replay to observe page readiness.
+// It counts in-flight fetch/XHR requests and timestamps the last DOM mutation, so
+// `readiness.py` can wait exactly until the page is quiet instead of sleeping a fixed time.
+// Installing it twice in the same document is a no-op.
+
+(function () {
+    if (window.__quatyReadiness) {
+        return;
+    }
+    const state = { pending: 0, lastMutation: performance.now() };
+    window.__quatyReadiness = state;
+
+    // Track fetch() calls until they settle, successfully or not.
+    const originalFetch = window.fetch;
+    if (originalFetch) {
+        window.fetch = function () {
+            state.pending++;
+            try {
+                return originalFetch.apply(this, arguments).finally(() => { state.pending--; });
+            } catch (e) {
+                state.pending--;
+                throw e;
+            }
+        };
+    }
+
+    // Track XMLHttpRequests until 'loadend' (fired after load, error, abort and timeout).
+    const originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        state.pending++;
+        this.addEventListener('loadend', () => { state.pending--; }, { once: true });
+        try {
+            return originalSend.apply(this, arguments);
+        } catch (e) {
+            state.pending--;
+            throw e;
+        }
+    };
+
+    // Elements being added or removed restart the quiet window. Attribute and text changes
+    // do not: a clock, carousel or spinner would otherwise keep the page from ever settling.
+    const isElement = (node) => node.nodeType === Node.ELEMENT_NODE;
+    const structural = (records) => records.some(
+        (record) => Array.prototype.some.call(record.addedNodes, isElement)
+            || Array.prototype.some.call(record.removedNodes, isElement)
+    );
+    const observe = () => {
+        new MutationObserver((records) => {
+            if (structural(records)) {
+                state.lastMutation = performance.now();
+            }
+        }).observe(document.documentElement, { childList: true, subtree: true });
+    };
+    if (document.documentElement) {
+        observe();
+    } else {
+        document.addEventListener('DOMContentLoaded', observe);
+    }
+})();
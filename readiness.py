@@ -0,0 +1,105 @@
+
+import os
+import time
+from selenium.common.exceptions import JavascriptException
+
+import log_pipeline
+
+# --- Adaptive Page Readiness --- #
+# Replaces the fixed one-second sleep after each replayed step. The page is considered
+# settled when document.readyState is 'complete', no fetch/XHR is in flight and no elements
+# have been added or removed for a short quiet window. All of this is observed in-page by
+# readiness.js. Attribute and text churn (clocks, carousels, spinners, tickers) does not
+# count, and the wait is capped near the old delay so a page that never goes quiet (polling,
+# long-lived requests) costs a few seconds per step at most.
+
+DEFAULT_SETTLE_TIMEOUT = 3
+DEFAULT_QUIET_MS = 100
+FIXED_DELAY = 1.0  # The delay this engine replaces, used for reporting the gain
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "readiness.js")
+
+# Polls the probe in-page and reports back once; a single WebDriver round-trip per wait.
+WAIT_SCRIPT = """
+const timeoutMs = arguments[0];
+const quietMs = arguments[1];
+const callback = arguments[arguments.length - 1];
+const started = performance.now();
+(function poll() {
+    const state = window.__quatyReadiness;
+    const now = performance.now();
+    const quiet = !state || (state.pending <= 0 && now - state.lastMutation >= quietMs);
+    const ready = document.readyState === 'complete' && quiet;
+    if (ready || now - started >= timeoutMs) {
+        callback({ ready: ready, waited: now - started, pending: state ? state.pending : 0 });
+        return;
+    }
+    setTimeout(poll, 25);
+})();
+"""
+
+_probe_script = None
+
+
+def probe_script():
+    global _probe_script
+    if _probe_script is None:
+        with open(SCRIPT_PATH, "r") as f:
+            _probe_script = f.read()
+    return _probe_script
+
+
+def install(driver, timeout=DEFAULT_SETTLE_TIMEOUT):
+    """Registers the probe for every new document of the current tab (once per tab).
+
+    The registration belongs to the tab, and a pooled browser gets a fresh tab per lease."""
+    driver.set_script_timeout(timeout + 5)
+    try:
+        tab = driver.current_window_handle
+    except Exception:
+        tab = None
+    installed = getattr(driver, "_quaty_readiness_tabs", None)
+    if installed is None:
+        installed = driver._quaty_readiness_tabs = set()
+    if tab is not None and tab in installed:
+        return
+    try:
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": probe_script()})
+    except Exception:
+        pass  # Not a Chromium session; wait_until_ready installs the probe lazily instead.
+    if tab is not None:
+        installed.add(tab)
+
+
+def wait_until_ready(driver, timeout=DEFAULT_SETTLE_TIMEOUT, quiet_ms=DEFAULT_QUIET_MS):
+    """Blocks until the page settles or `timeout` seconds pass.
+
+    Returns a dict with `ready` (False when the cap was hit), `waited` (seconds, measured
+    around the whole wait) and `pending` (requests still in flight at the end).
+    """
+    started = time.perf_counter()
+    status = {"ready": False, "pending": 0}
+    script = probe_script() + WAIT_SCRIPT
+    while True:
+        remaining = timeout - (time.perf_counter() - started)
+        if remaining <= 0:
+            break
+        try:
+            reply = driver.execute_async_script(script, int(remaining * 1000), quiet_ms)
+            status["ready"] = bool(reply and reply.get("ready"))
+            status["pending"] = reply.get("pending", 0) if reply else 0
+            break
+        except JavascriptException:
+            # The document was replaced mid-wait (navigation); poll the new one.
+            time.sleep(0.05)
+    status["waited"] = time.perf_counter() - started
+    return status
+
+
+def log_settle(settled, log=print):
+    """Reports a wait_until_ready result, as a warning when the cap was hit."""
+    if settled["ready"]:
+        log(f"  Page settled in {settled['waited'] * 1000:.0f} ms")
+    else:
+        log_pipeline.warning(log, f"  Page not settled after {settled['waited']:.1f}s "
+            f"({settled['pending']} request(s) pending), continuing")
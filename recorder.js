@@ -1,81 +1,435 @@
 
-// This script is injected into the browser to record user actions.
-// It communicates back to the Python application by calling a callback function
-// provided by Selenium's `execute_async_script`.
-// The Python script will set `window.isAsserting` before executing this.
-
-const callback = arguments[0];
-
-// Helper function to create a unique CSS selector for a given element.
-function getSelector(element) {
-    if (!element || !element.tagName) {
-        return '';
-    }
-    if (element.id) {
-        return `#${element.id}`;
-    }
-    let path = [];
-    while (element.parentElement) {
-        let selector = element.tagName.toLowerCase();
-        const siblings = Array.from(element.parentElement.children);
-        const sameTagSiblings = siblings.filter(e => e.tagName === element.tagName);
-        if (sameTagSiblings.length > 1) {
-            const index = sameTagSiblings.indexOf(element);
-            selector += `:nth-of-type(${index + 1})`;
-        }
-        path.unshift(selector);
-        element = element.parentElement;
-        // Stop at body or a unique enough parent
-        if (element.tagName.toLowerCase() === 'body') break;
-    }
-    return path.join(' > ');
-}
-
-
-// Listen for all click events on the page.
-document.addEventListener('click', function(event) {
-    const selector = getSelector(event.target);
-    let action;
-
-    if (window.isAsserting) {
-        // DO NOT prevent default action. The user should be able to interact with the page
-        // normally, while also capturing an assertion.
-        
-        const capturedText = event.target.innerText;
-        action = {
-            type: 'assert_text',
-            selector: selector,
-            value: capturedText
-        };
-        console.log(`Assertion captured: Element '${selector}' should have text '${capturedText}'`);
-        // Send the recorded action back to the Python script.
-        callback(action);
+// This script is installed once per document to record user actions.
+// Captured actions are buffered in an in-page queue (`window.__quatyRecorder`) which the
+// Python application drains in batches, so events fired between polls are never lost.
+// The Python script sets `window.isAsserting` before installing it, and re-installs it
+// on every new document (navigation). Installing it twice in one document is a no-op.
 
-    } else {
-        // Normal recording behavior
-        action = {
-            type: 'click',
-            selector: selector
-        };
-        // Send the recorded action back to the Python script.
-        callback(action);
-    }
-}, true); // Use 'capture' phase to ensure we get the event.
-
-// Listen for changes in input fields, textareas, and select dropdowns.
-document.addEventListener('change', function(event) {
-    // We don't want to record 'change' events in assertion mode.
-    if (window.isAsserting) {
+(function () {
+    if (window.__quatyRecorder) {
         return;
     }
-    const selector = getSelector(event.target);
-    const action = {
-        type: 'input',
-        selector: selector,
-        value: event.target.value
+
+    const installedEarly = document.readyState === 'loading';
+
+    // Events captured right before a navigation are carried over to the next document,
+    // along with whether the page itself started that navigation (see Navigation below).
+    const CARRY_KEY = '__quatyRecorderQueue';
+    const PAGE_NAVIGATION_KEY = '__quatyRecorderPageNavigation';
+    const queue = [];
+    let followsPage = false;
+    try {
+        const carried = window.sessionStorage.getItem(CARRY_KEY);
+        if (carried) {
+            queue.push(...JSON.parse(carried));
+            window.sessionStorage.removeItem(CARRY_KEY);
+        }
+        followsPage = window.sessionStorage.getItem(PAGE_NAVIGATION_KEY) === '1';
+        window.sessionStorage.removeItem(PAGE_NAVIGATION_KEY);
+    } catch (e) {
+        // sessionStorage is unavailable on some origins (e.g. about:blank, sandboxed frames).
+    }
+
+    // --- Selector Engine --- //
+    // Prefers stable attributes over DOM position, verifies uniqueness with one
+    // querySelectorAll per candidate and memoizes results per element.
+    const STABLE_ATTRIBUTES = ['data-testid', 'data-test', 'data-qa', 'name', 'aria-label'];
+    const selectorCache = new WeakMap();
+    const anchorCache = new WeakMap();
+
+    function escapeIdent(value) {
+        return window.CSS && CSS.escape ? CSS.escape(value) : value.replace(/([^\w-])/g, '\\$1');
+    }
+
+    function escapeAttribute(value) {
+        return value.replace(/["\\]/g, '\\$&');
+    }
+
+    // Framework-generated ids (ember123, :r1:, 4f3a...) change between sessions.
+    function looksGenerated(value) {
+        return /^\d|\d{3,}|:/.test(value);
+    }
+
+    function isUnique(selector, element) {
+        try {
+            const matches = document.querySelectorAll(selector);
+            return matches.length === 1 && matches[0] === element;
+        } catch (e) {
+            return false;
+        }
+    }
+
+    // Candidates built from the element's own attributes, most stable first.
+    function attributeSelectors(element) {
+        const tag = element.tagName.toLowerCase();
+        const candidates = [];
+        if (element.id && !looksGenerated(element.id)) {
+            candidates.push(`#${escapeIdent(element.id)}`);
+        }
+        for (const attribute of STABLE_ATTRIBUTES) {
+            const value = element.getAttribute(attribute);
+            if (value) {
+                candidates.push(`${tag}[${attribute}="${escapeAttribute(value)}"]`);
+            }
+        }
+        return candidates;
+    }
+
+    // tag or tag:nth-of-type(n), counting siblings without copying the children list.
+    function positionalStep(element) {
+        const tag = element.tagName;
+        let index = 1;
+        for (let sibling = element.previousElementSibling; sibling; sibling = sibling.previousElementSibling) {
+            if (sibling.tagName === tag) index++;
+        }
+        let ambiguous = index > 1;
+        for (let sibling = element.nextElementSibling; !ambiguous && sibling; sibling = sibling.nextElementSibling) {
+            if (sibling.tagName === tag) ambiguous = true;
+        }
+        return ambiguous ? `${tag.toLowerCase()}:nth-of-type(${index})` : tag.toLowerCase();
+    }
+
+    // A unique attribute selector for an ancestor, or null. Cached per ancestor.
+    function anchorFor(element) {
+        if (!anchorCache.has(element)) {
+            const anchor = attributeSelectors(element).find(candidate => isUnique(candidate, element)) || null;
+            anchorCache.set(element, anchor);
+        }
+        return anchorCache.get(element);
+    }
+
+    // Ranked list of selectors for an element: unique stable attributes first, then a
+    // positional path anchored at the nearest stably identified ancestor (or body).
+    function getSelectors(element) {
+        if (!element || !element.tagName) {
+            return [];
+        }
+        const cached = selectorCache.get(element);
+        if (cached && isUnique(cached[0], element)) {
+            return cached;
+        }
+
+        const ranked = attributeSelectors(element).filter(candidate => isUnique(candidate, element));
+        const path = [];
+        let node = element;
+        while (node.parentElement && node.tagName.toLowerCase() !== 'body') {
+            path.unshift(positionalStep(node));
+            node = node.parentElement;
+            const anchor = node.tagName.toLowerCase() === 'body' ? null : anchorFor(node);
+            if (anchor) {
+                path.unshift(anchor);
+                break;
+            }
+        }
+        const structural = path.join(' > ') || element.tagName.toLowerCase();
+        if (!ranked.includes(structural)) {
+            ranked.push(structural);
+        }
+        selectorCache.set(element, ranked);
+        return ranked;
+    }
+
+    function getSelector(element) {
+        return getSelectors(element)[0] || '';
+    }
+
+    // --- Event Coalescing --- //
+    // Raw events far outnumber steps, so they are merged in-page before they are queued:
+    // a keystroke burst becomes one `input` step (flushed after a typing pause, on change,
+    // or when any other step is recorded), scrolls are debounced into one `scroll` step with
+    // the final position, and a hover is only recorded when the DOM changes near the hovered
+    // element shortly after it (a menu opening), never for plain pointer movement.
+    const INPUT_IDLE_MS = 1000;       // A typing pause this long ends a keystroke burst
+    const SCROLL_DEBOUNCE_MS = 400;   // Scrolling must stop this long before it is recorded
+    const HOVER_WINDOW_MS = 300;      // DOM changes this soon after a hover are attributed to it
+    const PRESSED_KEYS = ['Enter', 'Escape'];
+    const TEXT_INPUT_TYPES = ['text', 'search', 'email', 'url', 'tel', 'password', 'number'];
+
+    let pendingInput = null;   // {element, selectors, timer}
+    let lastInput = null;      // {element, value} of the last flushed burst
+    let pendingScroll = null;  // {target, timer}; target null is the window
+    let pendingHover = null;   // {element, scope, mutated, timer}
+    let lastHover = null;
+    const scrollPositions = new Map();
+
+    function push(action) {
+        action.t = Date.now();
+        // The page the step ran on, for the selector pre-flight check (preflight.py).
+        action.page = location.href;
+        if (action.type !== 'hover') {
+            lastHover = null;
+        }
+        // A burst that resumes before the queue was drained continues the queued step.
+        const tail = queue[queue.length - 1];
+        if (tail && (action.type === 'input' || action.type === 'scroll')
+                && tail.type === action.type && tail.selector === action.selector) {
+            queue[queue.length - 1] = action;
+            return;
+        }
+        queue.push(action);
+    }
+
+    function record(action) {
+        flushPending();
+        push(action);
+    }
+
+    function flushPending() {
+        finishHover();
+        flushInput();
+        flushScroll();
+    }
+
+    function isTextEntry(element) {
+        if (element.isContentEditable || element.tagName === 'TEXTAREA') {
+            return true;
+        }
+        return element.tagName === 'INPUT' && TEXT_INPUT_TYPES.includes((element.type || 'text').toLowerCase());
+    }
+
+    function currentValue(element) {
+        return element.isContentEditable ? element.innerText : element.value;
+    }
+
+    function flushInput() {
+        if (!pendingInput) {
+            return;
+        }
+        const { element, selectors, timer } = pendingInput;
+        clearTimeout(timer);
+        pendingInput = null;
+        lastInput = { element: element, value: currentValue(element) };
+        push({ type: 'input', selector: selectors[0] || '', selectors: selectors, value: lastInput.value });
+    }
+
+    function scrollPosition(target) {
+        return target
+            ? `${Math.round(target.scrollLeft)},${Math.round(target.scrollTop)}`
+            : `${Math.round(window.scrollX)},${Math.round(window.scrollY)}`;
+    }
+
+    function flushScroll() {
+        if (!pendingScroll) {
+            return;
+        }
+        const { target, timer } = pendingScroll;
+        clearTimeout(timer);
+        pendingScroll = null;
+        const position = scrollPosition(target);
+        if (scrollPositions.get(target) === position) {
+            return;
+        }
+        scrollPositions.set(target, position);
+        const selectors = target ? getSelectors(target) : [];
+        push({ type: 'scroll', selector: selectors[0] || '', selectors: selectors, value: position });
+    }
+
+    function finishHover() {
+        if (!pendingHover) {
+            return;
+        }
+        const { element, mutated, timer } = pendingHover;
+        clearTimeout(timer);
+        pendingHover = null;
+        if (!mutated || !element.isConnected) {
+            return;
+        }
+        lastHover = element;
+        const selectors = getSelectors(element);
+        push({ type: 'hover', selector: selectors[0] || '', selectors: selectors });
+    }
+
+    // Only consulted while a hover is pending, so busy pages pay for one check per batch.
+    new MutationObserver(function(records) {
+        if (pendingHover && !pendingHover.mutated) {
+            const scope = pendingHover.scope;
+            pendingHover.mutated = records.some(mutation => scope.contains(mutation.target));
+        }
+    }).observe(document, {
+        childList: true, subtree: true, attributes: true,
+        attributeFilter: ['class', 'style', 'hidden', 'open', 'aria-expanded', 'aria-hidden']
+    });
+
+    // Listen for all click events on the page.
+    document.addEventListener('click', function(event) {
+        const selectors = getSelectors(event.target);
+        const selector = selectors[0] || '';
+
+        // The click moves the pointer onto its target anyway.
+        if (pendingHover && (pendingHover.element.contains(event.target) || event.target.contains(pendingHover.element))) {
+            clearTimeout(pendingHover.timer);
+            pendingHover = null;
+        }
+
+        if (window.isAsserting) {
+            // DO NOT prevent default action. The user should be able to interact with the page
+            // normally, while also capturing an assertion.
+            const capturedText = event.target.innerText;
+            console.log(`Assertion captured: Element '${selector}' should have text '${capturedText}'`);
+            record({
+                type: 'assert_text',
+                selector: selector,
+                selectors: selectors,
+                value: capturedText
+            });
+        } else {
+            // Normal recording behavior
+            record({
+                type: 'click',
+                selector: selector,
+                selectors: selectors
+            });
+        }
+    }, true); // Use 'capture' phase to ensure we get the event.
+
+    // Keystrokes: one `input` step per burst of typing into the same field.
+    document.addEventListener('input', function(event) {
+        const element = event.target;
+        if (window.isAsserting || !isTextEntry(element)) {
+            return;
+        }
+        if (pendingInput && pendingInput.element !== element) {
+            flushInput();
+        }
+        if (!pendingInput) {
+            finishHover();
+            flushScroll();
+            pendingInput = { element: element, selectors: getSelectors(element), timer: null };
+        }
+        clearTimeout(pendingInput.timer);
+        pendingInput.timer = setTimeout(flushInput, INPUT_IDLE_MS);
+    }, true);
+
+    // Listen for changes in input fields, textareas, and select dropdowns.
+    document.addEventListener('change', function(event) {
+        // We don't want to record 'change' events in assertion mode.
+        if (window.isAsserting) {
+            return;
+        }
+        const element = event.target;
+        if (pendingInput && pendingInput.element === element) {
+            flushInput();
+            return;
+        }
+        // The burst was already flushed after a typing pause.
+        if (lastInput && lastInput.element === element && lastInput.value === currentValue(element)) {
+            return;
+        }
+        const selectors = getSelectors(element);
+        record({
+            type: 'input',
+            selector: selectors[0] || '',
+            selectors: selectors,
+            value: element.value
+        });
+    }, true);
+
+    // Keys that act on their own (submitting a form, closing a dialog) become `press` steps.
+    document.addEventListener('keydown', function(event) {
+        if (window.isAsserting || !PRESSED_KEYS.includes(event.key)) {
+            return;
+        }
+        const selectors = event.target === document.body ? [] : getSelectors(event.target);
+        record({
+            type: 'press',
+            selector: selectors[0] || '',
+            selectors: selectors,
+            value: event.key
+        });
+    }, true);
+
+    document.addEventListener('scroll', function(event) {
+        if (window.isAsserting) {
+            return;
+        }
+        const target = event.target === document || event.target === document.documentElement ? null : event.target;
+        if (pendingScroll && pendingScroll.target !== target) {
+            flushScroll();
+        }
+        if (!pendingScroll) {
+            pendingScroll = { target: target, timer: null };
+        }
+        clearTimeout(pendingScroll.timer);
+        pendingScroll.timer = setTimeout(flushScroll, SCROLL_DEBOUNCE_MS);
+    }, true);
+
+    document.addEventListener('mouseover', function(event) {
+        const element = event.target;
+        if (window.isAsserting || element === lastHover || (pendingHover && pendingHover.element === element)
+                || element === document.body || element === document.documentElement) {
+            return;
+        }
+        finishHover();
+        // Changes anywhere under a top-level container are not evidence of this hover.
+        const parent = element.parentElement;
+        const scope = parent && parent !== document.body && parent !== document.documentElement ? parent : element;
+        pendingHover = { element: element, scope: scope, mutated: false, timer: setTimeout(finishHover, HOVER_WINDOW_MS) };
+    }, true);
+
+    // --- Navigation --- //
+    // A document the user reached from the browser itself (a typed url, reload or
+    // back/forward button) becomes a `navigate` step; one the previous page navigated to (a
+    // link, a form, a script after a click) is reproduced by replaying that page's steps.
+    // The Navigation API fires `navigate` only for navigations the page starts. Without it,
+    // a navigation that begins while a click, key press or submit is being dispatched counts.
+    let pageNavigation = false;
+    let interacting = false;
+    if (window.navigation) {
+        window.navigation.addEventListener('navigate', function(event) {
+            if (!event.destination.sameDocument) {
+                pageNavigation = true;
+            }
+        });
+    } else {
+        ['click', 'keydown', 'submit'].forEach(function(type) {
+            document.addEventListener(type, function() {
+                interacting = true;
+                setTimeout(function() { interacting = false; }, 0);
+            }, true);
+        });
+        window.addEventListener('beforeunload', function() {
+            pageNavigation = pageNavigation || interacting;
+        });
+    }
+
+    // Hand undrained events to the next document when this one is unloaded...
+    window.addEventListener('pagehide', function() {
+        flushPending();
+        try {
+            window.sessionStorage.setItem(PAGE_NAVIGATION_KEY, pageNavigation ? '1' : '');
+            if (queue.length) {
+                window.sessionStorage.setItem(CARRY_KEY, JSON.stringify(queue));
+            }
+        } catch (e) {}
+    });
+    // ...unless it comes back from the back/forward cache with its queue still in memory.
+    window.addEventListener('pageshow', function(event) {
+        if (event.persisted) {
+            pageNavigation = false;
+            try {
+                window.sessionStorage.removeItem(CARRY_KEY);
+                window.sessionStorage.removeItem(PAGE_NAVIGATION_KEY);
+            } catch (e) {}
+        }
+    });
+
+    // Only detectable when this script runs before the page's own (installed for every new
+    // document); a late install on an already loaded page cannot tell how it got there.
+    if (installedEarly) {
+        const entry = performance.getEntriesByType('navigation')[0];
+        const type = entry ? entry.type : 'navigate';
+        const followsLink = type === 'navigate' && document.referrer !== '';
+        if (!followsPage && !followsLink) {
+            push({ type: 'navigate', selector: '', value: location.href });
+        }
+    }
+
+    window.__quatyRecorder = {
+        getSelector: getSelector,
+        getSelectors: getSelectors,
+        size: function() { return queue.length; },
+        drain: function() { return queue.splice(0, queue.length); }
     };
-    // Send the recorded action back to the Python script.
-    callback(action);
-}, true);
 
-console.log('Recorder script injected. Assertion mode is:', window.isAsserting ? 'ON' : 'OFF');
+    console.log('Recorder script installed. Assertion mode is:', window.isAsserting ? 'ON' : 'OFF');
+})();
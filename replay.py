@@ -0,0 +1,313 @@
+
+import time
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options as ChromeOptions
+from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException, InvalidSelectorException
+
+import assertions
+import log_pipeline
+import network_policy
+import pipeline
+import preflight
+import readiness
+import snapshots
+from cases import load_test_case, collect_test_cases  # noqa: F401 (re-exported)
+from cases import step_selectors
+from timing import RunTimer
+
+# --- Replay Engine --- #
+# Step semantics shared by the GUI "Test Run" button and the headless batch runner.
+# A test case is the same {"url": ..., "actions": [...]} document that save_test writes.
+
+DEFAULT_TIMEOUT = 10
+SCRIPT_TIMEOUT_MARGIN = 5  # Seconds on top of the longest in-page wait
+
+# Steps that act on the page itself when they have no selector.
+PAGE_STEP_TYPES = ("navigate", "scroll", "press")
+PRESS_KEYS = {"Enter": Keys.ENTER, "Escape": Keys.ESCAPE, "Tab": Keys.TAB}
+SCROLL_SCRIPT = """
+const target = arguments[0] || window;
+target.scrollTo(arguments[1], arguments[2]);
+"""
+
+
+def chrome_options(headless=False):
+    options = ChromeOptions()
+    if headless:
+        options.add_argument("--headless")
+        options.add_argument("--disable-gpu")
+    # Console messages for failure artifacts (artifacts.py).
+    options.set_capability("goog:loggingPrefs", {"browser": "ALL"})
+    return options
+
+
+def start_driver(headless=False):
+    return webdriver.Chrome(options=chrome_options(headless))
+
+
+def locate_element(driver, wait, action):
+    """Waits for the step's element, trying `selector` first and then the recorder's ranked fallbacks.
+
+    Positional fallbacks are only tried once the wait has timed out (see cases.step_selectors).
+    Returns (element, selector_used). Raises TimeoutException when none of them matches.
+    """
+    polled, positional = step_selectors(action)
+
+    def find_first(driver, candidates):
+        for candidate in candidates:
+            try:
+                elements = driver.find_elements(By.CSS_SELECTOR, candidate)
+            except InvalidSelectorException:
+                continue
+            if elements:
+                return elements[0], candidate
+        return False
+
+    try:
+        return wait.until(lambda driver: find_first(driver, polled))
+    except TimeoutException:
+        found = find_first(driver, positional)
+        if not found:
+            raise
+        return found
+
+
+def execute_step(driver, wait, action, i, total, log=print, timer=None, settle_timeout=readiness.DEFAULT_SETTLE_TIMEOUT):
+    """Runs one non-assertion step through native WebDriver calls and returns its result dict."""
+    timer = timer or RunTimer()
+    action_type = action.get('type', '')
+    selector = action.get('selector', '')
+    value = action.get('value', '')
+
+    log(f"Step {i}/{total}: {action_type} on '{selector}'")
+    result = {"step": i, "type": action_type, "selector": selector, "passed": True, "message": "", "wait": 0.0}
+    started = time.perf_counter()
+
+    try:
+        element = None
+        if selector or action_type not in PAGE_STEP_TYPES:
+            with timer.span("lookup", i):
+                element, used_selector = locate_element(driver, wait, action)
+            if used_selector != selector:
+                log_pipeline.warning(log, f"  Primary selector not found, used fallback '{used_selector}'")
+                result["selector_used"] = used_selector
+
+        with timer.span("action", i):
+            if action_type == 'click':
+                element.click()
+            elif action_type == 'input':
+                element.clear()
+                element.send_keys(value)
+            elif action_type == 'navigate':
+                driver.get(value)
+            elif action_type == 'scroll':
+                x, y = (int(float(part)) for part in str(value or "0,0").split(","))
+                driver.execute_script(SCROLL_SCRIPT, element, x, y)
+            elif action_type == 'hover':
+                ActionChains(driver).move_to_element(element).perform()
+            elif action_type == 'press':
+                key = PRESS_KEYS.get(value, value)
+                if element is not None:
+                    element.send_keys(key)
+                else:
+                    ActionChains(driver).send_keys(key).perform()
+
+        with timer.span("settle", i):
+            settled = readiness.wait_until_ready(driver, settle_timeout)
+        result["wait"] = settled["waited"]
+        readiness.log_settle(settled, log)
+
+    except TimeoutException:
+        result["passed"] = False
+        result["message"] = f"Element not found: {selector}"
+        log_pipeline.error(log, f"  Error: {result['message']}")
+    except Exception as e:
+        result["passed"] = False
+        result["message"] = str(e)
+        log_pipeline.error(log, f"  Error during action: {e}")
+    finally:
+        result["duration"] = time.perf_counter() - started
+        timer.add("step", started, result["duration"], i, type=action_type, selector=selector,
+                  passed=result["passed"])
+    return result
+
+
+def run_steps(driver, actions, log=print, timeout=DEFAULT_TIMEOUT, settle_timeout=readiness.DEFAULT_SETTLE_TIMEOUT,
+              on_event=None, stop_event=None, timer=None, fast=False, start=0, soft_assert=False,
+              artifacts=None, broken_steps=None):
+    """Replays `actions` on the page currently loaded in `driver`.
+
+    Returns one result dict per executed step. Execution stops at the first failing step,
+    so a failed run's last result is the failure, except for soft assertion failures
+    (`soft_assert`, or `"soft": true` on the step), which are marked "soft" and skipped past.
+    Runs of consecutive assertions are evaluated in one in-page call (see assertions.py).
+    With `artifacts` (an artifacts.RunArtifacts) failures are captured for later inspection.
+    Steps in `broken_steps` (1-based, from a preflight check) only get preflight.FAIL_FAST_TIMEOUT.
+    Steps that change the page record how long they waited for it to settle in `wait` (seconds).
+
+    `on_event(kind, result)` is called with kind 'started' before a step and 'passed' or
+    'failed' after it. Setting `stop_event` (a threading.Event) stops the run cleanly
+    before the next step. Phase timings are recorded into `timer` (a timing.RunTimer).
+
+    With `fast`, runs of consecutive steps are shipped to an in-page executor in a single
+    round-trip (see pipeline.py); steps that need trusted input events still run natively.
+    Assertions then judge text by the page's innerText instead of WebDriver's element text.
+    Replay begins at index `start` (the steps before it were restored from a snapshot).
+    """
+    timer = timer or RunTimer()
+    wait = WebDriverWait(driver, timeout)
+    readiness.install(driver, settle_timeout)
+    # Every in-page wait (settling, bulk assertions, a pipelined batch) is bounded inside
+    # the page by one of these timeouts; the driver-level limit only catches a hung script.
+    driver.set_script_timeout(max(timeout, settle_timeout) + SCRIPT_TIMEOUT_MARGIN)
+    results = []
+    round_trips = 0
+    broken_steps = set(broken_steps or ())
+
+    def step_timeout(index):
+        return min(timeout, preflight.FAIL_FAST_TIMEOUT) if index + 1 in broken_steps else timeout
+
+    def until_broken(index, end):
+        """Cuts a batch or assertion run short so a known-broken step starts its own."""
+        return next((j for j in range(index + 1, end) if j + 1 in broken_steps), end)
+
+    native_waited = 0.0  # Seconds a step handed back by a batch already waited in-page
+    i = start
+    while i < len(actions):
+        if stop_event is not None and stop_event.is_set():
+            log_pipeline.warning(log, f"Stopped before step {i + 1}/{len(actions)}.")
+            break
+
+        if assertions.is_assertion(actions[i]):
+            end = until_broken(i, assertions.run_end(actions, i))
+            assertion_results = assertions.run_assertions(driver, actions, i, end, step_timeout(i), log=log,
+                                                          timer=timer, on_event=on_event, soft=soft_assert,
+                                                          in_page_text=fast)
+            results.extend(assertion_results)
+            if artifacts:
+                artifacts.after_steps(driver, assertion_results, timer=timer, log=log)
+            i += len(assertion_results)
+            if not assertion_results[-1]["passed"] and not assertion_results[-1].get("soft"):
+                break
+            continue
+
+        if fast:
+            end = until_broken(i, pipeline.batch_end(actions, i))
+            if end > i:
+                batch_results, native_index, native_waited = pipeline.run_batch(
+                    driver, actions, i, end, step_timeout(i), settle_timeout, log=log, timer=timer,
+                    on_event=on_event)
+                round_trips += 1
+                results.extend(batch_results)
+                if artifacts:
+                    artifacts.after_steps(driver, batch_results, timer=timer, log=log)
+                i += len(batch_results)
+                if batch_results and not batch_results[-1]["passed"]:
+                    break
+                if native_index is None:
+                    continue
+
+        action = actions[i]
+        placeholder = {"step": i + 1, "type": action.get('type', ''), "selector": action.get('selector', '')}
+        if on_event:
+            on_event("started", placeholder)
+        step_wait = wait
+        if i + 1 in broken_steps:
+            log(f"  Step {i + 1} was missing at the last preflight check, waiting at most {step_timeout(i)}s")
+            step_wait = WebDriverWait(driver, step_timeout(i))
+        if native_waited:
+            # The rest of the step's element timeout, not a second full one.
+            step_wait = WebDriverWait(driver, max(0.0, step_timeout(i) - native_waited))
+            native_waited = 0.0
+        result = execute_step(driver, step_wait, action, i + 1, len(actions), log=log, timer=timer,
+                              settle_timeout=settle_timeout)
+        results.append(result)
+        if artifacts:
+            artifacts.after_steps(driver, [result], timer=timer, log=log)
+        i += 1
+        if on_event:
+            on_event("passed" if result["passed"] else "failed", result)
+        if not result["passed"]:
+            break
+
+    soft_failures = [result for result in results if result.get("soft")]
+    if soft_failures:
+        log_pipeline.error(log, f"{len(soft_failures)} soft assertion(s) failed: steps {', '.join(str(r['step']) for r in soft_failures)}")
+    settled_steps = [result for result in results if result["type"] in ('click', 'input')]
+    if settled_steps:
+        total_wait = sum(result["wait"] for result in settled_steps)
+        log(f"Settle waits: {total_wait:.1f}s over {len(settled_steps)} step(s) "
+            f"(fixed delay would be {len(settled_steps) * readiness.FIXED_DELAY:.0f}s)")
+    if fast and round_trips:
+        pipelined = sum(1 for result in results if result.get("pipelined"))
+        log(f"Pipelined {pipelined} step(s) in {round_trips} executor round-trip(s)")
+    return results
+
+
+def run_test_case(test_case, headless=True, log=print, timeout=DEFAULT_TIMEOUT, pool=None, fast=False,
+                  snapshot=None, capture=False, policy=None, soft_assert=False, artifacts=None, on_event=None,
+                  stop_event=None, broken_steps=None):
+    """Replays a whole test case and always returns a result dict.
+
+    With a `pool` (see pool.SessionPool) the browser is leased from it instead of cold-started.
+    The outcome's `timing` holds the run's phase spans (see timing.RunTimer.to_dict).
+
+    With a `snapshot` (see snapshots.py) its browser state is restored instead of loading the
+    url, and only the steps after its prefix are replayed. With `capture`, a passing run
+    stores a snapshot of the state it ends in under the outcome's `snapshot`. A network
+    `policy` (see network_policy.py) is enforced for the run; its stats go in `network`.
+    Soft assertions apply with `soft_assert` or when the case sets "soft_assert": true.
+    With `artifacts` (an artifacts.RunArtifacts) failures are captured; their run directory
+    goes in `artifacts`. `on_event`, `stop_event` and `broken_steps` are passed on to run_steps.
+    """
+    started = time.perf_counter()
+    outcome = {"url": test_case.get("url", ""), "passed": False, "steps": [], "error": ""}
+    timer = RunTimer(outcome["url"])
+    driver = None
+    broken = False
+    try:
+        with timer.span("driver_start"):
+            driver = pool.acquire(headless) if pool else start_driver(headless)
+        with network_policy.enforce(driver, policy, log=log) as network_stats:
+            outcome["network"] = network_stats
+            prefix_results = []
+            if snapshot:
+                with timer.span("restore"):
+                    snapshots.restore(driver, snapshot)
+                prefix_results = snapshot["results"]
+                log(f"Restored snapshot after step {len(prefix_results)}, resuming at {snapshot['url']}")
+            else:
+                with timer.span("get"):
+                    driver.get(outcome["url"])
+            outcome["steps"] = prefix_results + run_steps(driver, test_case.get("actions", []), log=log,
+                                                          timeout=timeout, on_event=on_event,
+                                                          stop_event=stop_event, timer=timer, fast=fast,
+                                                          start=len(prefix_results),
+                                                          soft_assert=soft_assert or test_case.get("soft_assert", False),
+                                                          artifacts=artifacts, broken_steps=broken_steps)
+            outcome["passed"] = all(step["passed"] for step in outcome["steps"])
+            if capture and outcome["passed"]:
+                outcome["snapshot"] = snapshots.capture(driver, outcome["steps"])
+    except Exception as e:
+        broken = True
+        outcome["error"] = f"An error occurred during test setup: {e}"
+        log_pipeline.error(log, outcome["error"])
+        if driver and artifacts:
+            artifacts.capture(driver, "error", timer=timer, log=log)
+    finally:
+        if driver and pool:
+            pool.release(driver, headless, broken=broken)
+        elif driver:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        outcome["duration"] = time.perf_counter() - started
+        outcome["timing"] = timer.to_dict()
+        if artifacts and artifacts.path:
+            outcome["artifacts"] = artifacts.path
+    return outcome
@@ -0,0 +1,112 @@
+
+import hashlib
+import json
+import os
+import time
+
+from cases import suite_name
+
+# --- Duration-Aware Scheduling --- #
+# Past per-case durations are kept in .quaty/durations.json so batch runs can start the
+# longest cases first (a long case started last leaves every other worker idle), split a
+# suite into shards for several machines, and re-run only what failed or flaked.
+#
+# Every machine must compute the same split, so shards never depend on local state. By
+# default a case's shard is a hash of its path within the suite. With a shared durations
+# file (`--shard-durations`, keyed by path within the suite and written by unsharded runs),
+# shards are balanced by its estimates instead. Local filters (--changed, --failed-only)
+# apply only after sharding.
+
+DEFAULT_PATH = os.path.join(".quaty", "durations.json")
+SMOOTHING = 0.3     # Weight of the newest run in the moving average
+HISTORY_LENGTH = 5  # Recent pass/fail results kept per case for flake detection
+
+
+class DurationStore:
+    def __init__(self, path=DEFAULT_PATH, root=None):
+        """With a suite `root`, cases are keyed by their path within the suite (a file that
+        can be shared between machines) instead of by absolute path."""
+        self.path = path
+        self.root = root
+        self.cases = {}
+        try:
+            with open(path, "r") as f:
+                self.cases = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def key(self, path):
+        return suite_name(path, self.root) if self.root else os.path.abspath(path)
+
+    def record(self, path, duration, passed):
+        entry = self.cases.setdefault(self.key(path), {"duration": duration, "runs": 0, "history": []})
+        entry["duration"] = duration if not entry["runs"] else (SMOOTHING * duration +
+                                                                 (1 - SMOOTHING) * entry["duration"])
+        entry["runs"] += 1
+        entry["history"] = (entry["history"] + [bool(passed)])[-HISTORY_LENGTH:]
+        entry["last_run_at"] = time.time()
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.cases, f, indent=4, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+    def estimate(self, path, default=0.0):
+        entry = self.cases.get(self.key(path))
+        return entry["duration"] if entry else default
+
+    def needs_rerun(self, path):
+        """True when the case failed last time or its recent results are mixed (flaky)."""
+        entry = self.cases.get(self.key(path))
+        if not entry or not entry["history"]:
+            return False
+        history = entry["history"]
+        return not history[-1] or len(set(history)) > 1
+
+
+# --- Ordering and Sharding --- #
+def estimates(paths, store):
+    """Expected duration per path; cases never run before count as the median known case."""
+    known = sorted(store.estimate(path) for path in paths if store.key(path) in store.cases)
+    default = known[len(known) // 2] if known else 0.0
+    return {path: store.estimate(path, default) for path in paths}
+
+
+def longest_first(paths, store):
+    expected = estimates(paths, store)
+    return sorted(paths, key=lambda path: (-expected[path], path))
+
+
+def shard_of(name, count):
+    return int(hashlib.sha1(name.encode("utf-8")).hexdigest(), 16) % count
+
+
+def shard(paths, index, count, root, store=None):
+    """The `index`-th (0-based) of `count` shards of the full suite under `root`.
+
+    Without a `store`, by a hash of each path within the suite. With a shared store (keyed
+    by suite path), balanced by expected duration (greedy LPT, ties broken by suite path).
+    """
+    if store is None:
+        return [path for path in paths if shard_of(suite_name(path, root), count) == index]
+    expected = estimates(paths, store)
+    totals = [0.0] * count
+    shards = [[] for _ in range(count)]
+    for path in sorted(paths, key=lambda path: (-expected[path], suite_name(path, root))):
+        target = min(range(count), key=lambda i: (totals[i], len(shards[i]), i))
+        shards[target].append(path)
+        totals[target] += expected[path]
+    return shards[index]
+
+
+def parse_shard(text):
+    """Parses 'i/N' (1-based) into (index, count) with a 0-based index."""
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{text}', expected i/N such as 2/4")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Invalid shard '{text}', expected 1 <= i <= N")
+    return index - 1, count
@@ -0,0 +1,197 @@
+
+import hashlib
+import json
+import os
+import time
+
+# --- Shared-Prefix State Snapshots --- #
+# Many cases open the same URL and repeat the same first steps (login, navigating to a
+# module). The batch runner finds those shared prefixes, replays each one once, snapshots
+# the browser state it leaves behind (cookies, localStorage/sessionStorage, current URL)
+# and restores that snapshot for every dependent case, which then runs only its remaining
+# steps. Snapshots are keyed by a hash of the prefix, so editing a prefix step invalidates
+# them, and expire after a TTL so stale sessions are not reused. A prefix is captured under
+# the same network policy as the cases that restore it, and cases with different policies
+# never share a snapshot.
+# IndexedDB, service workers and in-memory page state are not captured.
+#
+# Snapshots hold every cookie of the session, auth and session cookies included, in plain
+# JSON. The snapshot directory is created owner-only (0700, files 0600); keep it out of
+# shared or published locations, or run with --no-snapshots.
+
+SNAPSHOT_DIR = os.path.join(".quaty", "snapshots")
+DEFAULT_TTL = 15 * 60      # Seconds a snapshot may be reused
+MIN_PREFIX_STEPS = 3       # Shorter shared prefixes are not worth a restore
+
+# The step fields a replay acts on. Recorder bookkeeping (`t`, `page`) differs between
+# recordings of the same steps and must not keep them from sharing a prefix.
+STEP_FIELDS = ("type", "selector", "selectors", "value", "trusted", "soft")
+
+# Fields Network.setCookies accepts from a Network.getAllCookies cookie.
+COOKIE_FIELDS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires", "priority")
+
+CAPTURE_STORAGE_SCRIPT = """
+function dump(storage) {
+    const items = {};
+    try {
+        for (let i = 0; i < storage.length; i++) {
+            const key = storage.key(i);
+            items[key] = storage.getItem(key);
+        }
+    } catch (e) {}
+    return items;
+}
+return { origin: location.origin, local: dump(window.localStorage), session: dump(window.sessionStorage) };
+"""
+
+# Runs before any page script of the next document on the snapshot's origin.
+RESTORE_STORAGE_TEMPLATE = """
+(function() {
+    const snapshot = %s;
+    if (location.origin !== snapshot.origin) return;
+    try {
+        for (const [key, value] of Object.entries(snapshot.local)) localStorage.setItem(key, value);
+        for (const [key, value] of Object.entries(snapshot.session)) sessionStorage.setItem(key, value);
+    } catch (e) {}
+})();
+"""
+
+
+# --- Prefix Detection --- #
+def replayed(action):
+    """The part of a step that a replay acts on."""
+    return {field: action[field] for field in STEP_FIELDS if field in action}
+
+
+def step_key(action):
+    return json.dumps(replayed(action), sort_keys=True)
+
+
+def prefix_key(url, actions, policy=None):
+    """Content hash of a prefix; any change to the url, a prefix step or the policy yields a new key."""
+    document = {"url": url, "actions": [replayed(action) for action in actions]}
+    if policy:
+        document["policy"] = policy
+    text = json.dumps(document, sort_keys=True)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def plan(cases, min_steps=MIN_PREFIX_STEPS, policies=None):
+    """Finds shared action prefixes across `cases` ({path: test_case}).
+
+    Builds a trie over (url + network policy, step, step, ...) and gives each case the
+    deepest prefix it shares with at least one other case. Every case keeps at least its
+    last step to run. `policies` maps paths to their network policy (None: no policy).
+    Returns {key: {"url", "actions", "policy", "paths"}} for prefixes of at least
+    `min_steps` steps.
+    """
+    policies = policies or {}
+
+    def root_key(path, test_case):
+        return test_case.get("url", ""), json.dumps(policies.get(path), sort_keys=True)
+
+    root = {}
+    for path, test_case in cases.items():
+        node = root.setdefault(root_key(path, test_case), {"count": 0, "children": {}})
+        node["count"] += 1
+        for action in test_case.get("actions", [])[:-1]:
+            node = node["children"].setdefault(step_key(action), {"count": 0, "children": {}})
+            node["count"] += 1
+
+    groups = {}
+    for path, test_case in cases.items():
+        url = test_case.get("url", "")
+        actions = test_case.get("actions", [])
+        policy = policies.get(path)
+        node = root[root_key(path, test_case)]
+        depth = 0
+        if node["count"] >= 2:
+            for action in actions[:-1]:
+                node = node["children"][step_key(action)]
+                if node["count"] < 2:
+                    break
+                depth += 1
+        if depth < min_steps:
+            continue
+        key = prefix_key(url, actions[:depth], policy)
+        group = groups.setdefault(key, {"url": url, "actions": actions[:depth], "policy": policy, "paths": []})
+        group["paths"].append(path)
+    # A prefix only one case resumes from saves nothing over replaying it in that case.
+    return {key: group for key, group in groups.items() if len(group["paths"]) >= 2}
+
+
+# --- Capture / Restore --- #
+def capture(driver, results):
+    """Snapshots the browser state left by a replayed prefix together with its step results."""
+    cookies = []
+    for cookie in driver.execute_cdp_cmd("Network.getAllCookies", {}).get("cookies", []):
+        fields = {field: cookie[field] for field in COOKIE_FIELDS if field in cookie}
+        if cookie.get("session"):
+            fields.pop("expires", None)
+        cookies.append(fields)
+    return {
+        "created": time.time(),
+        "url": driver.current_url,
+        "cookies": cookies,
+        "storage": driver.execute_script(CAPTURE_STORAGE_SCRIPT),
+        "results": results,
+    }
+
+
+def restore(driver, snapshot):
+    """Loads the snapshot's cookies and storage into a clean browser and opens its URL."""
+    if snapshot["cookies"]:
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": snapshot["cookies"]})
+    script = RESTORE_STORAGE_TEMPLATE % json.dumps(snapshot["storage"])
+    registered = driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": script})
+    try:
+        driver.get(snapshot["url"])
+    finally:
+        driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument", {"identifier": registered["identifier"]})
+
+
+# --- Snapshot Cache --- #
+class SnapshotCache:
+    """Snapshots stored as JSON files so every worker process can restore them."""
+
+    def __init__(self, directory=SNAPSHOT_DIR, ttl=DEFAULT_TTL):
+        self.directory = directory
+        self.ttl = ttl
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), "r") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - snapshot.get("created", 0) > self.ttl:
+            return None
+        return snapshot
+
+    def put(self, key, snapshot):
+        # Snapshots carry session cookies: owner-only directory and files.
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        os.chmod(self.directory, 0o700)
+        # Write then rename so a concurrent reader never sees a half-written file.
+        temp_path = self._path(key) + ".tmp"
+        with os.fdopen(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+            json.dump(snapshot, f)
+        os.replace(temp_path, self._path(key))
+
+    def prune(self):
+        """Removes expired snapshots and returns how many were deleted."""
+        if not os.path.isdir(self.directory):
+            return 0
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if time.time() - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
@@ -0,0 +1,34 @@
+
+import sys
+import time
+
+# --- Startup Profiling --- #
+# `python main.py --profile-startup` prints where the time to an interactive window goes.
+# main.py imports this module before anything else, so PROCESS_STARTED is taken before
+# PySide6 and the app modules load. For a per-module import breakdown, add `-X importtime`
+# to the interpreter flags.
+
+PROCESS_STARTED = time.perf_counter()
+
+enabled = "--profile-startup" in sys.argv
+marks = []
+
+
+def mark(name):
+    marks.append((name, time.perf_counter()))
+
+
+def note(text):
+    if enabled:
+        sys.__stderr__.write(f"  {text}\n")
+
+
+def report():
+    if not enabled:
+        return
+    lines = ["--- Startup profile ---"]
+    previous = PROCESS_STARTED
+    for name, at in marks:
+        lines.append(f"  {name:<28} +{(at - previous) * 1000:7.1f} ms  (at {(at - PROCESS_STARTED) * 1000:7.1f} ms)")
+        previous = at
+    sys.__stderr__.write("\n".join(lines) + "\n")
@@ -0,0 +1,197 @@
+
+import sys
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, Signal
+from PySide6.QtGui import QColor
+
+# --- Steps Table Model --- #
+# Steps are kept in a column-array store instead of one dict (and four QTableWidgetItems)
+# per step. Step numbers are derived from the row, so inserts and deletes never renumber,
+# and the view only asks for the rows that are actually visible.
+
+# Row highlight colors for live replay progress
+STEP_STATE_COLORS = {
+    "running": QColor("#4a708B"),
+    "passed": QColor("#2f4f2f"),
+    "failed": QColor("#6b2323"),
+}
+
+
+class StepStore:
+    """Test steps stored as parallel column lists.
+
+    `type`, `selector` and `value` get a column each. Any other keys a step carries
+    (fallback selectors, timestamps, ...) are kept per row in `extras`, or None when absent.
+    """
+    COLUMNS = ("type", "selector", "value")
+
+    def __init__(self, actions=None):
+        self.types = []
+        self.selectors = []
+        self.values = []
+        self.extras = []
+        if actions:
+            self.extend(actions)
+
+    def __len__(self):
+        return len(self.types)
+
+    def _column(self, key):
+        return {"type": self.types, "selector": self.selectors, "value": self.values}[key]
+
+    def extend(self, actions):
+        for action in actions:
+            # Action types repeat constantly; interning keeps one string object per type.
+            self.types.append(sys.intern(str(action.get("type", ""))))
+            self.selectors.append(action.get("selector", ""))
+            self.values.append(action.get("value", ""))
+            extra = {key: value for key, value in action.items() if key not in self.COLUMNS}
+            self.extras.append(extra or None)
+
+    def replace(self, row, action):
+        self.types[row] = sys.intern(str(action.get("type", "")))
+        self.selectors[row] = action.get("selector", "")
+        self.values[row] = action.get("value", "")
+        self.extras[row] = {key: value for key, value in action.items() if key not in self.COLUMNS} or None
+
+    def get(self, row, key):
+        if key in self.COLUMNS:
+            return self._column(key)[row]
+        extra = self.extras[row]
+        return extra.get(key) if extra else None
+
+    def set(self, row, key, value):
+        if key in self.COLUMNS:
+            self._column(key)[row] = sys.intern(value) if key == "type" else value
+        else:
+            if self.extras[row] is None:
+                self.extras[row] = {}
+            self.extras[row][key] = value
+
+    def action(self, row):
+        action = {"type": self.types[row], "selector": self.selectors[row], "value": self.values[row]}
+        if self.extras[row]:
+            action.update(self.extras[row])
+        return action
+
+    def to_actions(self):
+        return [self.action(row) for row in range(len(self))]
+
+    def delete_range(self, first, last):
+        for column in (self.types, self.selectors, self.values, self.extras):
+            del column[first:last + 1]
+
+
+def contiguous_ranges(rows):
+    """Groups row numbers into (first, last) ranges, last range first, for safe removal."""
+    ranges = []
+    for row in sorted(set(rows)):
+        if ranges and row == ranges[-1][1] + 1:
+            ranges[-1][1] = row
+        else:
+            ranges.append([row, row])
+    return [tuple(r) for r in reversed(ranges)]
+
+
+class StepTableModel(QAbstractTableModel):
+    step_edited = Signal(int, str, str)  # row, key, new value
+
+    HEADERS = ["Step", "Action", "Selector", "Value"]
+    KEYS = [None, "type", "selector", "value"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.store = StepStore()
+        self._states = {}
+
+    # --- Qt model interface --- #
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.store)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            if column == 0:
+                return str(row + 1)
+            value = self.store.get(row, self.KEYS[column])
+            return "" if value is None else str(value)
+        if role == Qt.BackgroundRole:
+            state = self._states.get(row)
+            return STEP_STATE_COLORS.get(state) if state else None
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and index.column() > 0:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid() or index.column() == 0:
+            return False
+        row, key = index.row(), self.KEYS[index.column()]
+        if self.store.get(row, key) == value:
+            return False
+        self.store.set(row, key, value)
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        self.step_edited.emit(row, key, value)
+        return True
+
+    # --- Bulk operations (one range change each) --- #
+    def load(self, actions):
+        self.beginResetModel()
+        self.store = StepStore(actions)
+        self._states = {}
+        self.endResetModel()
+
+    def append_actions(self, actions):
+        if not actions:
+            return
+        first = len(self.store)
+        self.beginInsertRows(QModelIndex(), first, first + len(actions) - 1)
+        self.store.extend(actions)
+        self.endInsertRows()
+
+    def replace_action(self, row, action):
+        self.store.replace(row, action)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+
+    def delete_rows(self, rows):
+        """Removes rows, emitting one removal per contiguous block. Returns the number removed."""
+        removed = 0
+        for first, last in contiguous_ranges(rows):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            self.store.delete_range(first, last)
+            self.endRemoveRows()
+            removed += last - first + 1
+        if removed:
+            self._states = {}
+        return removed
+
+    def action(self, row):
+        return self.store.action(row)
+
+    def to_actions(self):
+        return self.store.to_actions()
+
+    # --- Replay progress --- #
+    def set_step_state(self, row, state):
+        self._states[row] = state
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1), [Qt.BackgroundRole])
+
+    def clear_step_states(self):
+        if not self._states:
+            return
+        self._states = {}
+        if len(self.store):
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.store) - 1, len(self.HEADERS) - 1),
+                                  [Qt.BackgroundRole])
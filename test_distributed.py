@@ -0,0 +1,77 @@
+
+import distributed
+
+# --- Coordinator Leases --- #
+# A lease_timeout of 0 makes every lease expire on the next reap, standing in for a worker
+# that stopped sending heartbeats.
+
+
+def _jobs(*paths):
+    return [{"path": path, "case": {"url": f"https://example.com/{path}", "actions": []}, "policy": None}
+            for path in paths]
+
+
+def _quiet(*args):
+    pass
+
+
+def test_lease_hands_out_jobs_in_order_then_reports_done():
+    coordinator = distributed.Coordinator(_jobs("a", "b"), options={"fast": True}, log=_quiet)
+    first = coordinator.lease("w1")
+    second = coordinator.lease("w2")
+    assert (first["path"], second["path"]) == ("a", "b")
+    assert first["options"] == {"fast": True}
+    assert coordinator.lease("w3") == {"job": None, "done": False}
+
+    assert coordinator.complete("w1", first["job"], {"passed": True})["ok"]
+    assert coordinator.complete("w2", second["job"], {"passed": False})["ok"]
+    assert coordinator.finished()
+    assert coordinator.lease("w3") == {"job": None, "done": True}
+    outcomes = [coordinator.outcomes.get_nowait() for _ in range(2)]
+    assert [(outcome["path"], outcome["worker"]) for outcome in outcomes] == [("a", "w1"), ("b", "w2")]
+
+
+def test_missed_heartbeat_requeues_the_case_at_the_front():
+    coordinator = distributed.Coordinator(_jobs("a", "b"), lease_timeout=0, log=_quiet)
+    lost = coordinator.lease("w1")
+    coordinator.reap()
+    assert not coordinator.heartbeat("w1", lost["job"])["ok"]
+    assert coordinator.lease("w2")["path"] == "a"
+    assert not coordinator.finished()
+    assert coordinator.outcomes.empty()
+
+
+def test_gives_up_after_max_attempts():
+    coordinator = distributed.Coordinator(_jobs("a"), lease_timeout=0, max_attempts=2, log=_quiet)
+    for worker in ("w1", "w2"):
+        assert coordinator.lease(worker)["path"] == "a"
+        coordinator.reap()
+    assert coordinator.finished()
+    outcome = coordinator.outcomes.get_nowait()
+    assert outcome["path"] == "a" and not outcome["passed"]
+    assert "Lost 2 worker(s)" in outcome["error"]
+    assert coordinator.lease("w3") == {"job": None, "done": True}
+
+
+def test_late_result_is_dropped():
+    coordinator = distributed.Coordinator(_jobs("a"), lease_timeout=0, log=_quiet)
+    lost = coordinator.lease("w1")
+    coordinator.reap()
+    coordinator.lease_timeout = distributed.LEASE_TIMEOUT
+    retry = coordinator.lease("w2")
+
+    assert not coordinator.complete("w1", lost["job"], {"passed": True})["ok"]
+    assert not coordinator.complete("w1", retry["job"], {"passed": True})["ok"]
+    assert coordinator.outcomes.empty() and not coordinator.finished()
+    assert coordinator.complete("w2", retry["job"], {"passed": False})["ok"]
+    assert coordinator.outcomes.get_nowait()["worker"] == "w2"
+
+
+def test_heartbeat_streams_events_only_for_a_held_lease():
+    events = []
+    coordinator = distributed.Coordinator(_jobs("a"), on_event=lambda *event: events.append(event), log=_quiet)
+    job_id = coordinator.lease("w1")["job"]
+    event = {"kind": "passed", "result": {"step": 1}}
+    assert coordinator.heartbeat("w1", job_id, [event])["ok"]
+    assert not coordinator.heartbeat("w2", job_id, [event])["ok"]
+    assert events == [("a", "w1", event)]
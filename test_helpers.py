@@ -0,0 +1,175 @@
+
+import os
+
+import assertions
+import compaction
+import history
+import scheduler
+import snapshots
+
+# --- Compaction --- #
+
+
+def test_compact_drops_redundant_adjacent_steps():
+    actions = [
+        {"type": "click", "selector": "#name"},
+        {"type": "input", "selector": "#name", "value": "a"},
+        {"type": "input", "selector": "#name", "value": "ab"},
+        {"type": "hover", "selector": "#go"},
+        {"type": "click", "selector": "#go", "t": 1000},
+        {"type": "click", "selector": "#go", "t": 1200},
+        {"type": "assert_text", "selector": "#msg", "value": "Hi"},
+        {"type": "assert_text", "selector": "#msg", "value": "Hi"},
+    ]
+    compacted, changes = compaction.compact(actions)
+    assert [(change["rule"], change["step"]) for change in changes] == [
+        ("repeated_input", 2), ("hover_before_click", 4), ("repeated_assertion", 7)]
+    assert compacted == [actions[0], actions[2], actions[4], actions[5], actions[7]]
+
+
+def test_heuristic_rules_are_only_reported():
+    actions = [
+        {"type": "click", "selector": "#country"},
+        {"type": "input", "selector": "#country", "value": "NO"},
+        {"type": "click", "selector": "#add", "t": 1000},
+        {"type": "click", "selector": "#add", "t": 1200},
+    ]
+    assert compaction.compact(actions) == (actions, [])
+    assert [(suspect["rule"], suspect["step"]) for suspect in compaction.suspects(actions)] == [
+        ("click_before_input", 1), ("double_click", 4)]
+
+
+def test_compact_keeps_steps_that_are_not_adjacent():
+    actions = [
+        {"type": "input", "selector": "#name", "value": "a"},
+        {"type": "click", "selector": "#other"},
+        {"type": "input", "selector": "#name", "value": "b"},
+        {"type": "click", "selector": "#go", "t": 0},
+        {"type": "click", "selector": "#go", "t": compaction.DOUBLE_CLICK_MS + 1},
+    ]
+    assert compaction.compact(actions) == (actions, [])
+
+
+# --- Sharding --- #
+
+
+def _suite(root, count=20):
+    return [os.path.join(root, "suite", f"group{i % 3}", f"case{i}.json") for i in range(count)]
+
+
+def test_shards_partition_the_suite_the_same_way_on_every_machine():
+    shards = [scheduler.shard(_suite("/a"), index, 3, "/a/suite") for index in range(3)]
+    assert sorted(path for part in shards for path in part) == sorted(_suite("/a"))
+    elsewhere = [scheduler.shard(_suite("/b/c"), index, 3, "/b/c/suite") for index in range(3)]
+    assert [[scheduler.suite_name(path, "/a/suite") for path in part] for part in shards] == \
+           [[scheduler.suite_name(path, "/b/c/suite") for path in part] for part in elsewhere]
+
+
+def test_duration_shards_balance_expected_time(tmp_path):
+    root = "/a/suite"
+    paths = _suite("/a", 6)
+    store = scheduler.DurationStore(str(tmp_path / "durations.json"), root=root)
+    for path, duration in zip(paths, (9, 1, 1, 4, 4, 1)):
+        store.record(path, duration, True)
+    shards = [scheduler.shard(paths, index, 2, root, store) for index in range(2)]
+    assert sorted(path for part in shards for path in part) == sorted(paths)
+    assert [sum(store.estimate(path) for path in part) for part in shards] == [10, 10]
+
+
+def test_parse_shard():
+    assert scheduler.parse_shard("2/4") == (1, 4)
+    for text in ("0/4", "5/4", "x"):
+        try:
+            scheduler.parse_shard(text)
+        except ValueError:
+            continue
+        raise AssertionError(f"{text} was accepted")
+
+
+# --- Snapshot Planning --- #
+
+
+def _recorded(*steps, t=0):
+    """Actions shaped like recorder.js output, with its per-recording `t` and `page`."""
+    return [dict(step, t=t + i * 700, page="https://example.com/login") for i, step in enumerate(steps)]
+
+
+def test_plan_groups_separate_recordings_of_the_same_prefix():
+    login = ({"type": "input", "selector": "#user", "selectors": ["#user"], "value": "ann"},
+             {"type": "input", "selector": "#pass", "selectors": ["#pass"], "value": "secret"},
+             {"type": "click", "selector": "#login", "selectors": ["#login"]})
+    cases = {
+        "a.json": {"url": "https://example.com/login",
+                   "actions": _recorded(*login, {"type": "click", "selector": "#a"})},
+        "b.json": {"url": "https://example.com/login",
+                   "actions": _recorded(*login, {"type": "click", "selector": "#b"}, t=90000)},
+        "c.json": {"url": "https://example.com/login",
+                   "actions": _recorded(login[0], dict(login[1], value="other"), *login[2:], {"type": "click"})},
+    }
+    groups = snapshots.plan(cases)
+    assert len(groups) == 1
+    group = next(iter(groups.values()))
+    assert group["paths"] == ["a.json", "b.json"] and len(group["actions"]) == 3
+    assert snapshots.plan(cases, policies={"a.json": {"block_types": ["image"]}}) == {}
+
+
+# --- Assertion Judging --- #
+
+
+def _observed(text="", found=True, visible=True, count=1, attribute=None, in_page=False):
+    return {"found": found, "visible": visible, "text": text, "count": count, "attribute": attribute,
+            "in_page": in_page}
+
+
+def test_judge_text_matchers():
+    assert assertions.judge({"type": "assert_text", "value": "Done"}, _observed("Done"))[0]
+    assert not assertions.judge({"type": "assert_text", "value": " Done "}, _observed("Done"))[0]
+    assert assertions.judge({"type": "assert_text", "value": " Done "}, _observed("Done", in_page=True))[0]
+    assert not assertions.judge({"type": "assert_text", "value": "Done"}, _observed("Done!"))[0]
+    assert assertions.judge({"type": "assert_contains", "value": "one"}, _observed("Done"))[0]
+    assert assertions.judge({"type": "assert_regex", "value": r"^\d+ items?$"}, _observed("3 items"))[0]
+    passed, message = assertions.judge({"type": "assert_regex", "value": "("}, _observed("x"))
+    assert not passed and message.startswith("Invalid pattern")
+
+
+def test_judge_missing_element():
+    passed, message = assertions.judge({"type": "assert_text", "selector": "#msg", "value": "Hi"},
+                                       _observed(found=False, visible=False))
+    assert not passed and message == "Element not found: #msg"
+    assert assertions.judge({"type": "assert_visible", "value": "hidden"}, _observed(found=False, visible=False))[0]
+
+
+def test_judge_count_and_attribute():
+    assert assertions.judge({"type": "assert_count", "value": ">= 2"}, _observed(count=3))[0]
+    assert not assertions.judge({"type": "assert_count", "value": "3"}, _observed(count=2))[0]
+    assert not assertions.judge({"type": "assert_count", "value": "many"}, _observed(count=2))[0]
+    assert assertions.judge({"type": "assert_attribute", "value": "href=/home"}, _observed(attribute="/home"))[0]
+    assert not assertions.judge({"type": "assert_attribute", "value": "disabled"}, _observed(attribute=None))[0]
+
+
+# --- Run History --- #
+
+
+def _outcome(passed, duration=1.0):
+    step = {"step": 1, "type": "click", "selector": "#go", "passed": passed, "message": "" if passed else "Nope",
+            "duration": duration, "wait": 0.0}
+    return {"passed": passed, "duration": duration, "steps": [step]}
+
+
+def test_run_history_records_and_reports(tmp_path):
+    run_history = history.RunHistory(str(tmp_path / "history.db"))
+    try:
+        run_history.record_run("flaky.json", "abc", _outcome(True))
+        run_history.record_run("flaky.json", "abc", _outcome(False, 3.0))
+        run_history.record_run("stable.json", "def", _outcome(True))
+        run_history.flush()
+
+        runs = run_history.last_results("flaky.json")
+        assert len(runs) == 2 and {run["passed"] for run in runs} == {0, 1}
+        failed = next(run for run in runs if not run["passed"])
+        assert (failed["failed_step"], failed["failed_selector"], failed["failed_message"]) == (1, "#go", "Nope")
+        assert [row["case_path"] for row in run_history.flakiest()] == [os.path.abspath("flaky.json")]
+        slowest = run_history.slowest_steps()[0]
+        assert (slowest["case_path"], slowest["runs"], slowest["mean"]) == (os.path.abspath("flaky.json"), 2, 2.0)
+    finally:
+        run_history.close()
@@ -0,0 +1,136 @@
+
+import csv
+import json
+import time
+from contextlib import contextmanager
+
+# --- Replay Timing Instrumentation --- #
+# A RunTimer collects one span per replay phase (driver start, get, element lookup, action,
+# settle wait, assertion) plus one enclosing span per step. Runs can be exported as Chrome
+# trace-event JSON (chrome://tracing, Perfetto) or aggregated per phase into a CSV.
+
+PHASES = ("driver_start", "get", "lookup", "action", "settle", "assertion", "batch", "restore", "artifact")
+
+
+def percentile(sorted_values, pct):
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * pct / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class RunTimer:
+    def __init__(self, name="run"):
+        self.name = name
+        self.origin = time.perf_counter()
+        self.spans = []
+
+    def add(self, phase, started, duration, step=None, **args):
+        """Records a span from absolute perf_counter() `started` lasting `duration` seconds."""
+        self.spans.append({
+            "phase": phase,
+            "step": step,
+            "start": started - self.origin,
+            "duration": duration,
+            "args": args,
+        })
+
+    @contextmanager
+    def span(self, phase, step=None, **args):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, started, time.perf_counter() - started, step, **args)
+
+    def to_dict(self):
+        return {"name": self.name, "spans": self.spans}
+
+    @classmethod
+    def from_dict(cls, data):
+        timer = cls(data.get("name", "run"))
+        timer.spans = list(data.get("spans", []))
+        return timer
+
+    # --- Exports --- #
+    def chrome_trace(self, pid=1, tid=1):
+        events = []
+        for span in self.spans:
+            label = f"step {span['step']}" if span["phase"] == "step" else span["phase"]
+            events.append({
+                "name": label,
+                "cat": span["phase"],
+                "ph": "X",
+                "ts": round(span["start"] * 1e6, 1),
+                "dur": round(span["duration"] * 1e6, 1),
+                "pid": pid,
+                "tid": tid,
+                "args": dict(span["args"], step=span["step"]),
+            })
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": self.name}})
+        return events
+
+    def export_chrome_trace(self, path):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.chrome_trace(), "displayTimeUnit": "ms"}, f)
+
+    def export_csv(self, path):
+        write_phase_csv(phase_stats(self.spans), path)
+
+    # --- Summaries --- #
+    def slowest_steps(self, count=5):
+        steps = [span for span in self.spans if span["phase"] == "step"]
+        return sorted(steps, key=lambda span: span["duration"], reverse=True)[:count]
+
+    def summary_lines(self, count=5):
+        lines = []
+        stats = phase_stats(self.spans)
+        step_stats = stats.get("step")
+        if step_stats:
+            lines.append(f"Step time: p50 {step_stats['p50']:.2f}s, p90 {step_stats['p90']:.2f}s, "
+                         f"p95 {step_stats['p95']:.2f}s, max {step_stats['max']:.2f}s over {step_stats['count']} step(s)")
+        for phase in PHASES:
+            if phase in stats:
+                phase_stat = stats[phase]
+                lines.append(f"  {phase:<12} total {phase_stat['total']:.2f}s, p50 {phase_stat['p50']:.3f}s, "
+                             f"p95 {phase_stat['p95']:.3f}s")
+        slowest = self.slowest_steps(count)
+        if slowest:
+            lines.append("Slowest steps:")
+            for span in slowest:
+                args = span["args"]
+                lines.append(f"  Step {span['step']}: {span['duration']:.2f}s "
+                             f"({args.get('type', '')} on '{args.get('selector', '')}')")
+        return lines
+
+
+def phase_stats(spans):
+    """Aggregates spans (from one or many runs) into per-phase count/total/percentiles."""
+    durations = {}
+    for span in spans:
+        durations.setdefault(span["phase"], []).append(span["duration"])
+    stats = {}
+    for phase, values in durations.items():
+        values.sort()
+        stats[phase] = {
+            "count": len(values),
+            "total": sum(values),
+            "mean": sum(values) / len(values),
+            "p50": percentile(values, 50),
+            "p90": percentile(values, 90),
+            "p95": percentile(values, 95),
+            "max": values[-1],
+        }
+    return stats
+
+
+def write_phase_csv(stats, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["phase", "count", "total_s", "mean_s", "p50_s", "p90_s", "p95_s", "max_s"])
+        for phase, stat in sorted(stats.items(), key=lambda item: item[1]["total"], reverse=True):
+            writer.writerow([phase, stat["count"]] + [f"{stat[key]:.6f}" for key in
+                                                       ("total", "mean", "p50", "p90", "p95", "max")])